@@ -0,0 +1,101 @@
+"""
+Measure the memory held by papers loaded with ``load_s2orc``.
+
+``N`` synthetic papers are converted and serialized to JSON lines up front;
+then, in a fresh worker process, the lines are loaded and only the resulting
+``Paper`` objects are kept. The traced allocation per paper and the peak RSS
+of the worker are reported, along with the share of the former taken by the
+model objects themselves rather than the decoded JSON they wrap:
+
+    python benchmarks/bench_memory.py -n 10000
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import time
+import tracemalloc
+
+from run_benchmarks import SCALES, peak_rss_bytes
+from tei_generator import TEIGenerator
+
+from grobid2json.convert import convert_bytes
+from grobid2json.s2orc import load_s2orc
+
+
+def make_lines(scale: str, docs: int, distinct: int) -> list[str]:
+    """
+    JSON lines of ``docs`` papers, cycling through ``distinct`` generated ones
+    """
+    lines = [
+        json.dumps(
+            convert_bytes(
+                TEIGenerator(seed=i, **SCALES[scale]).generate().encode("utf-8"),
+                str(i),
+                engine="lxml",
+            ).as_json()
+        )
+        for i in range(distinct)
+    ]
+    return [lines[i % distinct] for i in range(docs)]
+
+
+def measure(lines: list[str]) -> dict:
+    """
+    Worker: load every line and report what the papers hold on to
+    """
+    gc.collect()
+    baseline_rss = peak_rss_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    paper_dicts = [json.loads(line) for line in lines]
+    decoded, _ = tracemalloc.get_traced_memory()
+    papers = [load_s2orc(paper_dict) for paper_dict in paper_dicts]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    # what the model objects add on top of the decoded JSON they wrap
+    model = tracemalloc.get_traced_memory()[0] - decoded
+    del paper_dicts
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "papers": len(papers),
+        "seconds": elapsed,
+        "held_bytes": held,
+        "bytes_per_paper": held / len(papers),
+        "model_bytes_per_paper": model / len(papers),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "rss_growth_bytes": peak_rss_bytes() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--docs", type=int, default=5000)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument(
+        "--distinct", type=int, default=50, help="different papers to generate"
+    )
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    lines = make_lines(args.scale, args.docs, min(args.distinct, args.docs))
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        result = pool.apply(measure, (lines,))
+    result["scale"] = args.scale
+    print(
+        f"{result['papers']} papers ({args.scale}): "
+        f"{result['held_bytes'] / (1 << 20):.1f} MiB held, "
+        f"{result['bytes_per_paper'] / 1024:.1f} KiB/paper "
+        f"({result['model_bytes_per_paper'] / 1024:.1f} KiB in model objects), "
+        f"peak RSS {result['peak_rss_bytes'] / (1 << 20):.1f} MiB, "
+        f"loaded in {result['seconds']:.2f}s"
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(result, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
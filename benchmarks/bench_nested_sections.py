@@ -0,0 +1,79 @@
+"""
+Time body extraction on synthetic TEI whose sections are nested ``depth`` deep.
+
+Every level holds a head and a few paragraphs with citations, so the amount of
+text grows linearly with depth; the time per section should stay flat.
+
+    python benchmarks/bench_nested_sections.py --depths 25 50 100 200
+"""
+import argparse
+import time
+
+from grobid2json.convert import ENGINES, convert_bytes
+
+TEI_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0">'
+    "<teiHeader><fileDesc><titleStmt><title>Nested sections</title></titleStmt>"
+    "<sourceDesc><biblStruct><analytic/></biblStruct></sourceDesc></fileDesc>"
+    "</teiHeader><text><body>"
+)
+TEI_FOOTER = "</body><back><div><listBibl>{bibs}</listBibl></div></back></text></TEI>"
+BIB = (
+    '<biblStruct xml:id="b{n}"><analytic><title level="a">Reference {n}</title>'
+    '<author><persName><forename type="first">A</forename><surname>Author{n}</surname>'
+    '</persName></author></analytic><monogr><title level="j">Venue</title><imprint>'
+    '<date type="published" when="2001"/></imprint></monogr></biblStruct>'
+)
+PARAGRAPH = (
+    "<p>Section {level} paragraph {i} builds on earlier work "
+    '<ref type="bibr" target="#b{a}">[{a}]</ref> and '
+    '<ref type="bibr" target="#b{b}">[{b}]</ref> to extend the analysis.</p>'
+)
+
+
+def make_nested_tei(depth: int, paragraphs: int = 3, bib_entries: int = 20) -> bytes:
+    parts = [TEI_HEADER]
+    for level in range(depth):
+        parts.append(f'<div><head n="{level + 1}">Level {level + 1}</head>')
+        for i in range(paragraphs):
+            a = (level + i) % bib_entries
+            parts.append(
+                PARAGRAPH.format(level=level, i=i, a=a, b=(a + 1) % bib_entries)
+            )
+    parts.append("</div>" * depth)
+    parts.append(
+        TEI_FOOTER.format(bibs="".join(BIB.format(n=n) for n in range(bib_entries)))
+    )
+    return "".join(parts).encode("utf-8")
+
+
+def time_conversion(xml_data: bytes, engine: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        convert_bytes(xml_data, "nested", engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engine", choices=ENGINES, nargs="+", default=list(ENGINES))
+    args = parser.parse_args()
+
+    print(f"{'engine':<6} {'depth':>6} {'seconds':>9} {'us/section':>11}")
+    for engine in args.engine:
+        for depth in args.depths:
+            xml_data = make_nested_tei(depth, args.paragraphs)
+            elapsed = time_conversion(xml_data, engine, args.repeat)
+            print(
+                f"{engine:<6} {depth:>6} {elapsed:>9.4f} {elapsed / depth * 1e6:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
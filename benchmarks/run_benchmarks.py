@@ -0,0 +1,170 @@
+"""
+Time conversion, serialization and loading on synthetic TEI at several scales.
+
+For every scale a corpus is generated with ``tei_generator`` and each
+document goes through ``convert_xml_to_json`` (parse included),
+``Paper.as_json`` and ``load_s2orc``. Every scale runs in a fresh worker
+process so its peak RSS is not inflated by earlier ones. Results are printed
+as a table and written as JSON so runs can be compared:
+
+    python benchmarks/run_benchmarks.py -o before.json
+    python benchmarks/run_benchmarks.py -o after.json --compare before.json
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from typing import Optional
+
+from tei_generator import TEIGenerator
+
+from grobid2json.__version__ import __version__
+from grobid2json.convert import ENGINES, convert_tree, parse_bytes
+from grobid2json.s2orc import load_s2orc
+
+SCALES = {
+    "small": dict(sections=3, paragraphs=3, bib_entries=15, figures=1, tables=1),
+    "medium": dict(sections=8, paragraphs=5, bib_entries=60, figures=4, tables=2),
+    "large": dict(sections=20, paragraphs=8, bib_entries=250, figures=12, tables=6),
+    "nested": dict(sections=4, paragraphs=3, bib_entries=60, depth=8),
+    "author_year": dict(sections=8, paragraphs=5, bib_entries=60, bracket=False),
+    "edge_cases": dict(sections=8, paragraphs=5, bib_entries=60, edge_cases=True),
+}
+STEPS = ("convert", "as_json", "load_s2orc")
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_scale(task: tuple[str, str, int, int]) -> dict:
+    """
+    Worker: generate ``docs`` documents for ``scale`` and time every step on
+    them, keeping the best of ``repeat`` rounds
+    """
+    scale, engine, docs, repeat = task
+    corpus = [
+        TEIGenerator(seed=i, **SCALES[scale]).generate().encode("utf-8")
+        for i in range(docs)
+    ]
+    timings = {step: float("inf") for step in STEPS}
+    paragraphs = 0
+    failed = 0
+    for _ in range(repeat):
+        elapsed = dict.fromkeys(STEPS, 0.0)
+        paragraphs = 0
+        failed = 0
+        for i, xml_data in enumerate(corpus):
+            start = time.perf_counter()
+            try:
+                paper = convert_tree(parse_bytes(xml_data, engine), str(i), "", engine)
+            except Exception:
+                failed += 1
+                continue
+            converted = time.perf_counter()
+            paper_dict = paper.as_json()
+            serialized = time.perf_counter()
+            load_s2orc(paper_dict)
+            loaded = time.perf_counter()
+            elapsed["convert"] += converted - start
+            elapsed["as_json"] += serialized - converted
+            elapsed["load_s2orc"] += loaded - serialized
+            paragraphs += len(paper.abstract) + len(paper.body_text)
+            paragraphs += len(paper.back_matter)
+        for step in STEPS:
+            timings[step] = min(timings[step], elapsed[step])
+
+    converted_docs = docs - failed
+    result = {
+        "scale": scale,
+        "engine": engine,
+        "documents": converted_docs,
+        "failed": failed,
+        "input_bytes": sum(len(xml_data) for xml_data in corpus),
+        "paragraphs": paragraphs,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "steps": {},
+    }
+    for step in STEPS:
+        seconds = timings[step]
+        result["steps"][step] = {
+            "seconds": seconds,
+            "docs_per_sec": converted_docs / seconds if seconds else 0.0,
+            "us_per_paragraph": seconds / paragraphs * 1e6 if paragraphs else 0.0,
+        }
+    return result
+
+
+def run_benchmarks(
+    scales: list[str], engines: list[str], docs: int, repeat: int
+) -> dict:
+    tasks = [(scale, engine, docs, repeat) for engine in engines for scale in scales]
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        results = pool.map(run_scale, tasks, chunksize=1)
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "docs": docs,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def format_results(report: dict, baseline: Optional[dict] = None) -> str:
+    previous = {}
+    if baseline is not None:
+        previous = {
+            (result["scale"], result["engine"]): result
+            for result in baseline["results"]
+        }
+    lines = [
+        f"{'engine':<6} {'scale':<12} {'step':<11} {'docs/sec':>10} "
+        f"{'us/para':>9} {'peak MiB':>9}"
+        + (f" {'change':>8}" if baseline is not None else "")
+    ]
+    for result in report["results"]:
+        before = previous.get((result["scale"], result["engine"]))
+        for step, numbers in result["steps"].items():
+            line = (
+                f"{result['engine']:<6} {result['scale']:<12} {step:<11} "
+                f"{numbers['docs_per_sec']:>10.1f} "
+                f"{numbers['us_per_paragraph']:>9.1f} "
+                f"{result['peak_rss_bytes'] / (1 << 20):>9.1f}"
+            )
+            if before is not None and before["steps"][step]["seconds"]:
+                ratio = numbers["seconds"] / before["steps"][step]["seconds"] - 1
+                line += f" {ratio:>+8.1%}"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=list(SCALES))
+    parser.add_argument("--engine", choices=ENGINES, nargs="+", default=list(ENGINES))
+    parser.add_argument("-n", "--docs", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.engine, args.docs, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+    print(format_results(report, baseline))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
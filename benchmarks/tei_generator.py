@@ -0,0 +1,336 @@
+"""
+Synthetic GROBID TEI generator.
+
+Produces TEI documents shaped like GROBID's ``processFulltextDocument``
+output with controllable sizes, so conversion throughput can be measured
+without shipping real papers.
+"""
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+
+WORDS = (
+    "the of and to in a is that for it as was with be by on not he this are or "
+    "his from at which but have an they you were her she there been one all we "
+    "model data results method network training performance analysis learning "
+    "figure table approach proposed system paper section evaluation baseline "
+    "corpus feature task language neural dataset accuracy experiment sample"
+).split()
+
+FIRST_NAMES = ["John", "Maria", "Wei", "Anna", "Ravi", "Olga", "Kenji", "Lena"]
+LAST_NAMES = ["Smith", "Garcia", "Zhang", "Ivanova", "Patel", "Tanaka", "Muller"]
+VENUES = ["Nature", "Proc. ACL", "NeurIPS", "J. Mach. Learn. Res.", "Science"]
+
+
+class TEIGenerator:
+    """
+    Build one synthetic TEI document per call to :meth:`generate`.
+
+    Sizes are controlled with the constructor arguments; every document is
+    deterministic for a given ``seed``.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        sections: int = 8,
+        paragraphs: int = 5,
+        sentences: int = 5,
+        citations: int = 3,
+        bib_entries: int = 60,
+        figures: int = 4,
+        tables: int = 2,
+        formulas: int = 2,
+        notes: int = 2,
+        depth: int = 1,
+        bracket: bool = True,
+        ranges: bool = True,
+        edge_cases: bool = False,
+    ):
+        self.rng = random.Random(seed)
+        self.sections = sections
+        self.paragraphs = paragraphs
+        self.sentences = sentences
+        self.citations = citations
+        self.bib_entries = max(bib_entries, 1)
+        self.figures = figures
+        self.tables = tables
+        self.formulas = formulas
+        self.notes = notes
+        self.depth = max(depth, 1)
+        self.bracket = bracket
+        self.ranges = ranges
+        self.edge_cases = edge_cases
+        self._formula_id = 0
+
+    def _words(self, n: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(n))
+
+    def _sentence(self) -> str:
+        text = self._words(self.rng.randint(6, 18))
+        return escape(text[0].upper() + text[1:])
+
+    def _space(self) -> str:
+        if self.edge_cases:
+            return self.rng.choice([" ", " ", "\n", "  ", "\t", "\xa0"])
+        return " "
+
+    def _cite(self) -> str:
+        bib = self.rng.randrange(self.bib_entries)
+        if self.bracket:
+            if self.ranges and self.rng.random() < 0.2:
+                end = min(bib + self.rng.randint(2, 6), self.bib_entries - 1)
+                dash = self.rng.choice(["-", "–"])
+                return (
+                    f'<ref type="bibr" target="#b{bib}">[{bib + 1}]</ref>{dash}'
+                    f'<ref type="bibr" target="#b{end}">[{end + 1}]</ref>'
+                )
+            if self.rng.random() < 0.2:
+                other = self.rng.randrange(self.bib_entries)
+                return (
+                    f'<ref type="bibr" target="#b{bib}">[{bib + 1},</ref> '
+                    f'<ref type="bibr" target="#b{other}">{other + 1}]</ref>'
+                )
+            return f'<ref type="bibr" target="#b{bib}">[{bib + 1}]</ref>'
+        name = self.rng.choice(LAST_NAMES)
+        year = self.rng.randint(1990, 2023)
+        return f'<ref type="bibr" target="#b{bib}">({name} et al., {year})</ref>'
+
+    def _edge_ref(self) -> str:
+        choice = self.rng.randrange(7)
+        if choice == 0:
+            return '<ref type="bibr">[99]</ref>'
+        if choice == 1:
+            return '<ref type="bibr" target="#b9999">[77]</ref>'
+        if choice == 2:
+            return '<ref type="foot" target="#foot_0">1</ref>'
+        if choice == 3:
+            return '<ref type="formula" target="#formula_0">(1)</ref>'
+        if choice == 4:
+            return f'<hi rend="italic">{self._words(2)} {self._cite()}</hi>'
+        if choice == 5:
+            return '<ref type="bibr" target="#b1">Smith</ref>'
+        return '<ref type="figure">Fig. 9</ref>'
+
+    def _inline_formula(self) -> str:
+        self._formula_id += 1
+        if self.rng.random() < 0.5:
+            label = f"<label>({self._formula_id})</label>"
+        else:
+            label = ""
+        return (
+            f'<formula xml:id="formula_{self._formula_id}">'
+            f"x = y + {self._formula_id}{label}</formula>"
+        )
+
+    def _paragraph(self) -> str:
+        parts = []
+        for _ in range(self.sentences):
+            parts.append(self._sentence())
+            for _ in range(self.rng.randint(0, self.citations)):
+                parts.append(self._cite())
+            if self.figures and self.rng.random() < 0.15:
+                fig = self.rng.randrange(self.figures)
+                parts.append(
+                    f'<ref type="figure" target="#fig_{fig}">Figure {fig + 1}</ref>'
+                )
+            if self.tables and self.rng.random() < 0.1:
+                tab = self.rng.randrange(self.tables)
+                parts.append(
+                    f'<ref type="table" target="#tab_{tab}">Table {tab + 1}</ref>'
+                )
+            if self.formulas and self.rng.random() < 0.05:
+                parts.append(self._inline_formula())
+            if self.edge_cases and self.rng.random() < 0.2:
+                parts.append(self._edge_ref())
+            if self.notes and self.edge_cases and self.rng.random() < 0.03:
+                parts.append(f'<note place="foot">{self._sentence()}</note>')
+            parts.append(".")
+        text = "".join(p + self._space() for p in parts)
+        return f"<p>{text}</p>"
+
+    def _div(self, level: int, number: str) -> str:
+        if self.edge_cases and self.rng.random() < 0.1:
+            head = ""
+        else:
+            head = f'<head n="{number}">{escape(self._words(3).title())}</head>'
+        paras = [self._paragraph() for _ in range(self.paragraphs)]
+        for _ in range(self.formulas):
+            if self.rng.random() < 0.5:
+                self._formula_id += 1
+                if self.edge_cases and self.rng.random() < 0.3:
+                    label = ""
+                else:
+                    label = f"<label>({self._formula_id})</label>"
+                paras.insert(
+                    self.rng.randrange(len(paras) + 1),
+                    f'<formula xml:id="formula_{self._formula_id}">'
+                    f"E = mc^{self._formula_id}{label}</formula>",
+                )
+        subdivs = []
+        if level < self.depth:
+            subdivs.append(self._div(level + 1, f"{number}.1"))
+        return f"<div>{head}{''.join(paras)}{''.join(subdivs)}</div>"
+
+    def _author(self, with_affiliation: bool = True) -> str:
+        first = self.rng.choice(FIRST_NAMES)
+        last = self.rng.choice(LAST_NAMES)
+        middle = (
+            f'<forename type="middle">{self.rng.choice("ABCDE")}</forename>'
+            if self.rng.random() < 0.3
+            else ""
+        )
+        affiliation = ""
+        if with_affiliation:
+            affiliation = (
+                '<affiliation key="aff0">'
+                '<orgName type="department">Computer Science</orgName>'
+                '<orgName type="institution">University of Somewhere</orgName>'
+                "<address><settlement>Springfield</settlement>"
+                '<country key="US">USA</country></address></affiliation>'
+            )
+        email = (
+            f"<email>{first.lower()}@example.org</email>" if with_affiliation else ""
+        )
+        return (
+            f'<author><persName><forename type="first">{first}</forename>{middle}'
+            f"<surname>{last}</surname></persName>{email}{affiliation}</author>"
+        )
+
+    def _bibl(self, index: int) -> str:
+        title = escape(self._words(self.rng.randint(4, 10)).title())
+        if self.edge_cases and self.rng.random() < 0.05:
+            title_el = ""
+        else:
+            title_el = f'<title level="a" type="main">{title}</title>'
+        authors = "".join(
+            self._author(with_affiliation=False) for _ in range(self.rng.randint(1, 4))
+        )
+        year = self.rng.randint(1990, 2023)
+        return (
+            f'<biblStruct xml:id="b{index}"><analytic>{title_el}{authors}</analytic>'
+            f'<monogr><title level="j">{self.rng.choice(VENUES)}</title>'
+            f'<imprint><biblScope unit="volume">{self.rng.randint(1, 90)}</biblScope>'
+            f'<biblScope unit="issue">{self.rng.randint(1, 12)}</biblScope>'
+            f'<biblScope unit="page" from="{index}" to="{index + 9}"/>'
+            f'<date type="published" when="{year}"/></imprint></monogr>'
+            f'<idno type="DOI">10.1000/{index}</idno>'
+            f'<note type="raw_reference">{title}. {year}.</note></biblStruct>'
+        )
+
+    def _figure(self, index: int) -> str:
+        label = f"<label>{index + 1}</label>"
+        if self.edge_cases and index % 5 == 3:
+            label = "<label>a</label>"
+        return (
+            f'<figure xml:id="fig_{index}"><head>Figure {index + 1} :</head>{label}'
+            f"<figDesc>{self._sentence()}</figDesc>"
+            f'<graphic url="fig{index}.png"/></figure>'
+        )
+
+    def _table(self, index: int) -> str:
+        rows = "".join(
+            "<row>"
+            + "".join(f"<cell>{self.rng.randint(0, 99)}</cell>" for _ in range(4))
+            + "</row>"
+            for _ in range(self.rng.randint(2, 6))
+        )
+        return (
+            f'<figure xml:id="tab_{index}" type="table"><head>Table {index + 1} :</head>'
+            f"<label>{index + 1}</label><figDesc>{self._sentence()}</figDesc>"
+            f"<table>{rows}</table></figure>"
+        )
+
+    def _abstract(self) -> str:
+        paras = "".join(self._paragraph() for _ in range(2))
+        if self.edge_cases:
+            style = self.rng.randrange(3)
+            if style == 1:
+                return f"<abstract>{paras}</abstract>"
+            if style == 2:
+                return f"<abstract>{self._sentence()}</abstract>"
+        return f'<abstract><div xmlns="{TEI_NS}">{paras}</div></abstract>'
+
+    def generate(self) -> str:
+        self._formula_id = 0
+        title = escape(self._words(8).title())
+        authors = "".join(self._author() for _ in range(self.rng.randint(1, 5)))
+        divs = "".join(self._div(1, str(i + 1)) for i in range(self.sections))
+        figures = "".join(self._figure(i) for i in range(self.figures))
+        tables = "".join(self._table(i) for i in range(self.tables))
+        notes = "".join(
+            f'<note xmlns="{TEI_NS}" place="foot" n="{i + 1}">{self._sentence()}</note>'
+            for i in range(self.notes)
+        )
+        bibls = "".join(self._bibl(i) for i in range(self.bib_entries))
+        acknowledgement = (
+            '<div type="acknowledgement"><div><head>Acknowledgements</head>'
+            f"<p>{self._sentence()}</p></div></div>"
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<TEI xml:space="preserve" xmlns="{TEI_NS}">'
+            '<teiHeader xml:lang="en"><fileDesc>'
+            f'<titleStmt><title level="a" type="main">{title}</title></titleStmt>'
+            '<publicationStmt><publisher/><availability status="unknown"><licence/>'
+            '</availability><date type="published" when="2020-05-01">May 2020</date>'
+            "</publicationStmt><sourceDesc><biblStruct><analytic>"
+            f'{authors}<title level="a" type="main">{title}</title></analytic>'
+            "<monogr><imprint><date/></imprint></monogr></biblStruct></sourceDesc>"
+            "</fileDesc><profileDesc>"
+            f"{self._abstract()}</profileDesc></teiHeader>"
+            f'<text xml:lang="en"><body>{divs}{figures}{tables}{notes}</body>'
+            f'<back>{acknowledgement}<div type="references"><listBibl>{bibls}'
+            "</listBibl></div></back></text></TEI>\n"
+        )
+
+
+def write_corpus(output_dir: str, count: int, **kwargs) -> list[str]:
+    """
+    Write ``count`` generated documents to ``output_dir`` and return their paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    seed = kwargs.pop("seed", 0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(output_dir, f"paper{i:06d}.tei.xml")
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(TEIGenerator(seed=seed + i, **kwargs).generate())
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic GROBID TEI files")
+    parser.add_argument("output_dir")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--paragraphs", type=int, default=5)
+    parser.add_argument("--bib-entries", type=int, default=60)
+    parser.add_argument("--figures", type=int, default=4)
+    parser.add_argument("--tables", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--author-year", action="store_true")
+    parser.add_argument("--edge-cases", action="store_true")
+    args = parser.parse_args(argv)
+    write_corpus(
+        args.output_dir,
+        args.count,
+        seed=args.seed,
+        sections=args.sections,
+        paragraphs=args.paragraphs,
+        bib_entries=args.bib_entries,
+        figures=args.figures,
+        tables=args.tables,
+        depth=args.depth,
+        bracket=not args.author_year,
+        edge_cases=args.edge_cases,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,13 @@
+from grobid2json.cache import ConversionCache
+from grobid2json.convert import (
+    ParagraphStream,
+    convert_bytes,
+    convert_file,
+    extract_bib_entries,
+    extract_metadata,
+    iter_paragraphs,
+)
+from grobid2json.index import ShardIndex
 from grobid2json.main import convert_xml_to_json
+from grobid2json.reader import read_s2orc
+from grobid2json.stats import ConversionStats
@@ -0,0 +1,103 @@
+"""
+TEI inputs read straight out of archives.
+
+``iter_inputs`` expands batch inputs like ``iter_input_paths`` but opens
+``.tar``, ``.tar.gz``/``.tgz`` and ``.zip`` files on the way and yields
+their TEI members, gzip-compressed ones included, as ``Member`` objects
+holding the bytes, so archives never have to be extracted to disk. Tarballs
+are read as a stream. ``read_ahead`` runs an iterator on a thread behind a
+bounded queue, so reading and decompressing overlap with conversion.
+"""
+import gzip
+import os
+import queue
+import tarfile
+import threading
+import zipfile
+from typing import Iterable, Iterator, NamedTuple, Union
+
+from grobid2json.paths import TEI_SUFFIXES, iter_input_paths
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".zip")
+
+
+class Member(NamedTuple):
+    """
+    A TEI file from an archive; ``name`` is the archive path joined with the
+    member name, so its file name stem is the paper_id
+    """
+
+    name: str
+    data: bytes
+
+
+def is_archive(path: str) -> bool:
+    return path.endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_tei_member(name: str) -> bool:
+    # skip the AppleDouble "._" files macOS tar adds next to every member
+    return name.endswith(TEI_SUFFIXES) and not os.path.basename(name).startswith("._")
+
+
+def _member(archive_path: str, name: str, data: bytes) -> Member:
+    if name.endswith(".gz"):
+        data = gzip.decompress(data)
+    return Member(f"{archive_path}/{name}", data)
+
+
+def iter_archive(path: str) -> Iterator[Member]:
+    """
+    The TEI members of a tar or zip archive, in archive order
+    """
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_tei_member(info.filename):
+                    yield _member(path, info.filename, archive.read(info))
+        return
+    with tarfile.open(path, "r|*") as archive:
+        for info in archive:
+            if info.isfile() and _is_tei_member(info.name):
+                yield _member(path, info.name, archive.extractfile(info).read())
+
+
+def iter_inputs(inputs: Iterable[str]) -> Iterator[Union[str, Member]]:
+    """
+    TEI file paths, and the members of any archive among the inputs
+    """
+    for path in iter_input_paths(inputs, TEI_SUFFIXES + ARCHIVE_SUFFIXES):
+        if is_archive(path):
+            yield from iter_archive(path)
+        else:
+            yield path
+
+
+_DONE = object()
+
+
+def read_ahead(items: Iterable, max_items: int) -> Iterator:
+    """
+    Iterate ``items`` on a background thread, at most ``max_items`` ahead of
+    the consumer; an exception raised there is re-raised here
+    """
+    buffer = queue.Queue(maxsize=max(max_items, 1))
+    errors = []
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            buffer.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is _DONE:
+            if errors:
+                raise errors[0]
+            return
+        yield item
@@ -0,0 +1,763 @@
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Callable, Iterable, Optional, Union
+
+from grobid2json.archive import Member, iter_inputs, read_ahead
+from grobid2json.cache import DEFAULT_MAX_BYTES, ConversionCache
+from grobid2json.convert import (
+    ENGINES,
+    convert_bytes,
+    convert_bytes_to_json,
+    convert_file,
+    convert_file_to_json,
+    extract_bib_entries,
+    extract_metadata,
+    paper_id_from_path,
+    read_file,
+)
+from grobid2json.guard import DeadLetter, GuardedPool
+from grobid2json.index import ShardIndexWriter, index_path
+from grobid2json.manifest import (
+    DEAD_LETTER,
+    DONE,
+    FAILED,
+    Manifest,
+    file_stat,
+    input_hash,
+    manifest_path,
+)
+from grobid2json.paths import chunked
+from grobid2json.serialize import dumps_str
+from grobid2json.stats import ConversionStats, StatsReport
+
+DEFAULT_SHARD_SIZE = 10000
+DEFAULT_TASK_SIZE = 16
+ONLY_PARTS = {"metadata": extract_metadata, "bib_entries": extract_bib_entries}
+PROGRESS_INTERVAL = 10.0
+CHECKPOINT_INTERVAL = 1.0
+DEFAULT_PARTITION_SIZE = 1000
+DEFAULT_LEASE_TTL = 60.0
+DEAD_LETTERS_SUFFIX = "-dead-letters.jsonl"
+
+_caches = {}
+
+
+def default_workers() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def input_name(item: Union[str, Member]) -> str:
+    return item.name if isinstance(item, Member) else item
+
+
+def list_shards(output_dir: str, prefix: str = "part") -> list[str]:
+    """
+    The shards named ``prefix`` in ``output_dir``, in order
+    """
+    pattern = os.path.join(glob.escape(output_dir), f"{glob.escape(prefix)}-*.jsonl")
+    return sorted(
+        path
+        for path in glob.glob(pattern)
+        if os.path.basename(path)[len(prefix) + 1 : -6].isdigit()
+    )
+
+
+def shard_number(path: str) -> int:
+    return int(os.path.basename(path).rsplit("-", 1)[1][: -len(".jsonl")])
+
+
+def get_cache(path: str, max_bytes: int = DEFAULT_MAX_BYTES) -> ConversionCache:
+    """
+    One cache connection per process and cache file
+    """
+    cache = _caches.get(path)
+    if cache is None:
+        cache = _caches[path] = ConversionCache(path, max_bytes)
+    return cache
+
+
+def convert_path(
+    path: Union[str, Member],
+    release: bool = False,
+    doc_type: str = "pdf",
+    engine: str = "bs4",
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+    only: Optional[str] = None,
+) -> str:
+    if isinstance(path, Member):
+        paper_id = paper_id_from_path(path.name)
+        if only is not None:
+            part = ONLY_PARTS[only](path.data, engine, stats)
+            return dumps_str({"paper_id": paper_id, only: part})
+        if release:
+            paper = convert_bytes(path.data, paper_id, "", engine, cache, stats)
+            return dumps_str(paper.release_json(doc_type))
+        return convert_bytes_to_json(path.data, paper_id, "", engine, cache, stats)
+    if only is not None:
+        part = ONLY_PARTS[only](read_file(path), engine, stats)
+        return dumps_str({"paper_id": paper_id_from_path(path), only: part})
+    if release:
+        paper = convert_file(path, engine=engine, cache=cache, stats=stats)
+        return dumps_str(paper.release_json(doc_type))
+    return convert_file_to_json(path, engine=engine, cache=cache, stats=stats)
+
+
+def _read_input(path: str) -> tuple[Member, str]:
+    """
+    Read a file once for both its hash, of the bytes as stored, and its
+    conversion, decompressing ``.gz`` ones
+    """
+    with open(path, "rb") as fp:
+        data = fp.read()
+    digest = input_hash(data)
+    if path.endswith(".gz"):
+        data = gzip.decompress(data)
+    return Member(path, data), digest
+
+
+def convert_paths(
+    paths: list[Union[str, Member]],
+    release: bool = False,
+    doc_type: str = "pdf",
+    engine: str = "bs4",
+    cache_path: Optional[str] = None,
+    cache_size: int = DEFAULT_MAX_BYTES,
+    collect_stats: bool = False,
+    low_memory_above: Optional[int] = None,
+    only: Optional[str] = None,
+    on_stage: Optional[Callable[[Optional[str]], None]] = None,
+) -> list[
+    tuple[
+        str,
+        Optional[str],
+        Optional[str],
+        Optional[dict],
+        Optional[str],
+        Optional[tuple[int, int]],
+        float,
+    ]
+]:
+    """
+    Worker task: convert a batch of files and archive members, returning
+    ``(path, line, error, stats, input hash, file stat, seconds)`` where the
+    stat is the ``(size, mtime_ns)`` of a file, taken before reading it;
+    files larger than ``low_memory_above`` bytes are read incrementally,
+    ``only`` limits the output to the ``"metadata"`` or the ``"bib_entries"``
+    of each file and ``on_stage`` is called as each conversion stage starts
+    """
+    cache = get_cache(cache_path, cache_size) if cache_path else None
+    results = []
+    for item in paths:
+        path = input_name(item)
+        stats = (
+            ConversionStats(paper_id_from_path(path), on_stage)
+            if collect_stats or on_stage is not None
+            else None
+        )
+        file_engine = engine
+        start = time.perf_counter()
+        digest = None
+        stat = None
+        try:
+            if not isinstance(item, Member):
+                stat = file_stat(path)
+            if low_memory_above is not None:
+                size = len(item.data) if stat is None else stat[0]
+                if size > low_memory_above:
+                    file_engine = "iterparse"
+            if isinstance(item, Member):
+                digest = input_hash(item)
+            elif file_engine == "iterparse" and cache is None and only is None:
+                # converted straight from the file, so hashed from it too
+                digest = input_hash(item)
+            else:
+                item, digest = _read_input(item)
+            line = convert_path(
+                item, release, doc_type, file_engine, cache, stats, only
+            )
+            error = None
+        except Exception as e:
+            line = None
+            error = f"{type(e).__name__}: {e}"
+            if stats is not None and stats.stage is not None:
+                error = f"{error} (in stage {stats.stage})"
+        results.append(
+            (
+                path,
+                line,
+                error,
+                stats.as_json() if collect_stats else None,
+                digest,
+                stat,
+                time.perf_counter() - start,
+            )
+        )
+    return results
+
+
+class ShardWriter:
+    """
+    Write JSON lines into ``<prefix>-NNNNN.jsonl`` files of at most
+    ``shard_size`` records each, recording where each paper_id went in a
+    ``ShardIndexWriter`` when given one
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        prefix: str = "part",
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        index: Optional[ShardIndexWriter] = None,
+        first_shard: int = 0,
+    ):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.index = index
+        self.shard_index = first_shard - 1
+        self.shard_records = 0
+        self.shard_paths = []
+        self._fp = None
+        self._offset = 0
+        self._index_shard = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _rotate(self):
+        self._close_shard()
+        self.shard_index += 1
+        self.shard_records = 0
+        path = os.path.join(
+            self.output_dir, f"{self.prefix}-{self.shard_index:05d}.jsonl"
+        )
+        self.shard_paths.append(path)
+        self._fp = open(path, "wb")
+        self._offset = 0
+        if self.index is not None:
+            self._index_shard = self.index.add_shard(path)
+
+    def write(self, line: str, paper_id: Optional[str] = None) -> tuple[str, int, int]:
+        """
+        Append a line; returns its ``(shard path, offset, length)``
+        """
+        if self._fp is None or self.shard_records >= self.shard_size:
+            self._rotate()
+        data = line.encode("utf-8")
+        self._fp.write(data)
+        self._fp.write(b"\n")
+        if self.index is not None and paper_id is not None:
+            self.index.add(paper_id, self._index_shard, self._offset, len(data))
+        location = (self.shard_paths[-1], self._offset, len(data))
+        self._offset += len(data) + 1
+        self.shard_records += 1
+        return location
+
+    def flush(self):
+        """
+        Get everything written so far onto the disk
+        """
+        if self._fp is not None:
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+
+    def _close_shard(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def close(self):
+        self._close_shard()
+        if self.index is not None:
+            self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _reindex(manifest: Manifest, index: ShardIndexWriter):
+    """
+    Index the records of a previous run again, as the index starts over
+    """
+    shard_ids = {}
+    for paper_id, shard_path, offset, length in manifest.records():
+        if shard_path not in shard_ids:
+            shard_ids[shard_path] = index.add_shard(shard_path)
+        index.add(paper_id, shard_ids[shard_path], offset, length)
+
+
+def dead_letters_path(output_dir: str, prefix: str = "part") -> str:
+    return os.path.join(output_dir, f"{prefix}{DEAD_LETTERS_SUFFIX}")
+
+
+def run_batch(
+    inputs: Iterable[str],
+    output_dir: str,
+    workers: Optional[int] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    task_size: int = DEFAULT_TASK_SIZE,
+    release: bool = False,
+    doc_type: str = "pdf",
+    prefix: str = "part",
+    progress: bool = True,
+    engine: str = "bs4",
+    cache_path: Optional[str] = None,
+    cache_size: int = DEFAULT_MAX_BYTES,
+    stats_path: Optional[str] = None,
+    low_memory_above: Optional[int] = None,
+    only: Optional[str] = None,
+    index: bool = True,
+    resume: bool = False,
+    timeout: Optional[float] = None,
+    max_rss: Optional[int] = None,
+) -> dict:
+    """
+    Convert TEI files on a process pool and write the results to JSONL shards,
+    indexed by paper_id in ``<prefix>-index.sqlite`` unless ``index`` is off.
+
+    Every input is recorded in ``<prefix>-manifest.sqlite``. With ``resume``,
+    the inputs a previous run into ``output_dir`` converted are skipped
+    unless their bytes changed since, its failed ones are retried and new
+    records go to shards of their own. The old record of an input converted
+    again is blanked out of its shard. ``skipped`` and ``skipped_dead_letters``
+    in the result count the converted and the dead-lettered inputs skipped,
+    ``replaced`` the old records blanked.
+
+    ``timeout`` (seconds) and ``max_rss`` (bytes) limit the conversion of each
+    document. A worker over either limit is killed and replaced, and the
+    document goes to ``<prefix>-dead-letters.jsonl`` with the stage it was in,
+    to be reprocessed separately; resumed runs skip it too.
+    """
+    if only is not None:
+        if only not in ONLY_PARTS:
+            raise ValueError(f"Unknown part {only!r}, expected one of {ONLY_PARTS}")
+        if release or cache_path:
+            raise ValueError("only cannot be combined with release or a cache")
+    workers = workers or default_workers()
+    max_in_flight = workers * 4
+    converted = 0
+    failed = 0
+    dead = 0
+    replaced = 0
+    skipped = {DONE: 0, DEAD_LETTER: 0}
+    report = StatsReport() if stats_path else None
+    start = last_report = last_checkpoint = time.perf_counter()
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path(output_dir, prefix), resume)
+    previous_shards = []
+    previous = {}
+    if resume:
+        previous_shards = manifest.repair(list_shards(output_dir, prefix))
+        previous = {status: manifest.fingerprints(status) for status in skipped}
+    previous_done = previous.get(DONE, {})
+    index_writer = ShardIndexWriter(index_path(output_dir, prefix)) if index else None
+    if index_writer is not None and previous_shards:
+        _reindex(manifest, index_writer)
+
+    def previous_status(item: Union[str, Member]) -> Optional[str]:
+        name = input_name(item)
+        for status, fingerprints in previous.items():
+            if name not in fingerprints:
+                continue
+            digest, size, mtime_ns = fingerprints[name]
+            # dead letters of archive members have no hash and are always
+            # skipped; a file is only read again if its size or mtime moved
+            if digest is None:
+                return status
+            if not isinstance(item, Member) and file_stat(name) == (size, mtime_ns):
+                return status
+            # an input whose bytes changed since is converted again
+            if digest == input_hash(item):
+                return status
+        return None
+
+    def pending_inputs():
+        for item in iter_inputs(inputs):
+            status = previous_status(item)
+            if status is None:
+                yield item
+            else:
+                skipped[status] += 1
+
+    guarded = timeout is not None or max_rss is not None
+    if guarded:
+        executor = GuardedPool(workers, timeout, max_rss, input_name)
+        dead_letter_file = open(
+            dead_letters_path(output_dir, prefix),
+            "a" if resume else "w",
+            encoding="utf-8",
+        )
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        dead_letter_file = nullcontext()
+
+    with manifest, ShardWriter(
+        output_dir,
+        prefix,
+        shard_size,
+        index_writer,
+        shard_number(previous_shards[-1]) + 1 if previous_shards else 0,
+    ) as writer, executor, dead_letter_file as dead_letters:
+        chunks = chunked(
+            read_ahead(pending_inputs(), max_in_flight * task_size), task_size
+        )
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                pending.add(
+                    executor.submit(
+                        convert_paths,
+                        chunk,
+                        release,
+                        doc_type,
+                        engine,
+                        cache_path,
+                        cache_size,
+                        report is not None,
+                        low_memory_above,
+                        only,
+                    )
+                )
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    name = result.input if isinstance(result, DeadLetter) else result[0]
+                    if name in previous_done and manifest.discard(name):
+                        # converted before, but its bytes changed since: the
+                        # old record goes once the new row is committed
+                        replaced += 1
+                        if index_writer is not None:
+                            index_writer.remove(paper_id_from_path(name))
+                    if isinstance(result, DeadLetter):
+                        stat = digest = None
+                        if os.path.isfile(result.input):
+                            stat = file_stat(result.input)
+                            digest = input_hash(result.input)
+                        manifest.add(
+                            result.input,
+                            DEAD_LETTER,
+                            digest,
+                            paper_id_from_path(result.input),
+                            None,
+                            result.elapsed,
+                            result.error,
+                            stat,
+                        )
+                        dead_letters.write(dumps_str(result._asdict()) + "\n")
+                        dead += 1
+                        print(
+                            f"Gave up on {result.input}: {result.error}",
+                            file=sys.stderr,
+                        )
+                        continue
+                    path, line, error, stats, digest, stat, duration = result
+                    if stats is not None and stats["timings"]:
+                        report.add(stats)
+                    paper_id = paper_id_from_path(path)
+                    if error is None:
+                        location = writer.write(line, paper_id)
+                        manifest.add(
+                            path, DONE, digest, paper_id, location, duration, stat=stat
+                        )
+                        converted += 1
+                    else:
+                        manifest.add(
+                            path, FAILED, digest, paper_id, None, duration, error, stat
+                        )
+                        failed += 1
+                        print(f"Failed to convert {path}: {error}", file=sys.stderr)
+            now = time.perf_counter()
+            if now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                last_checkpoint = now
+                writer.flush()
+                if dead_letters is not None:
+                    dead_letters.flush()
+                manifest.checkpoint()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(
+                    f"{converted} converted, {failed} failed, "
+                    f"{converted / (now - start):.1f} docs/sec",
+                    file=sys.stderr,
+                )
+        writer.flush()
+        manifest.checkpoint()
+        shards = previous_shards + writer.shard_paths
+
+    elapsed = time.perf_counter() - start
+    result = {
+        "converted": converted,
+        "failed": failed,
+        "dead_letters": dead,
+        "skipped": skipped[DONE],
+        "skipped_dead_letters": skipped[DEAD_LETTER],
+        "replaced": replaced,
+        "elapsed": elapsed,
+        "docs_per_sec": converted / elapsed if elapsed else 0.0,
+        "shards": shards,
+        "index": index_writer.path if index_writer is not None else None,
+        "manifest": manifest.path,
+        "dead_letter_file": dead_letters_path(output_dir, prefix) if guarded else None,
+    }
+    if report is not None:
+        result["stats"] = report.as_json()
+        with open(stats_path, "w", encoding="utf-8") as fp:
+            json.dump(result["stats"], fp, indent=2)
+        if report.documents:
+            print(report.format(), file=sys.stderr)
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="grobid2json",
+        description="Convert GROBID TEI XML files into S2ORC JSONL shards",
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="TEI files (.xml or .xml.gz), tar or zip archives of them, "
+        "directories, glob patterns or @file lists of paths",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", required=True, help="directory for the JSONL shards"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: available CPUs)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help="records per output shard",
+    )
+    parser.add_argument(
+        "--task-size",
+        type=int,
+        default=DEFAULT_TASK_SIZE,
+        help="documents sent to a worker per task",
+    )
+    parser.add_argument(
+        "--prefix", default="part", help="file name prefix of the output shards"
+    )
+    parser.add_argument(
+        "--release",
+        action="store_true",
+        help="write Paper.release_json() instead of Paper.as_json()",
+    )
+    parser.add_argument(
+        "--doc-type", default="pdf", help="parse type used by --release output"
+    )
+    parser.add_argument(
+        "--only",
+        choices=ONLY_PARTS,
+        default=None,
+        help="write only the paper_id and this part of every paper, without "
+        "parsing the body",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="bs4",
+        help="conversion engine: the BeautifulSoup reference, the faster lxml one "
+        "or iterparse, lxml reading the file incrementally to bound memory",
+    )
+    parser.add_argument(
+        "--low-memory-above",
+        type=float,
+        default=None,
+        metavar="MIB",
+        help="use the iterparse engine for files larger than MIB",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="SQLite file caching results between runs, keyed by the TEI bytes",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES >> 20,
+        help="cache size limit in MiB before least recently used entries go",
+    )
+    parser.add_argument(
+        "--stats",
+        default=None,
+        metavar="PATH",
+        help="time every conversion stage and write a JSON report to PATH",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="do not write the <prefix>-index.sqlite lookup of paper_ids",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue a previous run into the output directory: skip the inputs "
+        "its <prefix>-manifest.sqlite records as converted and retry failed ones",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="kill and replace a worker that spends longer on one document, and "
+        "write the document to <prefix>-dead-letters.jsonl",
+    )
+    parser.add_argument(
+        "--max-rss",
+        type=float,
+        default=None,
+        metavar="MIB",
+        help="kill and replace a worker whose resident memory grows past MIB while "
+        "converting a document, and dead-letter the document (Linux only)",
+    )
+    parser.add_argument(
+        "--distributed",
+        action="store_true",
+        help="share the inputs with every node running the same command on the "
+        "same output directory, claiming partitions through lease files",
+    )
+    parser.add_argument(
+        "--node-id",
+        default=None,
+        help="name of this node's output directory in a --distributed run "
+        "(default: host name and process id); reuse it to resume after a crash",
+    )
+    parser.add_argument(
+        "--partition-size",
+        type=int,
+        default=DEFAULT_PARTITION_SIZE,
+        help="input paths per partition of a --distributed run",
+    )
+    parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=DEFAULT_LEASE_TTL,
+        help="seconds without a heartbeat before a node's partition is taken over",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="index the output of a finished --distributed run as a whole; run "
+        "it on one node",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="do not report progress"
+    )
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.only and (args.release or args.cache):
+        parser.error("--only cannot be combined with --release or --cache")
+    if not args.inputs and not args.merge:
+        parser.error("the inputs are required")
+    if args.merge and not args.distributed and args.inputs:
+        parser.error("--merge without --distributed takes no inputs")
+    if args.distributed and (args.resume or args.stats):
+        parser.error("--distributed cannot be combined with --resume or --stats")
+    options = dict(
+        workers=args.workers,
+        shard_size=args.shard_size,
+        task_size=args.task_size,
+        release=args.release,
+        doc_type=args.doc_type,
+        progress=not args.quiet,
+        engine=args.engine,
+        cache_path=args.cache,
+        cache_size=args.cache_size << 20,
+        stats_path=args.stats,
+        low_memory_above=(
+            int(args.low_memory_above * (1 << 20))
+            if args.low_memory_above is not None
+            else None
+        ),
+        only=args.only,
+        index=not args.no_index,
+        timeout=args.timeout,
+        max_rss=int(args.max_rss * (1 << 20)) if args.max_rss is not None else None,
+    )
+    if args.distributed or args.merge:
+        from grobid2json.distributed import merge, run_node
+
+        if args.distributed:
+            result = run_node(
+                args.inputs,
+                args.output_dir,
+                node_id=args.node_id,
+                partition_size=args.partition_size,
+                lease_ttl=args.lease_ttl,
+                **options,
+            )
+            print(
+                f"Node {result['node']} converted {result['converted']} documents "
+                f"({result['failed']} failed, {result['dead_letters']} dead-lettered) "
+                f"in {len(result['partitions'])} partitions",
+                file=sys.stderr,
+            )
+        if args.merge:
+            result = merge(args.output_dir, args.prefix)
+            print(
+                f"Merged {result['partitions']} partitions: {result['converted']} "
+                f"documents ({result['failed']} failed, {result['dead_letters']} "
+                f"dead-lettered) in {len(result['shards'])} shards",
+                file=sys.stderr,
+            )
+        return 1 if result["failed"] or result["dead_letters"] else 0
+    result = run_batch(
+        args.inputs, args.output_dir, resume=args.resume, prefix=args.prefix, **options
+    )
+    print(
+        f"Converted {result['converted']} documents ({result['failed']} failed) "
+        f"in {result['elapsed']:.1f}s, {result['docs_per_sec']:.1f} docs/sec, "
+        f"{len(result['shards'])} shards"
+        + (f", {result['skipped']} done before" if result["skipped"] else "")
+        + (f", {result['replaced']} changed since" if result["replaced"] else "")
+        + (
+            f", {result['skipped_dead_letters']} dead-lettered before"
+            if result["skipped_dead_letters"]
+            else ""
+        )
+        + (
+            f", {result['dead_letters']} dead-lettered to {result['dead_letter_file']}"
+            if result["dead_letters"]
+            else ""
+        ),
+        file=sys.stderr,
+    )
+    return (
+        1
+        if result["failed"] or result["dead_letters"] or result["skipped_dead_letters"]
+        else 0
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+On-disk cache of conversion results.
+
+Entries are keyed by a hash of the TEI bytes, the grobid2json version and the
+options that change the output, the engine among them, and hold
+``Paper.as_json()`` serialized as JSON. The store is a single SQLite file in
+WAL mode so pool workers can share it, and the least recently used entries
+are evicted once it outgrows ``max_bytes``. A hit only records its access
+time when the stored one is over ``TOUCH_INTERVAL`` seconds old, so most
+reads take no write lock.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from grobid2json.__version__ import __version__
+
+DEFAULT_MAX_BYTES = 1 << 30
+EVICT_TO = 0.9
+BUSY_TIMEOUT = 60.0
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO usage (id, total) VALUES (0, 0);
+"""
+
+
+def cache_key(xml_data: bytes, **options) -> str:
+    """
+    Hash of the TEI bytes, the grobid2json version and the output options
+    """
+    digest = hashlib.sha256()
+    digest.update(__version__.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(xml_data)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    SQLite-backed LRU cache of serialized ``Paper.as_json()`` results
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value, accessed FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        value, accessed = row
+        now = time.time()
+        if now - accessed > TOUCH_INTERVAL:
+            self._conn.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return value.decode("utf-8")
+
+    def put(self, key: str, value: str):
+        data = value.encode("utf-8")
+        size = len(data)
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time()),
+            )
+            conn.execute(
+                "UPDATE usage SET total = total + ? WHERE id = 0",
+                (size - (row[0] if row else 0),),
+            )
+            self._evict()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self):
+        total = self._conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICT_TO)
+        evicted = []
+        freed = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed"
+        ):
+            if total - freed <= target:
+                break
+            evicted.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._conn.execute("UPDATE usage SET total = total - ? WHERE id = 0", (freed,))
+
+    @property
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,415 @@
+"""
+Asyncio client for a GROBID server, from PDF bytes to S2ORC JSON in memory.
+
+``GrobidClient`` posts PDFs to ``processFulltextDocument`` over a small pool
+of keep-alive HTTP/1.1 connections, with at most ``concurrency`` requests in
+flight and exponential backoff while the server answers 503 (GROBID's way
+of saying its own pool is busy). ``convert_pdfs`` hands every TEI response
+to an executor running the conversion, typically a process pool, and yields
+the JSON lines as they are done; no intermediate files are written.
+
+    python -m grobid2json.client ./pdfs -o ./output --url http://localhost:8070
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, Iterable, Optional, Union
+from urllib.parse import urlsplit
+
+from grobid2json.batch import DEFAULT_SHARD_SIZE, ShardWriter, default_workers
+from grobid2json.convert import ENGINES, convert_bytes_to_json, paper_id_from_path
+from grobid2json.httpio import format_head, read_body, read_head
+from grobid2json.index import ShardIndexWriter, index_path
+from grobid2json.paths import iter_input_paths
+
+DEFAULT_URL = "http://localhost:8070"
+FULLTEXT_PATH = "/api/processFulltextDocument"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_RETRIES = 8
+PDF_SUFFIXES = (".pdf", ".PDF")
+
+
+class GrobidError(Exception):
+    """
+    GROBID answered with an error status, or kept answering 503
+    """
+
+    def __init__(self, status: int, body: bytes = b""):
+        super().__init__(f"GROBID returned HTTP {status}: {body[:200]!r}")
+        self.status = status
+        self.body = body
+
+
+class _Response:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _Connection:
+    __slots__ = ("reader", "writer", "reused")
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to one host, at most ``size`` in use
+    """
+
+    def __init__(self, url: str, size: int = DEFAULT_CONCURRENCY):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.ssl = parts.scheme == "https"
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.size = size
+        self._idle = []
+        # made on first use: before Python 3.10 a semaphore binds to the loop
+        # current when it is created, which may not be the one running it
+        self._slots = None
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl or None
+        )
+        return _Connection(reader, writer)
+
+    async def _exchange(
+        self, connection: _Connection, head: bytes, body: bytes
+    ) -> tuple[_Response, bool]:
+        connection.writer.write(head)
+        connection.writer.write(body)
+        await connection.writer.drain()
+        (version, status, *_), headers = await read_head(connection.reader)
+        response = _Response(
+            int(status), headers, await read_body(connection.reader, headers)
+        )
+        keep_alive = (
+            version == "HTTP/1.1"
+            and headers.get("connection", "").lower() != "close"
+            and ("content-length" in headers or "transfer-encoding" in headers)
+        )
+        return response, keep_alive
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: dict[str, str],
+        body: bytes = b"",
+        timeout: Optional[float] = None,
+    ) -> _Response:
+        """
+        Send a request once a connection slot is free; ``timeout`` bounds the
+        exchange only, not the wait for the slot
+        """
+        head = format_head(
+            f"{method} {self.base_path}{path} HTTP/1.1",
+            {"Host": self.host, **headers, "Content-Length": str(len(body))},
+        )
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            return await asyncio.wait_for(self._send(head, body), timeout)
+
+    async def _send(self, head: bytes, body: bytes) -> _Response:
+        while True:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                response, keep_alive = await self._exchange(connection, head, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.close()
+                if connection.reused:
+                    # the server dropped an idle connection; try a fresh one
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            if keep_alive:
+                connection.reused = True
+                self._idle.append(connection)
+            else:
+                connection.close()
+            return response
+
+    async def close(self):
+        while self._idle:
+            connection = self._idle.pop()
+            connection.close()
+            try:
+                await connection.writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+def _multipart(fields: dict[str, str], filename: str, data: bytes) -> tuple[str, bytes]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            f"\r\n\r\n{value}\r\n".encode("utf-8")
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="input"; '
+        f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'.encode(
+            "utf-8"
+        )
+    )
+    parts.append(data)
+    parts.append(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+class GrobidClient:
+    """
+    Send PDFs to GROBID's ``processFulltextDocument`` and return the TEI.
+
+    ``fields`` are extra form fields sent with every request, e.g.
+    ``{"consolidateCitations": "1"}``. A 503, a dropped connection or a
+    timeout is retried up to ``max_retries`` times, waiting ``backoff``
+    seconds doubled on every attempt (with jitter) or the ``Retry-After`` the
+    server asks for, at most ``max_backoff`` either way. ``timeout`` counts
+    from when a request gets a connection slot, not while it waits for one.
+    """
+
+    def __init__(
+        self,
+        url: str = DEFAULT_URL,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_RETRIES,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        fields: Optional[dict[str, str]] = None,
+    ):
+        self.url = url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.fields = dict(fields or {})
+        self.pool = ConnectionPool(url, concurrency)
+
+    def _delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def process_fulltext(self, pdf: bytes, filename: str = "input.pdf") -> bytes:
+        content_type, body = _multipart(self.fields, filename, pdf)
+        headers = {"Content-Type": content_type, "Accept": "application/xml"}
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await self.pool.request(
+                    "POST", FULLTEXT_PATH, headers, body, self.timeout
+                )
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status == 200:
+                    return response.body
+                if response.status != 503 or attempt >= self.max_retries:
+                    raise GrobidError(response.status, response.body)
+                retry_after = response.headers.get("retry-after")
+            await asyncio.sleep(self._delay(attempt, retry_after))
+            attempt += 1
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+def _read_pdf(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _convert_one(
+    client: GrobidClient,
+    executor: Optional[Executor],
+    paper_id: str,
+    pdf: Union[str, bytes],
+    engine: str,
+) -> tuple[str, Optional[str], Optional[str]]:
+    loop = asyncio.get_running_loop()
+    try:
+        if isinstance(pdf, str):
+            pdf = await loop.run_in_executor(None, _read_pdf, pdf)
+        tei = await client.process_fulltext(pdf, f"{paper_id}.pdf")
+        line = await loop.run_in_executor(
+            executor, convert_bytes_to_json, tei, paper_id, "", engine
+        )
+        return paper_id, line, None
+    except Exception as e:
+        return paper_id, None, f"{type(e).__name__}: {e}"
+
+
+async def convert_pdfs(
+    client: GrobidClient,
+    pdfs: Iterable[tuple[str, Union[str, bytes]]],
+    executor: Optional[Executor] = None,
+    engine: str = "lxml",
+    max_pending: Optional[int] = None,
+) -> AsyncIterator[tuple[str, Optional[str], Optional[str]]]:
+    """
+    Process ``(paper_id, pdf path or bytes)`` pairs through GROBID and convert
+    the TEI on ``executor``, yielding ``(paper_id, line, error)`` in order of
+    completion; at most ``max_pending`` PDFs are held at a time
+    """
+    if max_pending is None:
+        max_pending = client.concurrency * 2
+    pdfs = iter(pdfs)
+    pending = set()
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_pending:
+            item = next(pdfs, None)
+            if item is None:
+                exhausted = True
+                break
+            paper_id, pdf = item
+            pending.add(
+                asyncio.ensure_future(
+                    _convert_one(client, executor, paper_id, pdf, engine)
+                )
+            )
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+
+async def run_pipeline(
+    inputs: Iterable[str],
+    output_dir: str,
+    url: str = DEFAULT_URL,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    workers: Optional[int] = None,
+    engine: str = "lxml",
+    shard_size: Optional[int] = None,
+    prefix: str = "part",
+    fields: Optional[dict[str, str]] = None,
+) -> dict:
+    """
+    Convert PDF files through GROBID into indexed JSONL shards like
+    ``run_batch`` writes
+    """
+    pdfs = (
+        (paper_id_from_path(path), path)
+        for path in iter_input_paths(inputs, PDF_SUFFIXES)
+    )
+    converted = 0
+    failed = 0
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(workers or default_workers()) as executor, ShardWriter(
+        output_dir,
+        prefix,
+        shard_size or DEFAULT_SHARD_SIZE,
+        ShardIndexWriter(index_path(output_dir, prefix)),
+    ) as writer:
+        async with GrobidClient(url, concurrency, fields=fields) as client:
+            async for paper_id, line, error in convert_pdfs(
+                client, pdfs, executor, engine
+            ):
+                if error is None:
+                    writer.write(line, paper_id)
+                    converted += 1
+                else:
+                    failed += 1
+                    print(f"Failed to convert {paper_id}: {error}", file=sys.stderr)
+        shards = list(writer.shard_paths)
+    elapsed = time.perf_counter() - start
+    return {
+        "converted": converted,
+        "failed": failed,
+        "elapsed": elapsed,
+        "docs_per_sec": converted / elapsed if elapsed else 0.0,
+        "shards": shards,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m grobid2json.client",
+        description="Convert PDFs through a GROBID server into S2ORC JSONL shards",
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="PDF files, directories, glob patterns or @lists"
+    )
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("--url", default=DEFAULT_URL, help="GROBID server URL")
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="requests in flight to GROBID",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="conversion processes"
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="lxml")
+    parser.add_argument("--shard-size", type=int, default=None)
+    parser.add_argument("--prefix", default="part")
+    parser.add_argument(
+        "--field",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="extra GROBID form field, e.g. consolidateCitations=1",
+    )
+    args = parser.parse_args(argv)
+    fields = dict(field.split("=", 1) for field in args.field)
+    result = asyncio.run(
+        run_pipeline(
+            args.inputs,
+            args.output_dir,
+            url=args.url,
+            concurrency=args.concurrency,
+            workers=args.workers,
+            engine=args.engine,
+            shard_size=args.shard_size,
+            prefix=args.prefix,
+            fields=fields,
+        )
+    )
+    print(
+        f"Converted {result['converted']} documents ({result['failed']} failed) "
+        f"in {result['elapsed']:.1f}s, {result['docs_per_sec']:.1f} docs/sec",
+        file=sys.stderr,
+    )
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
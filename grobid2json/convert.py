@@ -0,0 +1,368 @@
+"""
+Conversion entry points that take raw TEI bytes or file paths.
+
+Parsing is owned here rather than by callers, so the tree builder and parser
+objects can be chosen and reused in one place.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from typing import Iterator, Optional, Union
+
+from bs4 import BeautifulSoup, FeatureNotFound
+from bs4.builder import builder_registry
+
+from grobid2json import incremental, lxml_engine, main
+from grobid2json.cache import ConversionCache, cache_key
+from grobid2json.main import convert_xml_to_json
+from grobid2json.s2orc import (
+    Paper,
+    bib_entry_json,
+    metadata_json,
+    paragraph_json,
+    ref_entry_json,
+)
+from grobid2json.serialize import dumps_str
+from grobid2json.stats import ConversionStats
+
+ENGINES = ("bs4", "lxml", "iterparse")
+ENGINE_MODULES = {"bs4": main, "lxml": lxml_engine, "iterparse": incremental}
+# the element slices read by the metadata and bibliography entry points are
+# small, so the incremental engine parses them like the lxml one
+SLICE_ENGINES = {"bs4": "bs4", "lxml": "lxml", "iterparse": "lxml"}
+
+_ATTRIBUTES = rb"""(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*"""
+_ROOT_START = re.compile(rb"<([^\s/>?!]+)" + _ATTRIBUTES + rb"(/?)>")
+
+_local = threading.local()
+
+
+def paper_id_from_path(path: str) -> str:
+    return os.path.basename(path).split(".")[0]
+
+
+def _soup_builder_class():
+    builder_class = builder_registry.lookup("lxml-xml") or builder_registry.lookup(
+        "xml"
+    )
+    if builder_class is None:
+        raise FeatureNotFound(
+            "No XML tree builder is available for BeautifulSoup, install lxml"
+        )
+    return builder_class
+
+
+def make_soup(xml_data: bytes) -> BeautifulSoup:
+    """
+    Parse TEI bytes with the fastest XML tree builder available.
+
+    The builder keeps namespace stacks between documents, so one instance is
+    reused per thread and only dropped when a parse fails half way.
+    """
+    builder = getattr(_local, "soup_builder", None)
+    if builder is None:
+        builder = _local.soup_builder = _soup_builder_class()()
+    try:
+        return BeautifulSoup(xml_data, builder=builder)
+    except Exception:
+        _local.soup_builder = None
+        raise
+
+
+def _lxml_parser():
+    parser = getattr(_local, "lxml_parser", None)
+    if parser is None:
+        parser = _local.lxml_parser = lxml_engine.make_parser()
+    return parser
+
+
+def parse_bytes(xml_data: bytes, engine: str = "bs4"):
+    """
+    Parse TEI bytes into the tree type used by ``engine``
+    """
+    if engine == "bs4":
+        return make_soup(xml_data)
+    if engine == "lxml":
+        return lxml_engine.parse_xml(xml_data, _lxml_parser())
+    if engine == "iterparse":
+        return incremental.IncrementalReader(xml_data)
+    raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+
+
+def convert_tree(
+    tree,
+    paper_id: str,
+    pdf_hash: str = "",
+    engine: str = "bs4",
+    stats: Optional[ConversionStats] = None,
+    as_dict: bool = False,
+) -> Union[Paper, dict]:
+    """
+    Convert a tree from ``parse_bytes`` into a ``Paper``, or with ``as_dict``
+    directly into the dict ``Paper.as_json()`` would return
+    """
+    if engine == "lxml":
+        convert = lxml_engine.convert_tree_to_json
+    elif engine == "iterparse":
+        convert = incremental.convert_tree_to_json
+    else:
+        convert = convert_xml_to_json
+    return convert(tree, paper_id, pdf_hash, stats, as_dict)
+
+
+def _convert(
+    xml_data: bytes,
+    paper_id: str,
+    pdf_hash: str,
+    engine: str,
+    stats: Optional[ConversionStats],
+    as_dict: bool = False,
+) -> Union[Paper, dict]:
+    if stats is not None:
+        stats.start("parse")
+    return convert_tree(
+        parse_bytes(xml_data, engine), paper_id, pdf_hash, engine, stats, as_dict
+    )
+
+
+def convert_bytes(
+    xml_data: bytes,
+    paper_id: str,
+    pdf_hash: str = "",
+    engine: str = "bs4",
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+) -> Paper:
+    """
+    Convert GROBID TEI bytes into a ``Paper``, reusing a result from ``cache``
+    when the same input has been converted before
+    """
+    if cache is None:
+        return _convert(xml_data, paper_id, pdf_hash, engine, stats)
+    key = cache_key(xml_data, paper_id=paper_id, pdf_hash=pdf_hash, engine=engine)
+    cached = cache.get(key)
+    if cached is not None:
+        return Paper(**json.loads(cached))
+    paper = _convert(xml_data, paper_id, pdf_hash, engine, stats)
+    cache.put(key, dumps_str(paper.as_json()))
+    return paper
+
+
+def convert_bytes_to_json(
+    xml_data: bytes,
+    paper_id: str,
+    pdf_hash: str = "",
+    engine: str = "bs4",
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+) -> str:
+    """
+    Convert GROBID TEI bytes into ``Paper.as_json()`` serialized as JSON; a
+    cache hit is returned as stored
+    """
+    if cache is not None:
+        key = cache_key(xml_data, paper_id=paper_id, pdf_hash=pdf_hash, engine=engine)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    line = dumps_str(_convert(xml_data, paper_id, pdf_hash, engine, stats, True))
+    if cache is not None:
+        cache.put(key, line)
+    return line
+
+
+class ParagraphStream:
+    """
+    A paper whose metadata, bibliography and figures are extracted up front
+    and whose paragraphs are converted one at a time while iterating.
+
+    Iterating yields ``(part, paragraph)`` with ``part`` one of
+    ``"abstract"``, ``"body_text"`` and ``"back_matter"`` and ``paragraph``
+    shaped like the entries of ``Paper.as_json()``. The tree is consumed on
+    the way, so a stream can be iterated once.
+    """
+
+    def __init__(
+        self,
+        tree,
+        paper_id: str,
+        pdf_hash: str = "",
+        engine: str = "bs4",
+        stats: Optional[ConversionStats] = None,
+    ):
+        module = ENGINE_MODULES.get(engine, main)
+        metadata, bib_dict, ref_dict, bracket = module.extract_front_matter(tree, stats)
+        self.paper_id = paper_id
+        self.pdf_hash = pdf_hash
+        self.metadata = metadata_json(metadata)
+        self.bib_entries = {key: bib_entry_json(bib) for key, bib in bib_dict.items()}
+        self.ref_entries = {key: ref_entry_json(ref) for key, ref in ref_dict.items()}
+        self.stats = stats
+        self._paragraphs = module.iter_paper_paragraphs(
+            tree, bib_dict, ref_dict, bracket, stats
+        )
+
+    def __iter__(self) -> Iterator[tuple[str, dict]]:
+        for part, para in self._paragraphs:
+            yield part, paragraph_json(para)
+        if self.stats is not None:
+            self.stats.stop()
+
+
+def iter_paragraphs(
+    xml_data: bytes,
+    paper_id: str,
+    pdf_hash: str = "",
+    engine: str = "bs4",
+    stats: Optional[ConversionStats] = None,
+) -> ParagraphStream:
+    """
+    Parse GROBID TEI bytes and return a ``ParagraphStream`` over them: the
+    metadata and bibliography are ready on return, the paragraphs follow
+    lazily
+    """
+    if stats is not None:
+        stats.start("parse")
+    return ParagraphStream(
+        parse_bytes(xml_data, engine), paper_id, pdf_hash, engine, stats
+    )
+
+
+def slice_element(xml_data: bytes, name: str) -> bytes:
+    """
+    Cut the first ``name`` element out of TEI bytes and wrap it in the prolog
+    and root start tag of the document, so it can be parsed without the rest.
+
+    The whole document is returned whenever the cut could differ from what a
+    full parse would find: comments or CDATA before the end of the element,
+    nested elements of the same name or anything unusual about the root.
+    """
+    root = _ROOT_START.search(xml_data)
+    if root is None or root.group(2):
+        return xml_data
+    tag = name.encode("ascii")
+    start = re.compile(rb"<" + tag + _ATTRIBUTES + rb"(/?)>").search(
+        xml_data, root.end()
+    )
+    if start is None:
+        return xml_data
+    if start.group(1):
+        end = start.end()
+    else:
+        close = re.compile(rb"</" + tag + rb"\s*>").search(xml_data, start.end())
+        if close is None or re.search(
+            rb"<" + tag + rb"[\s/>]", xml_data[start.end() : close.start()]
+        ):
+            return xml_data
+        end = close.end()
+    head = xml_data[: root.end()]
+    if b"<!--" in xml_data[:end] or b"<![CDATA[" in xml_data[:end]:
+        return xml_data
+    return b"".join((head, xml_data[start.start() : end], b"</", root.group(1), b">"))
+
+
+def _parse_slice(
+    xml_data: bytes, name: str, engine: str, stats: Optional[ConversionStats]
+):
+    if engine not in SLICE_ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if stats is not None:
+        stats.start("parse")
+    tree_engine = SLICE_ENGINES[engine]
+    return parse_bytes(slice_element(xml_data, name), tree_engine), tree_engine
+
+
+def extract_metadata(
+    xml_data: bytes,
+    engine: str = "bs4",
+    stats: Optional[ConversionStats] = None,
+) -> dict:
+    """
+    Extract only the metadata of GROBID TEI bytes, shaped like
+    ``Paper.as_json()["metadata"]``; the body is never parsed
+    """
+    tree, tree_engine = _parse_slice(xml_data, "fileDesc", engine, stats)
+    if stats is not None:
+        stats.start("metadata")
+    metadata = metadata_json(
+        ENGINE_MODULES[tree_engine].extract_metadata_from_tei_xml(tree)
+    )
+    if stats is not None:
+        stats.stop()
+    return metadata
+
+
+def extract_bib_entries(
+    xml_data: bytes,
+    engine: str = "bs4",
+    stats: Optional[ConversionStats] = None,
+) -> dict[str, dict]:
+    """
+    Extract only the bibliography of GROBID TEI bytes, shaped like
+    ``Paper.as_json()["bib_entries"]``; the body is never parsed
+    """
+    tree, tree_engine = _parse_slice(xml_data, "listBibl", engine, stats)
+    if stats is not None:
+        stats.start("bibliography")
+    bib_dict = ENGINE_MODULES[tree_engine].extract_bib_entries_from_tei_xml(tree)
+    bib_entries = {key: bib_entry_json(bib) for key, bib in bib_dict.items()}
+    if stats is not None:
+        stats.stop()
+    return bib_entries
+
+
+def read_file(path: str) -> bytes:
+    """
+    Read a TEI file, decompressing ``.gz`` ones
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def convert_file(
+    path: str,
+    paper_id: Optional[str] = None,
+    pdf_hash: str = "",
+    engine: str = "bs4",
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+) -> Paper:
+    """
+    Convert a GROBID TEI file; ``paper_id`` defaults to the file name stem
+    """
+    if paper_id is None:
+        paper_id = paper_id_from_path(path)
+    if engine == "iterparse" and cache is None:
+        # stream from the file instead of reading it into memory first
+        return convert_tree(
+            incremental.IncrementalReader(path), paper_id, pdf_hash, engine, stats
+        )
+    return convert_bytes(read_file(path), paper_id, pdf_hash, engine, cache, stats)
+
+
+def convert_file_to_json(
+    path: str,
+    paper_id: Optional[str] = None,
+    pdf_hash: str = "",
+    engine: str = "bs4",
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+) -> str:
+    """
+    Convert a GROBID TEI file into ``Paper.as_json()`` serialized as JSON
+    """
+    if paper_id is None:
+        paper_id = paper_id_from_path(path)
+    if engine == "iterparse" and cache is None:
+        paper_dict = convert_tree(
+            incremental.IncrementalReader(path), paper_id, pdf_hash, engine, stats, True
+        )
+        return dumps_str(paper_dict)
+    return convert_bytes_to_json(
+        read_file(path), paper_id, pdf_hash, engine, cache, stats
+    )
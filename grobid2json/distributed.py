@@ -0,0 +1,402 @@
+"""
+Batch runs spread over several nodes sharing a filesystem, without a
+coordinator.
+
+Every node runs ``run_node`` with the same inputs and output directory. The
+first one to get there splits the inputs into partitions of
+``partition_size`` paths under ``<output_dir>/queue``. Nodes then claim
+partitions through lease files, created atomically with a hard link and
+kept alive by a heartbeat thread that touches them. A lease that has not been touched for
+``lease_ttl`` seconds is expired, and any idle node can break it and take
+the partition over. Every node converts its partitions with ``run_batch``
+into its own ``nodes/<node_id>`` directory, one set of shards per
+partition. A finished partition is marked done with a hard link, which only
+one node can create. The other node's copy is then discarded, so a
+partition converted twice is still merged once. ``merge`` builds one
+``part-index.sqlite`` over the shards of every partition once all are done.
+
+Expiry compares file modification times with the local clock, so the clocks
+of the nodes must agree to well within ``lease_ttl``.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from grobid2json.archive import ARCHIVE_SUFFIXES
+from grobid2json.batch import (
+    DEFAULT_LEASE_TTL,
+    DEFAULT_PARTITION_SIZE,
+    dead_letters_path,
+    list_shards,
+    run_batch,
+)
+from grobid2json.index import ShardIndexWriter, index_path
+from grobid2json.manifest import MANIFEST_SUFFIX, Manifest, manifest_path
+from grobid2json.paths import TEI_SUFFIXES, chunked, iter_input_paths
+
+QUEUE_DIR = "queue"
+NODES_DIR = "nodes"
+PLAN_FILE = "plan.json"
+RENEW_RETRY_DELAY = 0.5
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _write_atomic(path: str, data: str):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        fp.write(data)
+    os.replace(tmp_path, path)
+
+
+def _create_exclusive(path: str, data: str) -> bool:
+    """
+    Create ``path`` holding ``data`` unless it exists; a hard link is atomic
+    on network filesystems too, where ``O_EXCL`` may not be
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        fp.write(data)
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as fp:
+            return json.load(fp)
+    except (FileNotFoundError, ValueError):
+        # gone, or caught between creation and the first write
+        return None
+
+
+class Lease:
+    """
+    Exclusive claim on a piece of work, held as long as its file is touched
+    more often than every ``ttl`` seconds
+    """
+
+    def __init__(self, path: str, owner: str, token: str, ttl: float):
+        self.path = path
+        self.owner = owner
+        self.token = token
+        self.ttl = ttl
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def acquire(cls, path: str, owner: str, ttl: float) -> Optional["Lease"]:
+        """
+        The lease at ``path``, unless another owner holds it and it has not
+        expired
+        """
+        token = uuid.uuid4().hex
+        data = json.dumps({"owner": owner, "token": token})
+        for _ in range(2):
+            if _create_exclusive(path, data):
+                return cls(path, owner, token, ttl)
+            try:
+                seen = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if time.time() - seen.st_mtime <= ttl:
+                return None
+            # of the nodes renaming the expired lease away, only one succeeds
+            stale_path = f"{path}.{token}.expired"
+            try:
+                os.rename(path, stale_path)
+            except FileNotFoundError:
+                return None
+            stale = os.stat(stale_path)
+            if (stale.st_ino, stale.st_mtime) != (seen.st_ino, seen.st_mtime):
+                # another node took the lease over in between; give it back
+                try:
+                    os.link(stale_path, path)
+                except FileExistsError:
+                    pass
+                os.remove(stale_path)
+                return None
+            os.remove(stale_path)
+        return None
+
+    def renew(self) -> bool:
+        """
+        Touch the lease file; ``False`` once it was taken over
+        """
+        for attempt in range(2):
+            content = _read_json(self.path)
+            if content is not None:
+                if content.get("token") != self.token:
+                    break
+                try:
+                    os.utime(self.path)
+                    return True
+                except FileNotFoundError:
+                    pass
+            if attempt == 0:
+                # briefly gone while another node's acquire renames it away
+                # to check it and links it back
+                time.sleep(RENEW_RETRY_DELAY)
+        self.lost = True
+        return False
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.ttl / 3):
+            if not self.renew():
+                return
+
+    def start_heartbeat(self):
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if not self.lost and self.renew():
+            os.remove(self.path)
+
+    def __enter__(self):
+        self.start_heartbeat()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class WorkQueue:
+    """
+    The partitions of a distributed run and their leases and done markers,
+    under ``<output_dir>/queue``
+    """
+
+    def __init__(self, output_dir: str, lease_ttl: float = DEFAULT_LEASE_TTL):
+        self.output_dir = output_dir
+        self.root = os.path.join(output_dir, QUEUE_DIR)
+        self.lease_ttl = lease_ttl
+        for name in ("partitions", "leases", "done"):
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+
+    def _path(self, kind: str, partition: int, suffix: str) -> str:
+        return os.path.join(self.root, kind, f"{partition:05d}{suffix}")
+
+    def partition_path(self, partition: int) -> str:
+        return self._path("partitions", partition, ".txt")
+
+    def done_path(self, partition: int) -> str:
+        return self._path("done", partition, ".json")
+
+    def plan(
+        self,
+        inputs: Iterable[str],
+        owner: str,
+        partition_size: int = DEFAULT_PARTITION_SIZE,
+        poll_interval: float = 1.0,
+    ) -> int:
+        """
+        Split ``inputs`` into partitions unless a node did already; returns
+        the number of partitions
+        """
+        plan_path = os.path.join(self.root, PLAN_FILE)
+        while True:
+            plan = _read_json(plan_path)
+            if plan is not None:
+                return plan["partitions"]
+            lease = Lease.acquire(
+                os.path.join(self.root, "plan.lease"), owner, self.lease_ttl
+            )
+            if lease is None:
+                time.sleep(poll_interval)
+                continue
+            with lease:
+                plan = _read_json(plan_path)
+                if plan is not None:
+                    # planned by the node that held the lease before
+                    return plan["partitions"]
+                paths = iter_input_paths(inputs, TEI_SUFFIXES + ARCHIVE_SUFFIXES)
+                partitions = 0
+                for partitions, chunk in enumerate(chunked(paths, partition_size), 1):
+                    self._write_partition(partitions - 1, chunk)
+                _write_atomic(plan_path, json.dumps({"partitions": partitions}))
+            return partitions
+
+    def _write_partition(self, partition: int, paths: list[str]):
+        lines = "".join(f"{os.path.abspath(path)}\n" for path in paths)
+        _write_atomic(self.partition_path(partition), lines)
+
+    def partitions(self) -> int:
+        plan = _read_json(os.path.join(self.root, PLAN_FILE))
+        if plan is None:
+            raise RuntimeError(f"No partitions planned in {self.root}")
+        return plan["partitions"]
+
+    def done(self, partition: int) -> Optional[dict]:
+        return _read_json(self.done_path(partition))
+
+    def remaining(self) -> list[int]:
+        return [
+            partition
+            for partition in range(self.partitions())
+            if not os.path.exists(self.done_path(partition))
+        ]
+
+    def claim(self, owner: str) -> Optional[tuple[int, Lease]]:
+        """
+        Lease the first partition that is neither done nor leased
+        """
+        for partition in self.remaining():
+            lease = Lease.acquire(
+                self._path("leases", partition, ".lease"), owner, self.lease_ttl
+            )
+            if lease is None:
+                continue
+            if os.path.exists(self.done_path(partition)):
+                lease.release()
+                continue
+            return partition, lease
+        return None
+
+    def complete(self, partition: int, record: dict) -> bool:
+        """
+        Mark a partition done; ``False`` if another node did first
+        """
+        return _create_exclusive(self.done_path(partition), json.dumps(record))
+
+
+def partition_prefix(partition: int) -> str:
+    return f"p{partition:05d}"
+
+
+def _remove_output(output_dir: str, prefix: str):
+    for path in list_shards(output_dir, prefix) + [
+        index_path(output_dir, prefix),
+        manifest_path(output_dir, prefix),
+        dead_letters_path(output_dir, prefix),
+    ]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_node(
+    inputs: Iterable[str],
+    output_dir: str,
+    node_id: Optional[str] = None,
+    partition_size: int = DEFAULT_PARTITION_SIZE,
+    lease_ttl: float = DEFAULT_LEASE_TTL,
+    poll_interval: Optional[float] = None,
+    **options,
+) -> dict:
+    """
+    Convert partitions of a distributed run until every partition is done;
+    ``options`` are passed on to ``run_batch``. A node restarted with the
+    same ``node_id`` resumes the partitions it had started.
+    """
+    node_id = node_id or default_node_id()
+    poll_interval = poll_interval if poll_interval is not None else lease_ttl / 4
+    queue = WorkQueue(output_dir, lease_ttl)
+    queue.plan(inputs, node_id, partition_size, poll_interval)
+    node_dir = os.path.join(output_dir, NODES_DIR, node_id)
+    converted = failed = dead = 0
+    partitions = []
+    while queue.remaining():
+        claimed = queue.claim(node_id)
+        if claimed is None:
+            # the rest is leased to other nodes; wait in case one of them dies
+            time.sleep(poll_interval)
+            continue
+        partition, lease = claimed
+        prefix = partition_prefix(partition)
+        with lease:
+            result = run_batch(
+                [f"@{queue.partition_path(partition)}"],
+                node_dir,
+                prefix=prefix,
+                resume=True,
+                **options,
+            )
+            record = {
+                "partition": partition,
+                "node": node_id,
+                "output_dir": os.path.relpath(node_dir, output_dir),
+                "prefix": prefix,
+                "converted": result["converted"] + result["skipped"],
+                "failed": result["failed"],
+                "dead_letters": (
+                    result["dead_letters"] + result["skipped_dead_letters"]
+                ),
+                # of which were done before a restart of this node
+                "skipped": result["skipped"],
+                "skipped_dead_letters": result["skipped_dead_letters"],
+            }
+            if lease.renew() and queue.complete(partition, record):
+                converted += record["converted"]
+                failed += record["failed"]
+                dead += record["dead_letters"]
+                partitions.append(partition)
+                continue
+        # the lease expired and another node finished the partition first
+        _remove_output(node_dir, prefix)
+    return {
+        "node": node_id,
+        "partitions": partitions,
+        "converted": converted,
+        "failed": failed,
+        "dead_letters": dead,
+    }
+
+
+def merge(output_dir: str, prefix: str = "part") -> dict:
+    """
+    Index the records of every partition in ``<prefix>-index.sqlite`` and
+    remove the output of partitions converted twice
+    """
+    queue = WorkQueue(output_dir)
+    remaining = queue.remaining()
+    if remaining:
+        raise RuntimeError(f"{len(remaining)} partitions are not done yet")
+    winners = set()
+    shards = []
+    converted = failed = dead = 0
+    with ShardIndexWriter(index_path(output_dir, prefix)) as index:
+        shard_ids = {}
+        for partition in range(queue.partitions()):
+            done = queue.done(partition)
+            node_dir = os.path.join(output_dir, done["output_dir"])
+            winners.add((os.path.abspath(node_dir), done["prefix"]))
+            converted += done["converted"]
+            failed += done["failed"]
+            dead += done["dead_letters"]
+            with Manifest(manifest_path(node_dir, done["prefix"]), resume=True) as m:
+                for paper_id, shard_path, offset, length in m.records():
+                    if shard_path not in shard_ids:
+                        shard_ids[shard_path] = index.add_shard(shard_path)
+                        shards.append(shard_path)
+                    index.add(paper_id, shard_ids[shard_path], offset, length)
+    nodes_dir = os.path.join(output_dir, NODES_DIR)
+    for node in sorted(os.listdir(nodes_dir)) if os.path.isdir(nodes_dir) else []:
+        node_dir = os.path.abspath(os.path.join(nodes_dir, node))
+        for name in os.listdir(node_dir):
+            if name.endswith(MANIFEST_SUFFIX):
+                node_prefix = name[: -len(MANIFEST_SUFFIX)]
+                if (node_dir, node_prefix) not in winners:
+                    _remove_output(node_dir, node_prefix)
+    return {
+        "partitions": queue.partitions(),
+        "converted": converted,
+        "failed": failed,
+        "dead_letters": dead,
+        "shards": shards,
+        "index": index_path(output_dir, prefix),
+    }
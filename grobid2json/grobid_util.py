@@ -6,6 +6,10 @@ import bs4
 from bs4 import BeautifulSoup
 
 SUBSTITUTE_TAGS = {"persName", "orgName", "publicationStmt", "titleStmt", "biblScope"}
+# tag names as they are found before and after clean_tags
+PERS_NAME_TAGS = ["persName", "persname"]
+BIBL_SCOPE_TAGS = {"biblScope", "biblscope"}
+VENUE_LEVELS = ["j", "m", "s"]
 
 
 def clean_tags(el: bs4.element.Tag):
@@ -24,43 +28,44 @@ def get_title_from_grobid_xml(raw_xml: BeautifulSoup) -> str:
         return ""
 
 
-def get_author_names_from_grobid_xml(raw_xml: BeautifulSoup) -> list[dict[str, str]]:
-    names = []
+def get_author_name_from_grobid_xml(author: bs4.element.Tag) -> Optional[dict]:
+    pers_name = author.find(PERS_NAME_TAGS)
+    if not pers_name:
+        return None
+    forenames = pers_name.find_all("forename")
+    surnames = pers_name.find_all("surname")
 
-    for author in raw_xml.find_all("author"):
-        if not author.persname:
-            continue
-        forenames = author.persname.find_all("forename")
-        surnames = author.persname.find_all("surname")
-        suffixes = author.persname.find_all("suffix")
+    first = ""
+    middle = []
+    last = ""
+    suffix = ""
 
-        first = ""
-        middle = []
-        last = ""
-        suffix = ""
-
-        for forename in forenames:
-            if forename["type"] == "first":
-                if not first:
-                    first = forename.text
-                else:
-                    middle.append(forename.text)
-            elif forename["type"] == "middle":
+    for forename in forenames:
+        if forename["type"] == "first":
+            if not first:
+                first = forename.text
+            else:
                 middle.append(forename.text)
+        elif forename["type"] == "middle":
+            middle.append(forename.text)
 
-        if len(surnames) > 1:
-            for surname in surnames[:-1]:
-                middle.append(surname.text)
-            last = surnames[-1].text
-        elif len(surnames) == 1:
-            last = surnames[0].text
+    if len(surnames) > 1:
+        for surname in surnames[:-1]:
+            middle.append(surname.text)
+        last = surnames[-1].text
+    elif len(surnames) == 1:
+        last = surnames[0].text
 
-        if len(suffix) >= 1:
-            suffix = " ".join([suffix.text for suffix in suffixes])
+    return {"first": first, "middle": middle, "last": last, "suffix": suffix}
 
-        names_dict = {"first": first, "middle": middle, "last": last, "suffix": suffix}
 
-        names.append(names_dict)
+def get_author_names_from_grobid_xml(raw_xml: BeautifulSoup) -> list[dict[str, str]]:
+    names = []
+
+    for author in raw_xml.find_all("author"):
+        names_dict = get_author_name_from_grobid_xml(author)
+        if names_dict is not None:
+            names.append(names_dict)
     return names
 
 
@@ -146,9 +151,9 @@ def get_author_data_from_grobid_xml(raw_xml: BeautifulSoup) -> list[dict]:
     return authors
 
 
-def get_year_from_grobid_xml(raw_xml: BeautifulSoup) -> Optional[int]:
-    if raw_xml.date and raw_xml.date.has_attr("when"):
-        year_match = re.match(r"((19|20)\d{2})", raw_xml.date["when"])
+def get_year_from_date(date: Optional[bs4.element.Tag]) -> Optional[int]:
+    if date and date.has_attr("when"):
+        year_match = re.match(r"((19|20)\d{2})", date["when"])
         if year_match:
             year = year_match.group(0)
             if year and year.isnumeric() and len(year) == 4:
@@ -156,22 +161,29 @@ def get_year_from_grobid_xml(raw_xml: BeautifulSoup) -> Optional[int]:
     return None
 
 
-def get_venue_from_grobid_xml(raw_xml: BeautifulSoup, title_text: str) -> str:
+def get_year_from_grobid_xml(raw_xml: BeautifulSoup) -> Optional[int]:
+    return get_year_from_date(raw_xml.date)
+
+
+def get_venue_from_titles(titles: list[bs4.element.Tag], title_text: str) -> str:
     title_names = []
-    keep_types = ["j", "m", "s"]
-    for title_entry in raw_xml.find_all("title"):
+    for title_entry in titles:
         if (
             title_entry.has_attr("level")
-            and title_entry["level"] in keep_types
+            and title_entry["level"] in VENUE_LEVELS
             and title_entry.text != title_text
         ):
             title_names.append((title_entry["level"], title_entry.text))
     if title_names:
-        title_names.sort(key=lambda x: keep_types.index(x[0]))
+        title_names.sort(key=lambda x: VENUE_LEVELS.index(x[0]))
         return title_names[0][1]
     return ""
 
 
+def get_venue_from_grobid_xml(raw_xml: BeautifulSoup, title_text: str) -> str:
+    return get_venue_from_titles(raw_xml.find_all("title"), title_text)
+
+
 def get_volume_from_grobid_xml(raw_xml: BeautifulSoup) -> str:
     for bibl_entry in raw_xml.find_all("biblscope"):
         if bibl_entry.has_attr("unit") and bibl_entry["unit"] == "volume":
@@ -186,6 +198,15 @@ def get_issue_from_grobid_xml(raw_xml: BeautifulSoup) -> str:
     return ""
 
 
+def get_pages_from_bibl_scope(bibl_entry: bs4.element.Tag) -> str:
+    from_page = bibl_entry["from"]
+    if bibl_entry.has_attr("to"):
+        to_page = bibl_entry["to"]
+        return f"{from_page}--{to_page}"
+    else:
+        return from_page
+
+
 def get_pages_from_grobid_xml(raw_xml: BeautifulSoup) -> str:
     for bibl_entry in raw_xml.find_all("biblscope"):
         if (
@@ -193,12 +214,7 @@ def get_pages_from_grobid_xml(raw_xml: BeautifulSoup) -> str:
             and bibl_entry["unit"] == "page"
             and bibl_entry.has_attr("from")
         ):
-            from_page = bibl_entry["from"]
-            if bibl_entry.has_attr("to"):
-                to_page = bibl_entry["to"]
-                return f"{from_page}--{to_page}"
-            else:
-                return from_page
+            return get_pages_from_bibl_scope(bibl_entry)
     return ""
 
 
@@ -233,19 +249,71 @@ def get_publication_datetime_from_grobid_xml(raw_xml: BeautifulSoup) -> str:
 
 
 def parse_bib_entry(bib_entry: BeautifulSoup) -> dict:
-    clean_tags(bib_entry)
-    title = get_title_from_grobid_xml(bib_entry)
+    """
+    Fill every field of a bibliography entry in one walk over ``bib_entry``.
+
+    Gives the same result as running the ``get_*_from_grobid_xml`` getters
+    after ``clean_tags``, without renaming tags or rescanning the entry for
+    each field.
+    """
+    level_a_title = None
+    first_title = None
+    titles = []
+    authors = []
+    date = None
+    scopes = {}
+    pages = None
+    other_ids = defaultdict(list)
+    raw_text = None
+
+    for tag in bib_entry.descendants:
+        name = tag.name
+        if name is None:
+            continue
+        if name == "title":
+            titles.append(tag)
+            if first_title is None:
+                first_title = tag
+            if level_a_title is None and tag.get("level") == "a":
+                level_a_title = tag
+        elif name == "author":
+            names_dict = get_author_name_from_grobid_xml(tag)
+            if names_dict is not None:
+                authors.append(names_dict)
+        elif name == "date":
+            if date is None:
+                date = tag
+        elif name in BIBL_SCOPE_TAGS:
+            unit = tag.get("unit")
+            if unit == "page":
+                if pages is None and tag.has_attr("from"):
+                    pages = get_pages_from_bibl_scope(tag)
+            elif (unit == "volume" or unit == "issue") and unit not in scopes:
+                scopes[unit] = tag.text
+        elif name == "idno":
+            if tag.has_attr("type") and tag.text:
+                other_ids[tag["type"]].append(tag.text)
+        elif name == "note":
+            if raw_text is None and tag.get("type") == "raw_reference":
+                raw_text = tag.text
+
+    if level_a_title is not None:
+        title = level_a_title.text
+    elif first_title is not None:
+        title = first_title.text
+    else:
+        title = ""
     return {
         "ref_id": bib_entry.attrs.get("xml:id", None),
         "title": title,
-        "authors": get_author_names_from_grobid_xml(bib_entry),
-        "year": get_year_from_grobid_xml(bib_entry),
-        "venue": get_venue_from_grobid_xml(bib_entry, title),
-        "volume": get_volume_from_grobid_xml(bib_entry),
-        "issue": get_issue_from_grobid_xml(bib_entry),
-        "pages": get_pages_from_grobid_xml(bib_entry),
-        "other_ids": get_other_ids_from_grobid_xml(bib_entry),
-        "raw_text": get_raw_bib_text_from_grobid_xml(bib_entry),
+        "authors": authors,
+        "year": get_year_from_date(date),
+        "venue": get_venue_from_titles(titles, title),
+        "volume": scopes.get("volume", ""),
+        "issue": scopes.get("issue", ""),
+        "pages": pages or "",
+        "other_ids": other_ids,
+        "raw_text": raw_text or "",
         "urls": [],
     }
 
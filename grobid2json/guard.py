@@ -0,0 +1,312 @@
+"""
+Process pool with per-document time and memory limits.
+
+``GuardedPool`` runs batch tasks like a ``ProcessPoolExecutor``, except that
+a task's items are converted one at a time and every worker publishes in
+shared memory which item it is on, since when and which pipeline stage it
+is in (through ``ConversionStats.on_stage``). A monitor thread kills a
+worker that spends more than ``timeout`` seconds on one item or whose
+resident memory grows past ``max_rss`` bytes, and starts a replacement.
+The item is returned as a ``DeadLetter`` holding the stage it was stuck in,
+and the rest of the task goes on in another worker. A worker whose memory
+stays above ``max_rss`` after an item retires before taking the next one.
+Memory is read from ``/proc``, so ``max_rss`` needs Linux. Replacements are
+started from the monitor thread while other threads run, so workers come
+from a forkserver (or spawn) context rather than a bare fork, which could
+copy a lock some other thread holds.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from multiprocessing.connection import wait
+from multiprocessing.context import BaseContext
+from typing import Callable, NamedTuple, Optional
+
+from grobid2json.stats import STAGES
+
+DEFAULT_POLL_INTERVAL = 0.05
+
+_STAGE_CODES = {stage: code for code, stage in enumerate(STAGES)}
+_PENDING = object()
+
+
+class DeadLetter(NamedTuple):
+    """
+    An item whose worker was killed: ``reason`` is ``"timeout"``,
+    ``"memory"`` or ``"crashed"``
+    """
+
+    input: str
+    reason: str
+    stage: Optional[str]
+    elapsed: float
+    rss: Optional[int]
+
+    @property
+    def error(self) -> str:
+        stage = f" in stage {self.stage}" if self.stage is not None else ""
+        return f"Worker killed ({self.reason}) after {self.elapsed:.1f}s{stage}"
+
+
+def rss(pid: int) -> Optional[int]:
+    """
+    Resident memory of a process in bytes
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def default_context() -> BaseContext:
+    """
+    forkserver where the platform has it, spawn otherwise; never a bare fork
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _work(conn, state, max_rss: Optional[int]):
+    """
+    Worker loop: run ``fn([item], *args, on_stage=...)`` for every item of a
+    task, keeping ``state`` at ``[item index, start time, stage code]``
+    """
+
+    def on_stage(stage: Optional[str]):
+        state[2] = _STAGE_CODES.get(stage, -1)
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        fn, items, args = task
+        for i, item in enumerate(items):
+            state[0] = i
+            state[2] = -1
+            state[1] = time.time()
+            try:
+                value = fn([item], *args, on_stage=on_stage)[0]
+            except Exception as e:
+                state[1] = 0.0
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+                break
+            state[1] = 0.0
+            conn.send(("result", i, value))
+            if max_rss is not None and (rss(os.getpid()) or 0) > max_rss:
+                conn.send(("retire", i + 1))
+                return
+        else:
+            conn.send(("done",))
+
+
+class _Task:
+    __slots__ = ("future", "fn", "items", "args", "results", "remaining")
+
+    def __init__(self, future: Future, fn: Callable, items: list, args: tuple):
+        self.future = future
+        self.fn = fn
+        self.items = items
+        self.args = args
+        self.results = [_PENDING] * len(items)
+        self.remaining = len(items)
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "state", "task", "offset")
+
+    def __init__(self, context: BaseContext, max_rss: Optional[int]):
+        self.conn, child_conn = context.Pipe()
+        self.state = context.RawArray("d", 3)
+        self.process = context.Process(
+            target=_work, args=(child_conn, self.state, max_rss), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.offset = 0
+
+
+class GuardedPool(Executor):
+    """
+    ``submit(fn, items, *args)`` returns a future of the list of
+    ``fn([item], *args, on_stage=...)[0]`` for every item, with a
+    ``DeadLetter`` in place of the items a worker was killed on; ``name``
+    turns an item into the ``DeadLetter.input`` and ``mp_context`` starts the
+    workers, by default with forkserver where available and spawn otherwise
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: Optional[float] = None,
+        max_rss: Optional[int] = None,
+        name: Callable[[object], str] = str,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        mp_context: Optional[BaseContext] = None,
+    ):
+        if max_rss is not None and rss(os.getpid()) is None:
+            raise ValueError("max_rss needs /proc to read the memory of workers")
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.name = name
+        self.poll_interval = poll_interval
+        self.dead_letters = []
+        self._context = mp_context or default_context()
+        self._workers = [_Worker(self._context, max_rss) for _ in range(max_workers)]
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup, self._wakeup_sender = multiprocessing.Pipe(duplex=False)
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable, items: list, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+            self._queue.append((_Task(future, fn, list(items), args), 0))
+        self._wakeup_sender.send(None)
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while self._queue:
+                    self._queue.popleft()[0].future.cancel()
+        self._wakeup_sender.send(None)
+        if wait:
+            self._thread.join()
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if worker.task is not None:
+                continue
+            with self._lock:
+                if not self._queue:
+                    return
+                task, start = self._queue.popleft()
+            if start == 0 and not task.future.set_running_or_notify_cancel():
+                continue
+            worker.task = task
+            worker.offset = start
+            worker.conn.send((task.fn, task.items[start:], task.args))
+
+    def _set_result(self, task: _Task, index: int, value):
+        if task.future.done():
+            return
+        task.results[index] = value
+        task.remaining -= 1
+        if task.remaining == 0:
+            task.future.set_result(task.results)
+
+    def _receive(self, worker: _Worker) -> bool:
+        """
+        Handle the messages of a worker; ``False`` once it exited
+        """
+        while worker.conn.poll():
+            try:
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                return False
+            kind = message[0]
+            if kind == "result":
+                self._set_result(worker.task, worker.offset + message[1], message[2])
+            elif kind == "done":
+                worker.task = None
+            elif kind == "error":
+                if not worker.task.future.done():
+                    worker.task.future.set_exception(RuntimeError(message[1]))
+                worker.task = None
+            elif kind == "retire":
+                task, start = worker.task, worker.offset + message[1]
+                worker.task = None
+                if start < len(task.items):
+                    with self._lock:
+                        self._queue.appendleft((task, start))
+                return False
+        return worker.process.is_alive()
+
+    def _replace(self, worker: _Worker, reason: str, rss_bytes: Optional[int]):
+        """
+        Kill a worker, turn the item it was on into a ``DeadLetter`` and put
+        a fresh worker in its place
+        """
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join()
+        # results sent before the kill
+        self._receive(worker)
+        task = worker.task
+        if task is not None:
+            index = worker.offset + int(worker.state[0])
+            started = worker.state[1]
+            if task.results[index] is _PENDING:
+                code = int(worker.state[2])
+                dead_letter = DeadLetter(
+                    self.name(task.items[index]),
+                    reason,
+                    STAGES[code] if 0 <= code < len(STAGES) else None,
+                    time.time() - started if started else 0.0,
+                    rss_bytes,
+                )
+                self.dead_letters.append(dead_letter)
+                self._set_result(task, index, dead_letter)
+            if index + 1 < len(task.items):
+                with self._lock:
+                    self._queue.appendleft((task, index + 1))
+        worker.conn.close()
+        self._workers[self._workers.index(worker)] = _Worker(
+            self._context, self.max_rss
+        )
+
+    def _check_limits(self):
+        now = time.time()
+        for worker in list(self._workers):
+            started = worker.state[1]
+            if worker.task is None or not started:
+                continue
+            if self.timeout is not None and now - started > self.timeout:
+                self._replace(worker, "timeout", rss(worker.process.pid))
+            elif self.max_rss is not None:
+                rss_bytes = rss(worker.process.pid)
+                if rss_bytes is not None and rss_bytes > self.max_rss:
+                    self._replace(worker, "memory", rss_bytes)
+
+    def _monitor(self):
+        while True:
+            self._dispatch()
+            with self._lock:
+                idle = not self._queue and all(w.task is None for w in self._workers)
+                if self._shutdown and idle:
+                    break
+            waitables = [self._wakeup]
+            for worker in self._workers:
+                waitables += [worker.conn, worker.process.sentinel]
+            ready = wait(waitables, self.poll_interval)
+            while self._wakeup.poll():
+                self._wakeup.recv()
+            for worker in list(self._workers):
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    if not self._receive(worker):
+                        if worker.task is None:
+                            # retired or died between items
+                            worker.process.join()
+                            worker.conn.close()
+                            self._workers[self._workers.index(worker)] = _Worker(
+                                self._context, self.max_rss
+                            )
+                        else:
+                            self._replace(worker, "crashed", None)
+            self._check_limits()
+        for worker in self._workers:
+            worker.conn.send(None)
+        for worker in self._workers:
+            worker.process.join()
+            worker.conn.close()
@@ -0,0 +1,92 @@
+"""
+Just enough HTTP/1.1 on asyncio streams for the GROBID client and the
+conversion service: reading a message head and a body sent with a
+``Content-Length``, chunked or delimited by the end of the connection.
+"""
+import asyncio
+from typing import Optional
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+READ_SIZE = 1 << 16
+
+
+async def read_head(reader: asyncio.StreamReader) -> tuple[list[str], dict[str, str]]:
+    """
+    The start line split in three and the headers, with lowercase names
+    """
+    start_line = (await reader.readuntil(b"\r\n")).decode("latin-1").rstrip()
+    headers = {}
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return start_line.split(" ", 2), headers
+
+
+class BodyTooLarge(Exception):
+    """
+    A body longer than the limit ``read_body`` was given
+    """
+
+
+async def read_body(
+    reader: asyncio.StreamReader,
+    headers: dict[str, str],
+    limit: Optional[int] = None,
+) -> bytes:
+    """
+    The body of a message; raises ``BodyTooLarge`` as soon as it turns out to
+    be longer than ``limit`` bytes and ``ValueError`` on a malformed
+    ``Content-Length`` or chunk size
+    """
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        length = 0
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                # trailers end with an empty line
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return b"".join(chunks)
+            length += size
+            if limit is not None and length > limit:
+                raise BodyTooLarge(length)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        if length < 0:
+            raise ValueError(f"negative Content-Length: {length}")
+        if limit is not None and length > limit:
+            raise BodyTooLarge(length)
+        return await reader.readexactly(length)
+    if limit is None:
+        return await reader.read()
+    chunks = []
+    length = 0
+    while True:
+        chunk = await reader.read(READ_SIZE)
+        if not chunk:
+            return b"".join(chunks)
+        length += len(chunk)
+        if length > limit:
+            raise BodyTooLarge(length)
+        chunks.append(chunk)
+
+
+def format_head(start_line: str, headers: dict[str, str]) -> bytes:
+    lines = [start_line] + [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
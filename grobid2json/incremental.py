@@ -0,0 +1,540 @@
+"""
+Incremental, low-memory variant of the lxml engine.
+
+The TEI is read twice with ``etree.iterparse`` instead of being held as one
+tree. The first pass extracts the metadata, bibliography, figures and
+citation style, and records which figures the figure stage removes and which
+head names every body section; everything else is dropped as soon as it has
+been read. The second pass converts each body section when its closing tag is
+read and frees it right after, so peak memory follows the largest section
+rather than the whole document.
+
+Output is identical to :mod:`grobid2json.lxml_engine`. The few layouts the
+two passes cannot reproduce exactly, such as figures nested in figures or
+sections inside notes, fall back to a full parse.
+"""
+import contextlib
+import gzip
+import io
+import os
+from typing import Iterator, Optional, Union
+
+from lxml import etree
+
+from grobid2json import lxml_engine
+from grobid2json.citation_util import clear_authors
+from grobid2json.lxml_engine import (
+    ABSTRACT,
+    BACK,
+    BIBL_STRUCT,
+    BODY,
+    DIV,
+    FIGURE,
+    FILE_DESC,
+    HEAD,
+    LABEL,
+    LIST_BIBL,
+    NOTE,
+    REF,
+    TABLE,
+    XML_ID,
+    T,
+    _decompose,
+    _text,
+    extract_paper_metadata,
+    extract_paragraphs_from_div,
+    figure_ref_entry,
+    iter_abstract_from_tei_xml,
+    iter_back_matter_from_tei_xml,
+    note_to_paragraph,
+    parse_bib_entry,
+    sub_all_note_tags,
+)
+from grobid2json.main import (
+    BRACKET_REGEX,
+    BRACKET_STYLE_THRESHOLD,
+    PARTS,
+    normalize_grobid_id,
+)
+from grobid2json.s2orc import Paper, paper_json
+from grobid2json.stats import NULL_STATS, ConversionStats
+
+
+class FullTreeRequired(Exception):
+    """
+    Raised by the first pass for layouts only a full parse converts exactly
+    """
+
+
+class IncrementalReader:
+    """
+    TEI source read with ``iterparse``: a file path, a seekable binary file
+    object or bytes
+    """
+
+    def __init__(self, source: Union[str, os.PathLike, bytes, io.IOBase]):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        self.source = source
+        # set when the document falls back to a full parse
+        self.root = None
+        self.layout = None
+
+    def _open(self):
+        """
+        The source as ``iterparse`` takes it: a rewound file object, a
+        decompressing one for ``.gz`` paths, or the path itself
+        """
+        source = self.source
+        if hasattr(source, "seek"):
+            source.seek(0)
+        elif os.fspath(source).endswith(".gz"):
+            return gzip.open(source, "rb")
+        return contextlib.nullcontext(source)
+
+    def iterparse(self) -> Iterator[tuple[str, etree._Element]]:
+        rename = None
+        with self._open() as source:
+            for event, el in etree.iterparse(
+                source,
+                events=("start", "end"),
+                recover=True,
+                remove_comments=True,
+                remove_pis=True,
+                huge_tree=True,
+            ):
+                if event == "start":
+                    # same namespace fix-up as lxml_engine.parse_xml
+                    if rename is None:
+                        rename = not el.tag.startswith(T)
+                    if rename and not el.tag.startswith("{"):
+                        el.tag = T + el.tag
+                yield event, el
+
+    def read(self) -> bytes:
+        with self._open() as source:
+            if hasattr(source, "read"):
+                return source.read()
+            with open(source, "rb") as f:
+                return f.read()
+
+
+class Layout:
+    """
+    What the second pass needs to know about the whole document
+    """
+
+    def __init__(self):
+        # indices, in document order, of the figures the figure stage removes
+        self.decomposed = set()
+        # tables the figure stage keeps, as table_to_html left them
+        self.tables = {}
+        # section path of every div of the body, by document order
+        self.sections = {}
+
+
+def _remove(el) -> None:
+    parent = el.getparent()
+    if parent is not None:
+        parent.remove(el)
+
+
+def _first_table(fig):
+    return next(fig.iterdescendants(TABLE), None)
+
+
+def scan_front_matter(reader: IncrementalReader) -> tuple[tuple, Layout]:
+    """
+    First pass: metadata, bibliography, figures and citation style, plus the
+    ``Layout`` of the body
+    """
+    layout = Layout()
+    metadata = None
+    bib_entries = []
+
+    # figures, numbered in document order, and the label index of
+    # lxml_engine.index_figure_labels
+    fig_count = 0
+    fig_entries = {}
+    fig_labels = {}
+    label_figs = {}
+    ended_labels = set()
+    ended_figs = {}
+    waiting_for_head = []
+    waiting_for_label = []
+    current_fig = None
+
+    # divs of the first body, numbered in document order
+    div_count = 0
+    div_stack = []
+    div_parents = {}
+    head_candidates = {}
+    head_entries = {}
+    has_head = set()
+    fig_heads = []
+    matches = {}
+    fig_matches = []
+
+    first = {}
+    in_body = in_back = in_list_bibl = False
+    note_depth = 0
+    head_depth = 0
+    keep = 0
+
+    def process_figure(idx: int, el, label):
+        try:
+            xml_id = el.get(XML_ID)
+            if xml_id:
+                fig_entries[idx] = (
+                    normalize_grobid_id(xml_id),
+                    figure_ref_entry(el, xml_id, label),
+                )
+        except AttributeError:
+            if el.get("type") == "table" and _first_table(el) is not None:
+                layout.tables[idx] = el
+            return
+        layout.decomposed.add(idx)
+
+    def try_figure(idx: int):
+        el = ended_figs[idx]
+        if el.get(XML_ID) and el.get("type") != "table":
+            if idx not in fig_labels:
+                return
+            label = fig_labels[idx]
+            if label is not None and label not in ended_labels:
+                return
+        else:
+            label = None
+        del ended_figs[idx]
+        process_figure(idx, el, label)
+
+    for event, el in reader.iterparse():
+        tag = el.tag
+        if event == "start":
+            if tag == FIGURE:
+                if current_fig is not None or in_list_bibl:
+                    raise FullTreeRequired("figure nested in a figure or listBibl")
+                if head_depth:
+                    raise FullTreeRequired("figure in a section head")
+                current_fig = fig_count
+                fig_count += 1
+                waiting_for_head.append(current_fig)
+                keep += 1
+            elif tag == HEAD:
+                keep += 1
+                if in_list_bibl:
+                    continue
+                waiting_for_label += waiting_for_head
+                waiting_for_head = []
+                if in_body and div_stack:
+                    head_depth += 1
+                    if current_fig is None:
+                        has_head.update(div_stack)
+                    else:
+                        fig_heads.append((current_fig, tuple(div_stack)))
+                    owner = div_stack[-1]
+                    candidates = head_candidates.setdefault(owner, [])
+                    if not note_depth and not (
+                        candidates and candidates[-1][0] is None
+                    ):
+                        entry = [current_fig, el.get("n", None), ""]
+                        candidates.append(entry)
+                        head_entries[el] = entry
+            elif tag == LABEL:
+                if waiting_for_label and not in_list_bibl:
+                    for idx in waiting_for_label:
+                        fig_labels[idx] = el
+                    label_figs[el] = waiting_for_label
+                    waiting_for_label = []
+            elif tag == REF:
+                keep += 1
+            elif tag == NOTE:
+                if head_depth:
+                    raise FullTreeRequired("note in a section head")
+                note_depth += 1
+            elif tag == DIV:
+                if in_body and not in_list_bibl:
+                    if current_fig is not None or note_depth:
+                        raise FullTreeRequired("section in a figure or note")
+                    div_parents[div_count] = div_stack[-1] if div_stack else None
+                    div_stack.append(div_count)
+                    div_count += 1
+            elif tag == LIST_BIBL:
+                if LIST_BIBL not in first:
+                    first[LIST_BIBL] = el
+                    in_list_bibl = True
+                    keep += 1
+            elif tag == FILE_DESC:
+                if FILE_DESC not in first:
+                    first[FILE_DESC] = el
+                    keep += 1
+            elif tag in (ABSTRACT, BODY, BACK):
+                if tag not in first:
+                    if current_fig is not None or note_depth or in_body or in_back:
+                        raise FullTreeRequired("abstract, body or back out of place")
+                    first[tag] = el
+                    if tag == BODY:
+                        in_body = True
+                    elif tag == BACK:
+                        in_back = True
+            continue
+
+        if tag == FIGURE:
+            keep -= 1
+            idx = current_fig
+            current_fig = None
+            ended_figs[idx] = el
+            try_figure(idx)
+        elif tag == HEAD:
+            keep -= 1
+            entry = head_entries.pop(el, None)
+            if entry is not None:
+                entry[2] = _text(el).strip()
+            if in_body and div_stack and not in_list_bibl:
+                head_depth -= 1
+        elif tag == LABEL:
+            figs = label_figs.pop(el, None)
+            if figs is not None:
+                ended_labels.add(el)
+                for idx in figs:
+                    if idx in ended_figs:
+                        try_figure(idx)
+        elif tag == REF:
+            keep -= 1
+            if (
+                in_body
+                and div_stack
+                and not in_list_bibl
+                and el.get("type") == "bibr"
+                and BRACKET_REGEX.match(_text(el).strip())
+            ):
+                if current_fig is None:
+                    for div in div_stack:
+                        matches[div] = matches.get(div, 0) + 1
+                else:
+                    fig_matches.append((current_fig, tuple(div_stack)))
+        elif tag == NOTE:
+            note_depth -= 1
+        elif tag == DIV:
+            if in_body and not in_list_bibl:
+                div_stack.pop()
+        elif tag == LIST_BIBL:
+            if first.get(LIST_BIBL) is el:
+                keep -= 1
+                in_list_bibl = False
+                for entry in el.iterdescendants(BIBL_STRUCT):
+                    bib_entry = parse_bib_entry(entry)
+                    if bib_entry["title"]:
+                        bib_entries.append(bib_entry)
+        elif tag == FILE_DESC:
+            if first.get(FILE_DESC) is el:
+                keep -= 1
+                metadata = extract_paper_metadata(el)
+        elif tag == BODY:
+            if first.get(BODY) is el:
+                in_body = False
+        elif tag == BACK:
+            if first.get(BACK) is el:
+                in_back = False
+        if not keep:
+            _remove(el)
+
+    if metadata is None:
+        raise AttributeError("TEI document has no fileDesc")
+    metadata["authors"] = clear_authors(metadata["authors"])
+    bibkey_map = {normalize_grobid_id(bib["ref_id"]): bib for bib in bib_entries}
+
+    for idx in waiting_for_label:
+        fig_labels[idx] = None
+    # figures with no head after them are not in the label index and stay
+    for idx in sorted(ended_figs):
+        if idx in fig_labels:
+            try_figure(idx)
+    refkey_map = dict()
+    for idx in sorted(fig_entries):
+        key, entry = fig_entries[idx]
+        refkey_map[key] = entry
+
+    decomposed = layout.decomposed
+    for fig, divs in fig_heads:
+        if fig not in decomposed:
+            has_head.update(divs)
+    for fig, divs in fig_matches:
+        if fig not in decomposed:
+            for div in divs:
+                matches[div] = matches.get(div, 0) + 1
+    cite_count = sum(count for div, count in matches.items() if div not in has_head)
+    is_bracket_style = cite_count > BRACKET_STYLE_THRESHOLD
+
+    for div in range(div_count):
+        parent = div_parents[div]
+        sections = layout.sections[parent] if parent is not None else []
+        for fig, num, text in head_candidates.get(div, ()):
+            if fig is None or fig not in decomposed:
+                sections = sections + [(num, text)]
+                break
+        layout.sections[div] = sections
+
+    return (metadata, bibkey_map, refkey_map, is_bracket_style), layout
+
+
+def extract_front_matter(
+    reader: IncrementalReader, stats: Optional[ConversionStats] = None
+) -> tuple[dict, dict, dict, bool]:
+    if stats is None:
+        stats = NULL_STATS
+    stats.start("front_matter")
+    try:
+        front_matter, reader.layout = scan_front_matter(reader)
+    except FullTreeRequired:
+        reader.root = lxml_engine.parse_xml(reader.read())
+        return lxml_engine.extract_front_matter(reader.root, stats)
+    return front_matter
+
+
+def iter_paper_paragraphs(
+    reader: IncrementalReader,
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+    stats: Optional[ConversionStats] = None,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Second pass: yield ``(part, paragraph)`` as every section is read,
+    freeing each one once it is converted
+    """
+    if stats is None:
+        stats = NULL_STATS
+    if reader.root is not None:
+        yield from lxml_engine.iter_paper_paragraphs(
+            reader.root, bib_dict, ref_dict, cleanup_bracket, stats
+        )
+        return
+
+    layout = reader.layout
+    fig_count = 0
+    fig_stack = []
+    div_count = 0
+    divs = {}
+    first = {}
+    in_body = in_list_bibl = False
+    note_depth = 0
+
+    for event, el in reader.iterparse():
+        tag = el.tag
+        if event == "start":
+            if tag == FIGURE:
+                fig_stack.append(fig_count)
+                fig_count += 1
+            elif tag == NOTE:
+                note_depth += 1
+            elif tag == DIV:
+                if in_body and not in_list_bibl:
+                    divs[el] = div_count
+                    div_count += 1
+            elif tag in (ABSTRACT, BODY, BACK, LIST_BIBL):
+                if tag not in first:
+                    first[tag] = el
+                    in_body = in_body or tag == BODY
+                    in_list_bibl = in_list_bibl or tag == LIST_BIBL
+            continue
+
+        parent = el.getparent()
+        if tag == FIGURE:
+            idx = fig_stack.pop()
+            if idx in layout.decomposed:
+                _decompose(el)
+            elif idx in layout.tables:
+                table = layout.tables.pop(idx)
+                table.tail = el.tail
+                parent.replace(el, table)
+                if not note_depth:
+                    sub_all_note_tags(table)
+        elif tag == NOTE:
+            note_depth -= 1
+            if not note_depth:
+                note_to_paragraph(el)
+        elif tag == DIV and el in divs:
+            stats.start("body")
+            for para in extract_paragraphs_from_div(
+                el, layout.sections[divs.pop(el)], bib_dict, ref_dict, cleanup_bracket
+            ):
+                yield "body_text", para
+            if parent.tag in (DIV, BODY):
+                parent.remove(el)
+        elif first.get(tag) is el:
+            if tag == LIST_BIBL:
+                in_list_bibl = False
+                _decompose(el)
+            elif tag == ABSTRACT:
+                stats.start("abstract")
+                for para in iter_abstract_from_tei_xml(
+                    parent, bib_dict, ref_dict, cleanup_bracket
+                ):
+                    yield "abstract", para
+            elif tag == BODY:
+                in_body = False
+                stats.start("body")
+                for para in extract_paragraphs_from_div(
+                    el, [], bib_dict, ref_dict, cleanup_bracket
+                ):
+                    yield "body_text", para
+                _decompose(el)
+            elif tag == BACK:
+                stats.start("back_matter")
+                for para in iter_back_matter_from_tei_xml(
+                    parent, bib_dict, ref_dict, cleanup_bracket
+                ):
+                    yield "back_matter", para
+        elif in_list_bibl and parent is first[LIST_BIBL]:
+            # the first listBibl is dropped whole once it ends
+            parent.remove(el)
+            continue
+
+        # release what sits directly under the root or under <text>
+        parent = el.getparent()
+        if parent is not None and (
+            parent.getparent() is None or parent.getparent().getparent() is None
+        ):
+            parent.remove(el)
+
+
+def convert_tree_to_json(
+    reader: IncrementalReader,
+    paper_id: str,
+    pdf_hash: str,
+    stats: Optional[ConversionStats] = None,
+    as_dict: bool = False,
+) -> Union[Paper, dict]:
+    if stats is None:
+        stats = NULL_STATS
+    metadata, bibkey_map, refkey_map, is_bracket_style = extract_front_matter(
+        reader, stats
+    )
+
+    parts = {part: [] for part in PARTS}
+    for part, para in iter_paper_paragraphs(
+        reader, bibkey_map, refkey_map, is_bracket_style, stats
+    ):
+        parts[part].append(para)
+    abstract_entries = parts["abstract"]
+    body_entries = parts["body_text"]
+    back_matter = parts["back_matter"]
+
+    stats.start("paper")
+    paper = (paper_json if as_dict else Paper)(
+        paper_id=paper_id,
+        pdf_hash=pdf_hash,
+        metadata=metadata,
+        abstract=abstract_entries,
+        body_text=body_entries,
+        back_matter=back_matter,
+        bib_entries=bibkey_map,
+        ref_entries=refkey_map,
+    )
+    if stats.enabled:
+        stats.record_output(
+            abstract_entries, body_entries, back_matter, bibkey_map, refkey_map
+        )
+    stats.stop()
+    return paper
@@ -0,0 +1,154 @@
+"""
+Sidecar index of the records in JSONL shards.
+
+``ShardIndexWriter`` stores ``paper_id -> (shard, byte offset, length)`` in
+a SQLite file next to the shards as they are written. ``ShardIndex`` looks a
+paper up there and reads just its line through a memory map of the shard,
+so fetching one record never scans a shard. Shard paths are stored relative
+to the index file, so a directory of shards can be moved with its index.
+"""
+import mmap
+import os
+import sqlite3
+from typing import Optional
+
+from grobid2json.s2orc import Paper, load_s2orc
+from grobid2json.serialize import loads
+
+INDEX_SUFFIX = "-index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS papers (
+    paper_id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class ShardIndexWriter:
+    """
+    Record where every line of a set of shards starts; a paper_id written
+    twice points at its last record
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._root = os.path.dirname(os.path.abspath(path))
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("BEGIN")
+        self._conn.execute("DELETE FROM papers")
+        self._conn.execute("DELETE FROM shards")
+
+    def add_shard(self, shard_path: str) -> int:
+        relative = os.path.relpath(os.path.abspath(shard_path), self._root)
+        return self._conn.execute(
+            "INSERT INTO shards (path) VALUES (?)", (relative,)
+        ).lastrowid
+
+    def add(self, paper_id: str, shard: int, offset: int, length: int):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO papers (paper_id, shard, offset, length) "
+            "VALUES (?, ?, ?, ?)",
+            (paper_id, shard, offset, length),
+        )
+
+    def remove(self, paper_id: str):
+        self._conn.execute("DELETE FROM papers WHERE paper_id = ?", (paper_id,))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.execute("COMMIT")
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ShardIndex:
+    """
+    Random access to the records of indexed shards by ``paper_id``
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        root = os.path.dirname(os.path.abspath(path))
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.shards = {
+            shard: os.path.join(root, relative)
+            for shard, relative in self._conn.execute("SELECT id, path FROM shards")
+        }
+        self._maps = {}
+
+    def locate(self, paper_id: str) -> Optional[tuple[str, int, int]]:
+        """
+        ``(shard path, byte offset, length)`` of the record of ``paper_id``
+        """
+        row = self._conn.execute(
+            "SELECT shard, offset, length FROM papers WHERE paper_id = ?",
+            (paper_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return self.shards[row[0]], row[1], row[2]
+
+    def _map(self, shard_path: str) -> mmap.mmap:
+        shard_map = self._maps.get(shard_path)
+        if shard_map is None:
+            with open(shard_path, "rb") as fp:
+                shard_map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[shard_path] = shard_map
+        return shard_map
+
+    def get_line(self, paper_id: str) -> Optional[bytes]:
+        """
+        The JSON line of ``paper_id``, without the newline
+        """
+        location = self.locate(paper_id)
+        if location is None:
+            return None
+        shard_path, offset, length = location
+        return self._map(shard_path)[offset : offset + length]
+
+    def get_record(self, paper_id: str) -> Optional[dict]:
+        line = self.get_line(paper_id)
+        return loads(line) if line is not None else None
+
+    def get_paper(self, paper_id: str) -> Optional[Paper]:
+        record = self.get_record(paper_id)
+        return load_s2orc(record) if record is not None else None
+
+    def __contains__(self, paper_id: str) -> bool:
+        return self.locate(paper_id) is not None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def close(self):
+        for shard_map in self._maps.values():
+            shard_map.close()
+        self._maps.clear()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def index_path(output_dir: str, prefix: str = "part") -> str:
+    """
+    Where ``run_batch`` writes the index of the shards named ``prefix``
+    """
+    return os.path.join(output_dir, f"{prefix}{INDEX_SUFFIX}")
@@ -0,0 +1,1199 @@
+"""
+lxml-backed conversion engine.
+
+Mirrors the BeautifulSoup implementation in :mod:`grobid2json.main` stage by
+stage, working directly on ``lxml.etree`` elements with namespace-aware tags.
+The BeautifulSoup engine remains the reference: every function here keeps the
+same traversal order and tree mutations so both engines produce identical
+``Paper`` output.
+"""
+import re
+from collections import defaultdict
+from typing import Iterator, Optional, Union
+
+from lxml import etree
+
+from grobid2json.citation_util import clear_authors, is_expansion_string
+from grobid2json.grobid_util import SUBSTITUTE_TAGS, VENUE_LEVELS
+from grobid2json.main import (
+    BRACKET_REGEX,
+    BRACKET_STYLE_THRESHOLD,
+    PARTS,
+    REPLACE_TABLE_TOKS,
+    SINGLE_BRACKET_REGEX,
+    NestedReferenceError,
+    ParagraphBuilder,
+    UniqTokenGenerator,
+    normalize_grobid_id,
+)
+from grobid2json.refspan_util import sub_spans_and_update_indices
+from grobid2json.s2orc import Paper, paper_json
+from grobid2json.stats import NULL_STATS, ConversionStats
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+T = "{%s}" % TEI_NS
+
+XML_ID = "{%s}id" % XML_NS
+
+ABSTRACT = T + "abstract"
+ADDRESS = T + "address"
+AFFILIATION = T + "affiliation"
+AUTHOR = T + "author"
+BIBL_SCOPE = T + "biblScope"
+BIBL_STRUCT = T + "biblStruct"
+BODY = T + "body"
+BACK = T + "back"
+DATE = T + "date"
+DIV = T + "div"
+EMAIL = T + "email"
+FIG_DESC = T + "figDesc"
+FIGURE = T + "figure"
+FILE_DESC = T + "fileDesc"
+FORENAME = T + "forename"
+FORMULA = T + "formula"
+HEAD = T + "head"
+IDNO = T + "idno"
+LABEL = T + "label"
+LIST_BIBL = T + "listBibl"
+NOTE = T + "note"
+ORG_NAME = T + "orgName"
+P = T + "p"
+PERS_NAME = T + "persName"
+REF = T + "ref"
+ROW = T + "row"
+SURNAME = T + "surname"
+TABLE = T + "table"
+TITLE = T + "title"
+TITLE_STMT = T + "titleStmt"
+
+XML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;"}
+XML_ESCAPE_REGEX = re.compile(r"[&<>]")
+
+
+def make_parser() -> etree.XMLParser:
+    return etree.XMLParser(
+        recover=True, remove_comments=True, remove_pis=True, huge_tree=True
+    )
+
+
+def parse_xml(xml_data: bytes, parser: Optional[etree.XMLParser] = None):
+    root = etree.fromstring(xml_data, parser or make_parser())
+    if not root.tag.startswith(T):
+        for el in root.iter():
+            if isinstance(el.tag, str) and not el.tag.startswith("{"):
+                el.tag = T + el.tag
+    return root
+
+
+def _text(el) -> str:
+    return "".join(el.itertext())
+
+
+def _first(el, tag: str):
+    """
+    First descendant with the given tag, like ``Tag.<name>`` in BeautifulSoup
+    """
+    return next(el.iterdescendants(tag), None)
+
+
+def _name(el) -> str:
+    tag = el.tag
+    if tag.startswith(T):
+        return tag[len(T) :]
+    qname = etree.QName(tag)
+    if el.prefix:
+        return f"{el.prefix}:{qname.localname}"
+    return qname.localname
+
+
+def _attribute_name(el, key: str) -> str:
+    if not key.startswith("{"):
+        return key
+    qname = etree.QName(key)
+    if qname.namespace == XML_NS:
+        return f"xml:{qname.localname}"
+    for prefix, namespace in el.nsmap.items():
+        if namespace == qname.namespace and prefix:
+            return f"{prefix}:{qname.localname}"
+    return qname.localname
+
+
+def _replace_with_text(el, string: str) -> None:
+    """
+    Replace ``el`` by a text node, keeping the text that follows it
+    """
+    parent = el.getparent()
+    string += el.tail or ""
+    previous = el.getprevious()
+    if previous is not None:
+        previous.tail = (previous.tail or "") + string
+    else:
+        parent.text = (parent.text or "") + string
+    parent.remove(el)
+
+
+def _decompose(el) -> None:
+    _replace_with_text(el, "")
+
+
+def _previous_string(el) -> str:
+    previous = el.getprevious()
+    if previous is not None:
+        return previous.tail or ""
+    return el.getparent().text or ""
+
+
+def _clear_previous_string(el) -> None:
+    previous = el.getprevious()
+    if previous is not None:
+        previous.tail = ""
+    else:
+        el.getparent().text = ""
+
+
+def _contents(el) -> list:
+    """
+    Children of ``el`` as BeautifulSoup sees them: strings and elements
+    """
+    contents = [el.text] if el.text else []
+    for child in el:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+    return contents
+
+
+def _escape(text: str) -> str:
+    return XML_ESCAPE_REGEX.sub(lambda m: XML_ESCAPES[m.group()], text)
+
+
+def _quote_attribute(value: str) -> str:
+    quote_with = '"'
+    if '"' in value:
+        if "'" in value:
+            value = value.replace('"', "&quot;")
+        else:
+            quote_with = "'"
+    return quote_with + value + quote_with
+
+
+def _markup(el) -> str:
+    """
+    Serialise ``el`` the way ``str(Tag)`` does for BeautifulSoup XML trees
+    """
+    parts = []
+
+    def _serialize(node):
+        name = _name(node)
+        attrs = [(_attribute_name(node, k), v) for k, v in node.attrib.items()]
+        parent = node.getparent()
+        parent_nsmap = parent.nsmap if parent is not None else {}
+        for prefix, namespace in node.nsmap.items():
+            if parent_nsmap.get(prefix) != namespace:
+                attrs.append((f"xmlns:{prefix}" if prefix else "xmlns", namespace))
+        attr_string = "".join(
+            f" {k}={_quote_attribute(_escape(v))}" for k, v in sorted(attrs)
+        )
+        if not node.text and len(node) == 0:
+            parts.append(f"<{name}{attr_string}/>")
+            return
+        parts.append(f"<{name}{attr_string}>")
+        if node.text:
+            parts.append(_escape(node.text))
+        for child in node:
+            _serialize(child)
+            if child.tail:
+                parts.append(_escape(child.tail))
+        parts.append(f"</{name}>")
+
+    _serialize(el)
+    return "".join(parts)
+
+
+def get_title_from_grobid_xml(raw_xml) -> str:
+    for title_entry in raw_xml.iterdescendants(TITLE):
+        if title_entry.get("level") == "a":
+            return _text(title_entry)
+    title_entry = _first(raw_xml, TITLE)
+    if title_entry is None:
+        return ""
+    return _text(title_entry)
+
+
+def _get_names(pers_name, middle: list[str], strict: bool) -> tuple[str, str]:
+    first = ""
+    last = ""
+    for forename in pers_name.iterdescendants(FORENAME):
+        if strict:
+            forename_type = forename.attrib["type"]
+        else:
+            forename_type = forename.get("type")
+        if forename_type == "first":
+            if not first:
+                first = _text(forename)
+            else:
+                middle.append(_text(forename))
+        elif forename_type == "middle":
+            middle.append(_text(forename))
+
+    surnames = list(pers_name.iterdescendants(SURNAME))
+    if len(surnames) > 1:
+        for surname in surnames[:-1]:
+            middle.append(_text(surname))
+        last = _text(surnames[-1])
+    elif len(surnames) == 1:
+        last = _text(surnames[0])
+    return first, last
+
+
+def get_author_names_from_grobid_xml(raw_xml) -> list[dict[str, str]]:
+    names = []
+
+    for author in raw_xml.iterdescendants(AUTHOR):
+        pers_name = _first(author, PERS_NAME)
+        if pers_name is None:
+            continue
+        middle = []
+        first, last = _get_names(pers_name, middle, strict=True)
+        names.append({"first": first, "middle": middle, "last": last, "suffix": ""})
+    return names
+
+
+def get_affiliation_from_grobid_xml(raw_xml) -> dict:
+    location_dict = dict()
+    laboratory_name = ""
+    institution_name = ""
+
+    affiliation = _first(raw_xml, AFFILIATION)
+    if affiliation is not None:
+        for child in affiliation:
+            if child.tag == ORG_NAME:
+                org_type = child.get("type")
+                if org_type == "laboratory":
+                    laboratory_name = _text(child)
+                elif org_type == "institution":
+                    institution_name = _text(child)
+            elif child.tag == ADDRESS:
+                for grandchild in child:
+                    grandchild_text = _text(grandchild)
+                    if grandchild_text:
+                        name = _name(grandchild)
+                        if name in SUBSTITUTE_TAGS:
+                            name = name.lower()
+                        location_dict[name] = grandchild_text
+
+        if laboratory_name or institution_name:
+            return {
+                "laboratory": laboratory_name,
+                "institution": institution_name,
+                "location": location_dict,
+            }
+
+    return {}
+
+
+def get_author_data_from_grobid_xml(raw_xml) -> list[dict]:
+    authors = []
+
+    for author in raw_xml.iterdescendants(AUTHOR):
+        first = ""
+        middle = []
+        last = ""
+
+        pers_name = _first(author, PERS_NAME)
+        if pers_name is not None:
+            first, last = _get_names(pers_name, middle, strict=False)
+
+        email = _first(author, EMAIL)
+        authors.append(
+            {
+                "first": first,
+                "middle": middle,
+                "last": last,
+                "suffix": "",
+                "affiliation": get_affiliation_from_grobid_xml(author),
+                "email": _text(email) if email is not None else "",
+            }
+        )
+
+    return authors
+
+
+def get_year_from_grobid_xml(raw_xml) -> Optional[int]:
+    return _get_year(_first(raw_xml, DATE))
+
+
+def _get_year(date) -> Optional[int]:
+    if date is not None and date.get("when") is not None:
+        year_match = re.match(r"((19|20)\d{2})", date.get("when"))
+        if year_match:
+            year = year_match.group(0)
+            if year and year.isnumeric() and len(year) == 4:
+                return int(year)
+    return None
+
+
+def get_venue_from_grobid_xml(raw_xml, title_text: str) -> str:
+    title_names = []
+    for title_entry in raw_xml.iterdescendants(TITLE):
+        level = title_entry.get("level")
+        if level in VENUE_LEVELS:
+            text = _text(title_entry)
+            if text != title_text:
+                title_names.append((level, text))
+    if title_names:
+        title_names.sort(key=lambda x: VENUE_LEVELS.index(x[0]))
+        return title_names[0][1]
+    return ""
+
+
+def _get_bibl_scope(raw_xml, unit: str) -> str:
+    for bibl_entry in raw_xml.iterdescendants(BIBL_SCOPE):
+        if bibl_entry.get("unit") == unit:
+            return _text(bibl_entry)
+    return ""
+
+
+def get_pages_from_grobid_xml(raw_xml) -> str:
+    for bibl_entry in raw_xml.iterdescendants(BIBL_SCOPE):
+        if bibl_entry.get("unit") == "page" and bibl_entry.get("from") is not None:
+            return _get_pages(bibl_entry)
+    return ""
+
+
+def _get_pages(bibl_entry) -> str:
+    from_page = bibl_entry.get("from")
+    if bibl_entry.get("to") is not None:
+        return f"{from_page}--{bibl_entry.get('to')}"
+    return from_page
+
+
+def get_other_ids_from_grobid_xml(raw_xml) -> dict[str, list]:
+    other_ids = defaultdict(list)
+
+    for idno_entry in raw_xml.iterdescendants(IDNO):
+        if idno_entry.get("type") is not None:
+            text = _text(idno_entry)
+            if text:
+                other_ids[idno_entry.get("type")].append(text)
+
+    return other_ids
+
+
+def get_raw_bib_text_from_grobid_xml(raw_xml) -> str:
+    for note in raw_xml.iterdescendants(NOTE):
+        if note.get("type") == "raw_reference":
+            return _text(note)
+    return ""
+
+
+def parse_bib_entry(bib_entry) -> dict:
+    level_a_title = None
+    first_title = None
+    venue_titles = []
+    authors = []
+    date = None
+    scopes = {}
+    pages = None
+    other_ids = defaultdict(list)
+    raw_text = None
+
+    for el in bib_entry.iterdescendants(TITLE, AUTHOR, DATE, BIBL_SCOPE, IDNO, NOTE):
+        tag = el.tag
+        if tag == TITLE:
+            level = el.get("level")
+            if first_title is None:
+                first_title = el
+            if level == "a":
+                if level_a_title is None:
+                    level_a_title = el
+            elif level in VENUE_LEVELS:
+                venue_titles.append((level, _text(el)))
+        elif tag == AUTHOR:
+            pers_name = _first(el, PERS_NAME)
+            if pers_name is not None:
+                middle = []
+                first, last = _get_names(pers_name, middle, strict=True)
+                authors.append(
+                    {"first": first, "middle": middle, "last": last, "suffix": ""}
+                )
+        elif tag == DATE:
+            if date is None:
+                date = el
+        elif tag == BIBL_SCOPE:
+            unit = el.get("unit")
+            if unit == "page":
+                if pages is None and el.get("from") is not None:
+                    pages = _get_pages(el)
+            elif (unit == "volume" or unit == "issue") and unit not in scopes:
+                scopes[unit] = _text(el)
+        elif tag == IDNO:
+            if el.get("type") is not None:
+                text = _text(el)
+                if text:
+                    other_ids[el.get("type")].append(text)
+        elif raw_text is None and el.get("type") == "raw_reference":
+            raw_text = _text(el)
+
+    if level_a_title is not None:
+        title = _text(level_a_title)
+    elif first_title is not None:
+        title = _text(first_title)
+    else:
+        title = ""
+    venues = [venue for venue in venue_titles if venue[1] != title]
+    venues.sort(key=lambda x: VENUE_LEVELS.index(x[0]))
+    return {
+        "ref_id": bib_entry.get(XML_ID),
+        "title": title,
+        "authors": authors,
+        "year": _get_year(date),
+        "venue": venues[0][1] if venues else "",
+        "volume": scopes.get("volume", ""),
+        "issue": scopes.get("issue", ""),
+        "pages": pages or "",
+        "other_ids": other_ids,
+        "raw_text": raw_text or "",
+        "urls": [],
+    }
+
+
+def extract_paper_metadata(tag) -> dict:
+    title_stmt = _first(tag, TITLE_STMT)
+    title = _first(title_stmt, TITLE)
+    return {
+        "title": _text(title),
+        "authors": get_author_data_from_grobid_xml(tag),
+        # clean_tags() renames publicationStmt before the BeautifulSoup
+        # engine looks it up, so the publication date is never reported.
+        "year": "",
+    }
+
+
+def parse_bibliography(root) -> list[dict]:
+    bibliography = _first(root, LIST_BIBL)
+    if bibliography is None:
+        return []
+
+    structured_entries = []
+    for entry in bibliography.iterdescendants(BIBL_STRUCT):
+        bib_entry = parse_bib_entry(entry)
+        if bib_entry["title"]:
+            structured_entries.append(bib_entry)
+
+    _decompose(bibliography)
+
+    return structured_entries
+
+
+def table_to_html(table) -> str:
+    contents = _contents(table)
+    ind = 0
+    while ind < len(contents):
+        tag = contents[ind]
+        if isinstance(tag, str):
+            print("Unknown table subtag: None")
+            raise AttributeError(
+                "'NavigableString' object has no attribute 'decompose'"
+            )
+        if tag.tag != ROW:
+            print(f"Unknown table subtag: {_name(tag)}")
+            _decompose(tag)
+            del contents[ind]
+        ind += 1
+    table_str = _markup(table)
+    for token, subtoken in REPLACE_TABLE_TOKS.items():
+        table_str = table_str.replace(token, subtoken)
+    return table_str
+
+
+def _find_next(el, tag: str):
+    """
+    First element with ``tag`` after the start of ``el`` in document order
+    """
+    for match in el.iterdescendants(tag):
+        return match
+    for match in el.itersiblings():
+        if match.tag == tag:
+            return match
+        for child in match.iterdescendants(tag):
+            return child
+    parent = el.getparent()
+    while parent is not None:
+        for match in parent.itersiblings():
+            if match.tag == tag:
+                return match
+            for child in match.iterdescendants(tag):
+                return child
+        parent = parent.getparent()
+    return None
+
+
+def index_figure_labels(root) -> dict:
+    """
+    Map each figure to ``_find_next(_find_next(fig, HEAD), LABEL)`` in one
+    document-order pass; figures with no head after them are left out
+    """
+    labels = dict()
+    waiting_for_head = []
+    waiting_for_label = []
+    for el in root.iter(FIGURE, HEAD, LABEL):
+        if el.tag == FIGURE:
+            waiting_for_head.append(el)
+        elif el.tag == HEAD:
+            waiting_for_label += waiting_for_head
+            waiting_for_head = []
+        elif waiting_for_label:
+            for fig in waiting_for_label:
+                labels[fig] = el
+            waiting_for_label = []
+    for fig in waiting_for_label:
+        labels[fig] = None
+    return labels
+
+
+def figure_ref_entry(fig, xml_id: str, label) -> dict:
+    """
+    ``ref_map`` entry of one figure or table; ``label`` is the figure's label
+    element, ``None`` if there is none, and is not used for tables
+    """
+    if fig.get("type") == "table":
+        fig_desc = _first(fig, FIG_DESC)
+        head = _first(fig, HEAD)
+        return {
+            "text": (
+                _text(fig_desc).strip()
+                if fig_desc is not None
+                else _text(head).strip()
+                if head is not None
+                else ""
+            ),
+            "latex": None,
+            "type": "table",
+            "content": table_to_html(_first(fig, TABLE)),
+            "fig_num": xml_id,
+        }
+    if label is not None and label.text and label.text.isdigit():
+        fig_num = label.text
+    else:
+        fig_num = None
+    fig_desc = _first(fig, FIG_DESC)
+    return {
+        "text": _text(fig_desc).strip() if fig_desc is not None else "",
+        "latex": None,
+        "type": "figure",
+        "content": "",
+        "fig_num": fig_num,
+    }
+
+
+def extract_figures_and_tables_from_tei_xml(root) -> dict[str, dict]:
+    ref_map = dict()
+    fig_labels = index_figure_labels(root)
+
+    decomposed = set()
+    for fig in list(root.iter(FIGURE)):
+        if any(parent in decomposed for parent in fig.iterancestors(FIGURE)):
+            # gone with the enclosing figure, as in bs4
+            continue
+        try:
+            xml_id = fig.get(XML_ID)
+            if xml_id:
+                if fig.get("type") == "table":
+                    label = None
+                elif next(fig.iterancestors(FIGURE), None) is not None:
+                    # the enclosing figure was kept, so the label index
+                    # may not hold this one
+                    label = _find_next(_find_next(fig, HEAD), LABEL)
+                elif fig in fig_labels:
+                    label = fig_labels[fig]
+                else:
+                    continue
+                ref_map[normalize_grobid_id(xml_id)] = figure_ref_entry(
+                    fig, xml_id, label
+                )
+        except AttributeError:
+            continue
+        _decompose(fig)
+        decomposed.add(fig)
+
+    return ref_map
+
+
+def check_if_citations_are_bracket_style(root) -> bool:
+    cite_strings = []
+    body = _first(root, BODY)
+    if body is not None:
+        for div in body.iterdescendants(DIV):
+            if _first(div, HEAD) is not None:
+                continue
+            for rtag in div.iterdescendants(REF):
+                if rtag.get("type") == "bibr":
+                    cite_strings.append(_text(rtag).strip())
+        bracket_style = [
+            bool(BRACKET_REGEX.match(cite_str)) for cite_str in cite_strings
+        ]
+        if sum(bracket_style) > BRACKET_STYLE_THRESHOLD:
+            return True
+    return False
+
+
+def note_to_paragraph(ntag) -> None:
+    p_tag = etree.Element(P)
+    p_tag.text = _text(ntag).strip()
+    p_tag.tail = ntag.tail
+    ntag.getparent().replace(ntag, p_tag)
+
+
+def sub_all_note_tags(root):
+    for ntag in list(root.iter(NOTE)):
+        note_to_paragraph(ntag)
+    return root
+
+
+def process_formulas_in_paragraph(para_el) -> None:
+    for ftag in list(para_el.iterdescendants(FORMULA)):
+        label_el = _first(ftag, LABEL)
+        if label_el is not None:
+            label = " " + _text(label_el)
+            _decompose(label_el)
+        else:
+            label = ""
+        _replace_with_text(ftag, f"{_text(ftag).strip()}{label}")
+
+
+def process_references_in_paragraph(para_el, refs: dict) -> dict:
+    tokgen = UniqTokenGenerator("REFTOKEN")
+    ref_dict = dict()
+    for rtag in list(para_el.iterdescendants(REF)):
+        ref_type = rtag.get("type")
+        if ref_type == "bibr":
+            continue
+        if ref_type == "table" or ref_type == "figure":
+            ref_id = rtag.get("target")
+            if ref_id and normalize_grobid_id(ref_id) in refs:
+                rtag_string = normalize_grobid_id(ref_id)
+            else:
+                rtag_string = None
+            ref_key = tokgen.next()
+            ref_dict[ref_key] = (rtag_string, _text(rtag).strip(), ref_type)
+            _replace_with_text(rtag, f" {ref_key} ")
+        else:
+            _replace_with_text(rtag, _text(rtag).strip())
+    return ref_dict
+
+
+def process_citations_in_paragraph(para_el, bibs: dict, bracket: bool) -> dict:
+    def _get_surface_range(start_surface, end_surface):
+        span1_match = SINGLE_BRACKET_REGEX.match(start_surface)
+        span2_match = SINGLE_BRACKET_REGEX.match(end_surface)
+        if span1_match and span2_match:
+            span1_num = int(span1_match.group(1))
+            span2_num = int(span2_match.group(1))
+            if 1 < span2_num - span1_num < 20:
+                return span1_num, span2_num
+        return None
+
+    def _previous_ref(el):
+        return next(el.itersiblings(REF, preceding=True), None)
+
+    cite_map = dict()
+    tokgen = UniqTokenGenerator("CITETOKEN")
+
+    for rtag in list(para_el.iterdescendants(REF)):
+        try:
+            surface_span = _text(rtag).strip()
+
+            if rtag.get("target"):
+                rtag_ref_id = normalize_grobid_id(rtag.get("target"))
+                if rtag_ref_id not in bibs:
+                    cite_key = tokgen.next()
+                    _replace_with_text(rtag, f" {cite_key} ")
+                    cite_map[cite_key] = (None, surface_span)
+                    continue
+                if bracket:
+                    if surface_span and (
+                        surface_span[0] == "["
+                        or surface_span[-1] == "]"
+                        or surface_span[-1] == ","
+                    ):
+                        pass
+                    else:
+                        _replace_with_text(rtag, f" {surface_span} ")
+                        continue
+                else:
+                    cite_key = tokgen.next()
+                    _replace_with_text(rtag, f" {cite_key} ")
+                    cite_map[cite_key] = (rtag_ref_id, surface_span)
+                    continue
+                if is_expansion_string(_previous_string(rtag)):
+                    previous_rtag = _previous_ref(rtag)
+                    surface_num_range = _get_surface_range(
+                        _text(previous_rtag).strip(), surface_span
+                    )
+                    if surface_num_range:
+                        _clear_previous_string(rtag)
+                        previous_rtag_ref_id = normalize_grobid_id(
+                            previous_rtag.get("target")
+                        )
+                        _decompose(previous_rtag)
+                        start_ref_num = int(previous_rtag_ref_id[6:])
+                        end_ref_num = int(rtag_ref_id[6:])
+                        id_range = [
+                            f"BIBREF{curr_ref_num}"
+                            for curr_ref_num in range(start_ref_num, end_ref_num + 1)
+                        ]
+                        surface_range = [
+                            f"[{n}]"
+                            for n in range(
+                                surface_num_range[0], surface_num_range[1] + 1
+                            )
+                        ]
+                        replace_string = ""
+                        for range_ref_id, range_surface_form in zip(
+                            id_range, surface_range
+                        ):
+                            cite_key = tokgen.next()
+                            if range_ref_id in bibs:
+                                cite_map[cite_key] = (range_ref_id, range_surface_form)
+                            else:
+                                cite_map[cite_key] = (None, range_surface_form)
+                            replace_string += cite_key + " "
+                        _replace_with_text(rtag, f" {replace_string} ")
+                    else:
+                        previous_rtag_ref_id = normalize_grobid_id(
+                            previous_rtag.get("target")
+                        )
+                        previous_rtag_surface = _text(previous_rtag).strip()
+                        cite_key = tokgen.next()
+                        _replace_with_text(previous_rtag, f" {cite_key} ")
+                        cite_map[cite_key] = (
+                            previous_rtag_ref_id,
+                            previous_rtag_surface,
+                        )
+                        cite_key = tokgen.next()
+                        _replace_with_text(rtag, f" {cite_key} ")
+                        cite_map[cite_key] = (rtag_ref_id, surface_span)
+                else:
+                    if is_expansion_string(rtag.tail or ""):
+                        continue
+                    cite_key = tokgen.next()
+                    _replace_with_text(rtag, f" {cite_key} ")
+                    cite_map[cite_key] = (rtag_ref_id, surface_span)
+
+            else:
+                cite_key = tokgen.next()
+                _replace_with_text(rtag, f" {cite_key} ")
+                cite_map[cite_key] = (None, surface_span)
+        except AttributeError:
+            continue
+
+    return cite_map
+
+
+def _text_without(el, skip) -> str:
+    parts = [el.text or ""]
+    for child in el:
+        if child is not skip:
+            parts.append(_text_without(child, skip))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+class EtreeParagraphBuilder(ParagraphBuilder):
+    """
+    ``ParagraphBuilder`` over ``lxml.etree`` elements
+    """
+
+    def children(self, el) -> list[tuple[str, object]]:
+        items = [(self.TEXT, el.text)] if el.text else []
+        for child in el:
+            if child.tag == FORMULA:
+                items.append((self.FORMULA, child))
+            elif child.tag == REF:
+                items.append((self.REF, child))
+            else:
+                items.append((self.TAG, child))
+            if child.tail:
+                items.append((self.TEXT, child.tail))
+        return items
+
+    def text(self, el) -> str:
+        return _text(el)
+
+    def get(self, el, key: str) -> Optional[str]:
+        return el.get(key)
+
+    def has_nested_markup(self, ref) -> bool:
+        return (
+            len(ref) > 0 and next(ref.iterdescendants(REF, FORMULA), None) is not None
+        )
+
+    def formula_text(self, formula) -> str:
+        label = _first(formula, LABEL)
+        if label is None:
+            return _text(formula).strip()
+        return f"{_text_without(formula, label).strip()} {_text(label)}"
+
+
+def process_paragraph(
+    para_el,
+    section_names: list[tuple],
+    bib_dict: dict,
+    ref_dict: dict,
+    bracket: bool,
+) -> dict:
+    para_text = _text(para_el)
+    if not para_text:
+        return {
+            "text": "",
+            "cite_spans": [],
+            "ref_spans": [],
+            "eq_spans": [],
+            "section": section_names,
+        }
+    try:
+        return EtreeParagraphBuilder(bib_dict, ref_dict, bracket).build(
+            para_el, section_names
+        )
+    except NestedReferenceError:
+        pass
+    process_formulas_in_paragraph(para_el)
+    ref_map = process_references_in_paragraph(para_el, ref_dict)
+    cite_map = process_citations_in_paragraph(para_el, bib_dict, bracket)
+    para_text = re.sub(r"\s+", " ", _text(para_el))
+    all_spans_to_replace = []
+    for span in re.finditer(r"(CITETOKEN\d+)", para_text):
+        uniq_token = span.group()
+        ref_id, surface_text = cite_map[uniq_token]
+        all_spans_to_replace.append(
+            (span.start(), span.start() + len(uniq_token), uniq_token, surface_text)
+        )
+    for span in re.finditer(r"(REFTOKEN\d+)", para_text):
+        uniq_token = span.group()
+        ref_id, surface_text, ref_type = ref_map[uniq_token]
+        all_spans_to_replace.append(
+            (span.start(), span.start() + len(uniq_token), uniq_token, surface_text)
+        )
+    para_text, all_spans_to_replace = sub_spans_and_update_indices(
+        all_spans_to_replace, para_text
+    )
+
+    return {
+        "text": para_text,
+        "cite_spans": [
+            {"start": start, "end": end, "text": surface, "ref_id": cite_map[token][0]}
+            for start, end, token, surface in all_spans_to_replace
+            if token.startswith("CITETOKEN")
+        ],
+        "ref_spans": [
+            {"start": start, "end": end, "text": surface, "ref_id": ref_map[token][0]}
+            for start, end, token, surface in all_spans_to_replace
+            if token.startswith("REFTOKEN")
+        ],
+        "eq_spans": [],
+        "section": section_names,
+    }
+
+
+def iter_abstract_from_tei_xml(
+    root, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> Iterator[dict]:
+    abstract = _first(root, ABSTRACT)
+    if abstract is not None:
+        section = [(None, "Abstract")]
+        if _first(abstract, DIV) is not None:
+            for div in list(abstract.iterdescendants(DIV)):
+                if _text(div):
+                    if _first(div, P) is not None:
+                        for para in list(div.iterdescendants(P)):
+                            if _text(para):
+                                yield process_paragraph(
+                                    para,
+                                    section,
+                                    bib_dict,
+                                    ref_dict,
+                                    cleanup_bracket,
+                                )
+                    else:
+                        yield process_paragraph(
+                            div, section, bib_dict, ref_dict, cleanup_bracket
+                        )
+        elif _first(abstract, P) is not None:
+            for para in list(abstract.iterdescendants(P)):
+                if _text(para):
+                    yield process_paragraph(
+                        para, section, bib_dict, ref_dict, cleanup_bracket
+                    )
+        else:
+            if _text(abstract):
+                yield process_paragraph(
+                    abstract, section, bib_dict, ref_dict, cleanup_bracket
+                )
+        _decompose(abstract)
+
+
+def extract_abstract_from_tei_xml(
+    root, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> list[dict]:
+    return list(iter_abstract_from_tei_xml(root, bib_dict, ref_dict, cleanup_bracket))
+
+
+def _nearest_div(el, root):
+    parent = el.getparent()
+    while parent is not root and parent.tag != DIV:
+        parent = parent.getparent()
+    return parent
+
+
+def extract_paragraphs_from_div(
+    div,
+    sections: list[tuple],
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+) -> list[dict]:
+    chunks = []
+    for tag in list(div):
+        if tag.tag == P:
+            if _text(tag):
+                chunks.append(
+                    process_paragraph(
+                        tag, sections, bib_dict, ref_dict, cleanup_bracket
+                    )
+                )
+        elif tag.tag == FORMULA:
+            label_el = _first(tag, LABEL)
+            if label_el is None:
+                if _text(tag):
+                    chunks.append(
+                        process_paragraph(
+                            tag, sections, bib_dict, ref_dict, cleanup_bracket
+                        )
+                    )
+                continue
+            label = _text(label_el)
+            _decompose(label_el)
+            chunks.append(
+                {
+                    "text": "EQUATION",
+                    "cite_spans": [],
+                    "ref_spans": [],
+                    "eq_spans": [
+                        {
+                            "start": 0,
+                            "end": 8,
+                            "text": "EQUATION",
+                            "ref_id": "EQREF",
+                            "raw_str": _text(tag),
+                            "eq_num": label,
+                        }
+                    ],
+                    "section": sections,
+                }
+            )
+
+    return chunks
+
+
+def iter_body_text_from_div(
+    div,
+    sections: list[tuple],
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+) -> Iterator[dict]:
+    subdivs = {div: []}
+    heads = {}
+    for el in div.iterdescendants(DIV, HEAD):
+        owner = _nearest_div(el, div)
+        if el.tag == DIV:
+            subdivs[owner].append(el)
+            subdivs[el] = []
+        elif owner not in heads:
+            heads[owner] = el
+
+    stack = [(div, sections, False)]
+    while stack:
+        current, current_sections, expanded = stack.pop()
+        if expanded:
+            yield from extract_paragraphs_from_div(
+                current, current_sections, bib_dict, ref_dict, cleanup_bracket
+            )
+            continue
+        stack.append((current, current_sections, True))
+        for subdiv in reversed(subdivs[current]):
+            head = heads.get(subdiv)
+            if head is not None:
+                subsections = current_sections + [
+                    (head.get("n", None), _text(head).strip())
+                ]
+            else:
+                subsections = current_sections
+            stack.append((subdiv, subsections, False))
+
+
+def extract_body_text_from_div(
+    div,
+    sections: list[tuple],
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+) -> list[dict]:
+    return list(
+        iter_body_text_from_div(div, sections, bib_dict, ref_dict, cleanup_bracket)
+    )
+
+
+def iter_body_text_from_tei_xml(
+    root, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> Iterator[dict]:
+    body = _first(root, BODY)
+    if body is not None:
+        yield from iter_body_text_from_div(
+            body, [], bib_dict, ref_dict, cleanup_bracket
+        )
+        _decompose(body)
+
+
+def extract_body_text_from_tei_xml(
+    root, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> list[dict]:
+    return list(iter_body_text_from_tei_xml(root, bib_dict, ref_dict, cleanup_bracket))
+
+
+def iter_back_matter_from_tei_xml(
+    root, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> Iterator[dict]:
+    back = _first(root, BACK)
+    if back is not None:
+        for div in list(back.iterdescendants(DIV)):
+            section_type = div.get("type") or ""
+
+            for child_div in list(div.iterdescendants(DIV)):
+                head = _first(child_div, HEAD)
+                if head is not None:
+                    section_title = _text(head).strip()
+                    section_num = head.get("n", None)
+                    _decompose(head)
+                else:
+                    section_title = section_type
+                    section_num = None
+                if _text(child_div):
+                    yield process_paragraph(
+                        child_div,
+                        [(section_num, section_title)],
+                        bib_dict,
+                        ref_dict,
+                        cleanup_bracket,
+                    )
+        _decompose(back)
+
+
+def extract_back_matter_from_tei_xml(
+    root, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> list[dict]:
+    return list(
+        iter_back_matter_from_tei_xml(root, bib_dict, ref_dict, cleanup_bracket)
+    )
+
+
+def extract_metadata_from_tei_xml(root) -> dict:
+    file_desc = _first(root, FILE_DESC)
+    if file_desc is None:
+        raise AttributeError("TEI document has no fileDesc")
+    metadata = extract_paper_metadata(file_desc)
+    metadata["authors"] = clear_authors(metadata["authors"])
+    return metadata
+
+
+def extract_bib_entries_from_tei_xml(root) -> dict[str, dict]:
+    return {normalize_grobid_id(bib["ref_id"]): bib for bib in parse_bibliography(root)}
+
+
+def extract_front_matter(
+    root, stats: Optional[ConversionStats] = None
+) -> tuple[dict, dict, dict, bool]:
+    if stats is None:
+        stats = NULL_STATS
+    stats.start("metadata")
+    metadata = extract_metadata_from_tei_xml(root)
+
+    stats.start("bibliography")
+    bibkey_map = extract_bib_entries_from_tei_xml(root)
+
+    stats.start("figures")
+    refkey_map = extract_figures_and_tables_from_tei_xml(root)
+
+    stats.start("bracket_style")
+    is_bracket_style = check_if_citations_are_bracket_style(root)
+
+    stats.start("notes")
+    sub_all_note_tags(root)
+    return metadata, bibkey_map, refkey_map, is_bracket_style
+
+
+def iter_paper_paragraphs(
+    root,
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+    stats: Optional[ConversionStats] = None,
+) -> Iterator[tuple[str, dict]]:
+    if stats is None:
+        stats = NULL_STATS
+    stats.start("abstract")
+    for para in iter_abstract_from_tei_xml(root, bib_dict, ref_dict, cleanup_bracket):
+        yield "abstract", para
+
+    stats.start("body")
+    for para in iter_body_text_from_tei_xml(root, bib_dict, ref_dict, cleanup_bracket):
+        yield "body_text", para
+
+    stats.start("back_matter")
+    for para in iter_back_matter_from_tei_xml(
+        root, bib_dict, ref_dict, cleanup_bracket
+    ):
+        yield "back_matter", para
+
+
+def convert_tree_to_json(
+    root,
+    paper_id: str,
+    pdf_hash: str,
+    stats: Optional[ConversionStats] = None,
+    as_dict: bool = False,
+) -> Union[Paper, dict]:
+    if stats is None:
+        stats = NULL_STATS
+    metadata, bibkey_map, refkey_map, is_bracket_style = extract_front_matter(
+        root, stats
+    )
+
+    parts = {part: [] for part in PARTS}
+    for part, para in iter_paper_paragraphs(
+        root, bibkey_map, refkey_map, is_bracket_style, stats
+    ):
+        parts[part].append(para)
+    abstract_entries = parts["abstract"]
+    body_entries = parts["body_text"]
+    back_matter = parts["back_matter"]
+
+    stats.start("paper")
+    paper = (paper_json if as_dict else Paper)(
+        paper_id=paper_id,
+        pdf_hash=pdf_hash,
+        metadata=metadata,
+        abstract=abstract_entries,
+        body_text=body_entries,
+        back_matter=back_matter,
+        bib_entries=bibkey_map,
+        ref_entries=refkey_map,
+    )
+    if stats.enabled:
+        stats.record_output(
+            abstract_entries, body_entries, back_matter, bibkey_map, refkey_map
+        )
+    stats.stop()
+    return paper
@@ -1,16 +1,20 @@
 import re
+from typing import Iterator, Optional, Union
 
 import bs4
-from bs4 import BeautifulSoup, NavigableString
+from bs4 import BeautifulSoup, CData, NavigableString
 
 from grobid2json.citation_util import clear_authors, is_expansion_string
 from grobid2json.grobid_util import extract_paper_metadata, parse_bib_entry
 from grobid2json.refspan_util import sub_spans_and_update_indices
-from grobid2json.s2orc import Paper
+from grobid2json.s2orc import Paper, paper_json
+from grobid2json.stats import NULL_STATS, ConversionStats
 
 BRACKET_STYLE_THRESHOLD = 5
 BRACKET_REGEX = re.compile(r"\[[1-9]\d{0,2}([,;\-\s]+[1-9]\d{0,2})*;?\]")
 SINGLE_BRACKET_REGEX = re.compile(r"\[([1-9]\d{0,2})\]")
+WHITESPACE_REGEX = re.compile(r"\s+")
+TEXT_STRINGS = (NavigableString, CData)
 
 REPLACE_TABLE_TOKS = {
     "<row>": "<tr>",
@@ -92,8 +96,33 @@ def table_to_html(table: bs4.element.Tag) -> str:
     return table_str
 
 
+def index_figure_labels(sp: BeautifulSoup) -> dict[int, Optional[bs4.element.Tag]]:
+    """
+    Map ``id(fig)`` to ``fig.findNext("head").findNext("label")`` for every
+    figure in one document-order pass; figures with no head after them are
+    left out
+    """
+    labels = dict()
+    waiting_for_head = []
+    waiting_for_label = []
+    for tag in sp.find_all(["figure", "head", "label"]):
+        if tag.name == "figure":
+            waiting_for_head.append(tag)
+        elif tag.name == "head":
+            waiting_for_label += waiting_for_head
+            waiting_for_head = []
+        elif waiting_for_label:
+            for fig in waiting_for_label:
+                labels[id(fig)] = tag
+            waiting_for_label = []
+    for fig in waiting_for_label:
+        labels[id(fig)] = None
+    return labels
+
+
 def extract_figures_and_tables_from_tei_xml(sp: BeautifulSoup) -> dict[str, dict]:
     ref_map = dict()
+    fig_labels = index_figure_labels(sp)
 
     for fig in sp.find_all("figure"):
         try:
@@ -113,11 +142,16 @@ def extract_figures_and_tables_from_tei_xml(sp: BeautifulSoup) -> dict[str, dict
                         "fig_num": fig.get("xml:id"),
                     }
                 else:
-                    if True in [
-                        char.isdigit()
-                        for char in fig.findNext("head").findNext("label")
-                    ]:
-                        fig_num = fig.findNext("head").findNext("label").contents[0]
+                    if any(parent.name == "figure" for parent in fig.parents):
+                        # the enclosing figure was kept, so the label index
+                        # may not hold this one
+                        label = fig.findNext("head").findNext("label")
+                    elif id(fig) in fig_labels:
+                        label = fig_labels[id(fig)]
+                    else:
+                        continue
+                    if label is not None and True in [char.isdigit() for char in label]:
+                        fig_num = str(label.contents[0])
                     else:
                         fig_num = None
                     ref_map[normalize_grobid_id(fig.get("xml:id"))] = {
@@ -196,30 +230,33 @@ def process_references_in_paragraph(
     return ref_dict
 
 
-def process_citations_in_paragraph(
-    para_el: BeautifulSoup, sp: BeautifulSoup, bibs: dict, bracket: bool
-) -> dict:
-    def _get_surface_range(start_surface, end_surface):
-        span1_match = SINGLE_BRACKET_REGEX.match(start_surface)
-        span2_match = SINGLE_BRACKET_REGEX.match(end_surface)
-        if span1_match and span2_match:
-            span1_num = int(span1_match.group(1))
-            span2_num = int(span2_match.group(1))
-            if 1 < span2_num - span1_num < 20:
-                return span1_num, span2_num
-        return None
+def _get_surface_range(start_surface, end_surface):
+    span1_match = SINGLE_BRACKET_REGEX.match(start_surface)
+    span2_match = SINGLE_BRACKET_REGEX.match(end_surface)
+    if span1_match and span2_match:
+        span1_num = int(span1_match.group(1))
+        span2_num = int(span2_match.group(1))
+        if 1 < span2_num - span1_num < 20:
+            return span1_num, span2_num
+    return None
 
-    def _create_ref_id_range(start_ref_id, end_ref_id):
-        start_ref_num = int(start_ref_id[6:])
-        end_ref_num = int(end_ref_id[6:])
-        return [
-            f"BIBREF{curr_ref_num}"
-            for curr_ref_num in range(start_ref_num, end_ref_num + 1)
-        ]
 
-    def _create_surface_range(start_number, end_number):
-        return [f"[{n}]" for n in range(start_number, end_number + 1)]
+def _create_ref_id_range(start_ref_id, end_ref_id):
+    start_ref_num = int(start_ref_id[6:])
+    end_ref_num = int(end_ref_id[6:])
+    return [
+        f"BIBREF{curr_ref_num}"
+        for curr_ref_num in range(start_ref_num, end_ref_num + 1)
+    ]
+
+
+def _create_surface_range(start_number, end_number):
+    return [f"[{n}]" for n in range(start_number, end_number + 1)]
 
+
+def process_citations_in_paragraph(
+    para_el: BeautifulSoup, sp: BeautifulSoup, bibs: dict, bracket: bool
+) -> dict:
     cite_map = dict()
     tokgen = UniqTokenGenerator("CITETOKEN")
 
@@ -333,6 +370,264 @@ def process_citations_in_paragraph(
     return cite_map
 
 
+class NestedReferenceError(Exception):
+    """
+    A ref holds another ref or a formula, which ParagraphBuilder does not model
+    """
+
+
+class ParagraphBuilder:
+    """
+    Build a paragraph blob in one walk over the paragraph's children.
+
+    Text is appended to a buffer with whitespace normalised as it goes and
+    cite/ref spans are recorded at their final offsets, giving the same result
+    as the token substitution in ``process_*_in_paragraph`` without touching
+    the tree. Each child list is resolved the way those functions see it after
+    formulas and non-citation refs have been replaced by strings, so citation
+    range expansion keeps its sibling-based behaviour.
+
+    The tree access methods work on BeautifulSoup and are overridden by the
+    lxml engine.
+    """
+
+    TEXT = "text"
+    HIDDEN = "hidden"
+    FORMULA = "formula"
+    REF = "ref"
+    TAG = "tag"
+
+    # resolved child kinds
+    STRING = 0
+    TOKENS = 1
+    CITATION = 2
+    ELEMENT = 3
+    REMOVED = 4
+
+    # stands in for " CITETOKEN0 " when looking for expansion strings
+    TOKEN_STRING = " TOKEN "
+
+    def __init__(self, bib_dict: dict, ref_dict: dict, bracket: bool):
+        self.bib_dict = bib_dict
+        self.ref_dict = ref_dict
+        self.bracket = bracket
+
+    def children(self, el) -> list[tuple[str, object]]:
+        items = []
+        for child in el.contents:
+            if isinstance(child, NavigableString):
+                kind = self.TEXT if type(child) in TEXT_STRINGS else self.HIDDEN
+                items.append((kind, str(child)))
+            elif child.name == "formula":
+                items.append((self.FORMULA, child))
+            elif child.name == "ref":
+                items.append((self.REF, child))
+            else:
+                items.append((self.TAG, child))
+        return items
+
+    def text(self, el) -> str:
+        return el.text
+
+    def get(self, el, key: str) -> Optional[str]:
+        return el.get(key)
+
+    def has_nested_markup(self, ref) -> bool:
+        return ref.find(["ref", "formula"]) is not None
+
+    def formula_text(self, formula) -> str:
+        label = formula.label
+        if label is None:
+            return formula.text.strip()
+        skip = {id(s) for s in label.strings}
+        text = "".join(s for s in formula.strings if id(s) not in skip)
+        return f"{text.strip()} {label.text}"
+
+    def build(self, para_el, section_names: list[tuple]) -> dict:
+        self._parts = []
+        self._length = 0
+        self._space = False
+        self._cite_spans = []
+        self._ref_spans = []
+        self._emit_children(para_el)
+        para_text = "".join(self._parts)
+
+        for cite_blob in self._cite_spans:
+            assert para_text[cite_blob["start"] : cite_blob["end"]] == cite_blob["text"]
+
+        for ref_blob in self._ref_spans:
+            assert para_text[ref_blob["start"] : ref_blob["end"]] == ref_blob["text"]
+
+        return {
+            "text": para_text,
+            "cite_spans": self._cite_spans,
+            "ref_spans": self._ref_spans,
+            "eq_spans": [],
+            "section": section_names,
+        }
+
+    def _emit_children(self, el):
+        for item in self._resolve(el):
+            kind = item[0]
+            if kind == self.STRING:
+                self._emit_text(item[2])
+            elif kind == self.TOKENS:
+                self._emit_text(" ")
+                for token in item[2]:
+                    self._emit_token(*token)
+                    self._emit_text(" ")
+                if len(item[2]) > 1:
+                    # citation ranges were written as f" {replace_string} "
+                    self._emit_text(" ")
+            elif kind == self.CITATION:
+                self._emit_text(self.text(item[1]))
+            elif kind == self.ELEMENT:
+                self._emit_children(item[1])
+
+    def _emit_text(self, text: str):
+        text = WHITESPACE_REGEX.sub(" ", text)
+        if self._space and text[:1] == " ":
+            text = text[1:]
+        if text:
+            self._parts.append(text)
+            self._length += len(text)
+            self._space = text[-1] == " "
+
+    def _emit_token(self, spans: list, ref_id: Optional[str], surface: str):
+        start = self._length
+        self._parts.append(surface)
+        self._length += len(surface)
+        self._space = False
+        spans.append(
+            {"start": start, "end": self._length, "text": surface, "ref_id": ref_id}
+        )
+
+    def _resolve(self, el) -> list[list]:
+        items = []
+        for kind, child in self.children(el):
+            if kind == self.TEXT:
+                items.append([self.STRING, child, child])
+            elif kind == self.HIDDEN:
+                items.append([self.STRING, child, ""])
+            elif kind == self.FORMULA:
+                formula_text = self.formula_text(child)
+                items.append([self.STRING, formula_text, formula_text])
+            elif kind == self.REF:
+                if self.has_nested_markup(child):
+                    raise NestedReferenceError()
+                items.append(self._resolve_reference(child))
+            else:
+                items.append([self.ELEMENT, child])
+        for i, item in enumerate(items):
+            if item[0] == self.CITATION:
+                self._resolve_citation(items, i)
+        return items
+
+    def _resolve_reference(self, rtag) -> list:
+        ref_type = self.get(rtag, "type")
+        if ref_type == "bibr":
+            return [self.CITATION, rtag]
+        surface = self.text(rtag).strip()
+        if ref_type == "table" or ref_type == "figure":
+            ref_id = self.get(rtag, "target")
+            if ref_id and normalize_grobid_id(ref_id) in self.ref_dict:
+                rtag_string = normalize_grobid_id(ref_id)
+            else:
+                rtag_string = None
+            return self._tokens((self._ref_spans, rtag_string, surface))
+        return [self.STRING, surface, surface]
+
+    def _cite(self, ref_id: Optional[str], surface: str) -> list:
+        return self._tokens((self._cite_spans, ref_id, surface))
+
+    def _tokens(self, *tokens) -> list:
+        return [self.TOKENS, self.TOKEN_STRING, tokens]
+
+    def _between_string(self, items: list[list], indices: range) -> str:
+        between = ""
+        for j in indices:
+            kind = items[j][0]
+            if kind == self.REMOVED:
+                continue
+            if kind != self.STRING and kind != self.TOKENS:
+                break
+            between += items[j][1]
+            if len(between) > 2:
+                break
+        return between
+
+    def _previous_citation(self, items: list[list], i: int) -> Optional[int]:
+        for j in range(i - 1, -1, -1):
+            if items[j][0] == self.CITATION:
+                return j
+        return None
+
+    def _resolve_citation(self, items: list[list], i: int):
+        rtag = items[i][1]
+        surface_span = self.text(rtag).strip()
+        target = self.get(rtag, "target")
+        if not target:
+            items[i] = self._cite(None, surface_span)
+            return
+        rtag_ref_id = normalize_grobid_id(target)
+        if rtag_ref_id not in self.bib_dict:
+            items[i] = self._cite(None, surface_span)
+            return
+        if not self.bracket:
+            items[i] = self._cite(rtag_ref_id, surface_span)
+            return
+        if not surface_span or (
+            surface_span[0] != "["
+            and surface_span[-1] != "]"
+            and surface_span[-1] != ","
+        ):
+            items[i] = [self.STRING, f" {surface_span} ", f" {surface_span} "]
+            return
+
+        if not is_expansion_string(self._between_string(items, range(i - 1, -1, -1))):
+            if not is_expansion_string(
+                self._between_string(items, range(i + 1, len(items)))
+            ):
+                items[i] = self._cite(rtag_ref_id, surface_span)
+            return
+
+        j = self._previous_citation(items, i)
+        if j is None:
+            return
+        previous_rtag = items[j][1]
+        previous_surface = self.text(previous_rtag).strip()
+        surface_num_range = _get_surface_range(previous_surface, surface_span)
+        if surface_num_range:
+            for k in range(i - 1, -1, -1):
+                kind = items[k][0]
+                if kind == self.REMOVED:
+                    continue
+                if kind == self.STRING or kind == self.TOKENS:
+                    items[k] = [self.STRING, "", ""]
+                break
+        previous_target = self.get(previous_rtag, "target")
+        if previous_target is None:
+            return
+        previous_rtag_ref_id = normalize_grobid_id(previous_target)
+        if surface_num_range:
+            items[j] = [self.REMOVED]
+            id_range = _create_ref_id_range(previous_rtag_ref_id, rtag_ref_id)
+            surface_range = _create_surface_range(*surface_num_range)
+            items[i] = self._tokens(
+                *(
+                    (
+                        self._cite_spans,
+                        range_ref_id if range_ref_id in self.bib_dict else None,
+                        range_surface_form,
+                    )
+                    for range_ref_id, range_surface_form in zip(id_range, surface_range)
+                )
+            )
+        else:
+            items[j] = self._cite(previous_rtag_ref_id, previous_surface)
+            items[i] = self._cite(rtag_ref_id, surface_span)
+
+
 def process_paragraph(
     sp: BeautifulSoup,
     para_el: bs4.element.Tag,
@@ -349,6 +644,12 @@ def process_paragraph(
             "eq_spans": [],
             "section": section_names,
         }
+    try:
+        return ParagraphBuilder(bib_dict, ref_dict, bracket).build(
+            para_el, section_names
+        )
+    except NestedReferenceError:
+        pass
     process_formulas_in_paragraph(para_el, sp)
     ref_map = process_references_in_paragraph(para_el, sp, ref_dict)
     cite_map = process_citations_in_paragraph(para_el, sp, bib_dict, bracket)
@@ -398,10 +699,9 @@ def process_paragraph(
     }
 
 
-def extract_abstract_from_tei_xml(
+def iter_abstract_from_tei_xml(
     sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
-) -> list[dict]:
-    abstract_text = []
+) -> Iterator[dict]:
     if sp.abstract:
         if sp.abstract.div:
             for div in sp.abstract.find_all("div"):
@@ -409,58 +709,62 @@ def extract_abstract_from_tei_xml(
                     if div.p:
                         for para in div.find_all("p"):
                             if para.text:
-                                abstract_text.append(
-                                    process_paragraph(
-                                        sp,
-                                        para,
-                                        [(None, "Abstract")],
-                                        bib_dict,
-                                        ref_dict,
-                                        cleanup_bracket,
-                                    )
-                                )
-                    else:
-                        if div.text:
-                            abstract_text.append(
-                                process_paragraph(
+                                yield process_paragraph(
                                     sp,
-                                    div,
+                                    para,
                                     [(None, "Abstract")],
                                     bib_dict,
                                     ref_dict,
                                     cleanup_bracket,
                                 )
+                    else:
+                        if div.text:
+                            yield process_paragraph(
+                                sp,
+                                div,
+                                [(None, "Abstract")],
+                                bib_dict,
+                                ref_dict,
+                                cleanup_bracket,
                             )
         elif sp.abstract.p:
             for para in sp.abstract.find_all("p"):
                 if para.text:
-                    abstract_text.append(
-                        process_paragraph(
-                            sp,
-                            para,
-                            [(None, "Abstract")],
-                            bib_dict,
-                            ref_dict,
-                            cleanup_bracket,
-                        )
-                    )
-        else:
-            if sp.abstract.text:
-                abstract_text.append(
-                    process_paragraph(
+                    yield process_paragraph(
                         sp,
-                        sp.abstract,
+                        para,
                         [(None, "Abstract")],
                         bib_dict,
                         ref_dict,
                         cleanup_bracket,
                     )
+        else:
+            if sp.abstract.text:
+                yield process_paragraph(
+                    sp,
+                    sp.abstract,
+                    [(None, "Abstract")],
+                    bib_dict,
+                    ref_dict,
+                    cleanup_bracket,
                 )
         sp.abstract.decompose()
-    return abstract_text
 
 
-def extract_body_text_from_div(
+def extract_abstract_from_tei_xml(
+    sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> list[dict]:
+    return list(iter_abstract_from_tei_xml(sp, bib_dict, ref_dict, cleanup_bracket))
+
+
+def _nearest_div(tag: bs4.element.Tag, root: bs4.element.Tag) -> bs4.element.Tag:
+    parent = tag.parent
+    while parent is not root and parent.name != "div":
+        parent = parent.parent
+    return parent
+
+
+def extract_paragraphs_from_div(
     sp: BeautifulSoup,
     div: bs4.element.Tag,
     sections: list[tuple],
@@ -468,23 +772,10 @@ def extract_body_text_from_div(
     ref_dict: dict,
     cleanup_bracket: bool,
 ) -> list[dict]:
+    """
+    Extract the paragraphs and formulas that are direct children of ``div``
+    """
     chunks = []
-    if div.div:
-        for subdiv in div.find_all("div"):
-            if subdiv.head:
-                chunks += extract_body_text_from_div(
-                    sp,
-                    subdiv,
-                    sections + [(subdiv.head.get("n", None), subdiv.head.text.strip())],
-                    bib_dict,
-                    ref_dict,
-                    cleanup_bracket,
-                )
-                subdiv.head.decompose()
-            else:
-                chunks += extract_body_text_from_div(
-                    sp, subdiv, sections, bib_dict, ref_dict, cleanup_bracket
-                )
     for tag in div:
         try:
             if tag.name == "p":
@@ -523,27 +814,87 @@ def extract_body_text_from_div(
                         sp, tag, sections, bib_dict, ref_dict, cleanup_bracket
                     )
                 )
-
     return chunks
 
 
-def extract_body_text_from_tei_xml(
-    sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+def iter_body_text_from_div(
+    sp: BeautifulSoup,
+    div: bs4.element.Tag,
+    sections: list[tuple],
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+) -> Iterator[dict]:
+    """
+    Yield the paragraphs of ``div`` and of every section nested in it.
+
+    One pass maps each div to its child divs and its own head, then the
+    sections are walked with an explicit stack, so every div is visited once
+    however deep the nesting goes. Child sections come before the paragraphs
+    of the div that contains them.
+    """
+    subdivs = {id(div): []}
+    heads = {}
+    for tag in div.find_all(["div", "head"]):
+        owner = id(_nearest_div(tag, div))
+        if tag.name == "div":
+            subdivs[owner].append(tag)
+            subdivs[id(tag)] = []
+        elif owner not in heads:
+            heads[owner] = tag
+
+    stack = [(div, sections, False)]
+    while stack:
+        current, current_sections, expanded = stack.pop()
+        if expanded:
+            yield from extract_paragraphs_from_div(
+                sp, current, current_sections, bib_dict, ref_dict, cleanup_bracket
+            )
+            continue
+        stack.append((current, current_sections, True))
+        for subdiv in reversed(subdivs[id(current)]):
+            head = heads.get(id(subdiv))
+            if head is not None:
+                subsections = current_sections + [
+                    (head.get("n", None), head.text.strip())
+                ]
+            else:
+                subsections = current_sections
+            stack.append((subdiv, subsections, False))
+
+
+def extract_body_text_from_div(
+    sp: BeautifulSoup,
+    div: bs4.element.Tag,
+    sections: list[tuple],
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
 ) -> list[dict]:
-    body_text = []
+    return list(
+        iter_body_text_from_div(sp, div, sections, bib_dict, ref_dict, cleanup_bracket)
+    )
+
+
+def iter_body_text_from_tei_xml(
+    sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> Iterator[dict]:
     if sp.body:
-        body_text = extract_body_text_from_div(
+        yield from iter_body_text_from_div(
             sp, sp.body, [], bib_dict, ref_dict, cleanup_bracket
         )
         sp.body.decompose()
-    return body_text
 
 
-def extract_back_matter_from_tei_xml(
+def extract_body_text_from_tei_xml(
     sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
 ) -> list[dict]:
-    back_text = []
+    return list(iter_body_text_from_tei_xml(sp, bib_dict, ref_dict, cleanup_bracket))
+
 
+def iter_back_matter_from_tei_xml(
+    sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> Iterator[dict]:
     if sp.back:
         for div in sp.back.find_all("div"):
             if div.get("type"):
@@ -561,46 +912,121 @@ def extract_back_matter_from_tei_xml(
                     section_num = None
                 if child_div.text:
                     if child_div.text:
-                        back_text.append(
-                            process_paragraph(
-                                sp,
-                                child_div,
-                                [(section_num, section_title)],
-                                bib_dict,
-                                ref_dict,
-                                cleanup_bracket,
-                            )
+                        yield process_paragraph(
+                            sp,
+                            child_div,
+                            [(section_num, section_title)],
+                            bib_dict,
+                            ref_dict,
+                            cleanup_bracket,
                         )
         sp.back.decompose()
-    return back_text
 
 
-def convert_xml_to_json(soup: BeautifulSoup, paper_id: str, pdf_hash: str) -> Paper:
-    metadata = extract_paper_metadata(soup.fileDesc)
+def extract_back_matter_from_tei_xml(
+    sp: BeautifulSoup, bib_dict: dict, ref_dict: dict, cleanup_bracket: bool
+) -> list[dict]:
+    return list(iter_back_matter_from_tei_xml(sp, bib_dict, ref_dict, cleanup_bracket))
+
+
+PARTS = ("abstract", "body_text", "back_matter")
+
+
+def extract_metadata_from_tei_xml(sp: BeautifulSoup) -> dict:
+    metadata = extract_paper_metadata(sp.fileDesc)
     metadata["authors"] = clear_authors(metadata["authors"])
+    return metadata
+
+
+def extract_bib_entries_from_tei_xml(sp: BeautifulSoup) -> dict[str, dict]:
+    """
+    Bibliography entries keyed by their normalized id, e.g. ``BIBREF0``
+    """
+    return {normalize_grobid_id(bib["ref_id"]): bib for bib in parse_bibliography(sp)}
 
-    biblio_entries = parse_bibliography(soup)
-    bibkey_map = {normalize_grobid_id(bib["ref_id"]): bib for bib in biblio_entries}
 
+def extract_front_matter(
+    soup: BeautifulSoup, stats: Optional[ConversionStats] = None
+) -> tuple[dict, dict, dict, bool]:
+    """
+    Extract what every paragraph depends on: the metadata, the bibliography,
+    the figures and tables, and the citation style. Notes are substituted too.
+    """
+    if stats is None:
+        stats = NULL_STATS
+    stats.start("metadata")
+    metadata = extract_metadata_from_tei_xml(soup)
+
+    stats.start("bibliography")
+    bibkey_map = extract_bib_entries_from_tei_xml(soup)
+
+    stats.start("figures")
     refkey_map = extract_figures_and_tables_from_tei_xml(soup)
 
+    stats.start("bracket_style")
     is_bracket_style = check_if_citations_are_bracket_style(soup)
 
-    soup = sub_all_note_tags(soup)
+    stats.start("notes")
+    sub_all_note_tags(soup)
+    return metadata, bibkey_map, refkey_map, is_bracket_style
 
-    abstract_entries = extract_abstract_from_tei_xml(
-        soup, bibkey_map, refkey_map, is_bracket_style
-    )
 
-    body_entries = extract_body_text_from_tei_xml(
-        soup, bibkey_map, refkey_map, is_bracket_style
-    )
-
-    back_matter = extract_back_matter_from_tei_xml(
-        soup, bibkey_map, refkey_map, is_bracket_style
+def iter_paper_paragraphs(
+    soup: BeautifulSoup,
+    bib_dict: dict,
+    ref_dict: dict,
+    cleanup_bracket: bool,
+    stats: Optional[ConversionStats] = None,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Yield ``(part, paragraph)`` for the abstract, body text and back matter
+    in document order, converting each paragraph only when it is asked for
+    """
+    if stats is None:
+        stats = NULL_STATS
+    stats.start("abstract")
+    for para in iter_abstract_from_tei_xml(soup, bib_dict, ref_dict, cleanup_bracket):
+        yield "abstract", para
+
+    stats.start("body")
+    for para in iter_body_text_from_tei_xml(soup, bib_dict, ref_dict, cleanup_bracket):
+        yield "body_text", para
+
+    stats.start("back_matter")
+    for para in iter_back_matter_from_tei_xml(
+        soup, bib_dict, ref_dict, cleanup_bracket
+    ):
+        yield "back_matter", para
+
+
+def convert_xml_to_json(
+    soup: BeautifulSoup,
+    paper_id: str,
+    pdf_hash: str,
+    stats: Optional[ConversionStats] = None,
+    as_dict: bool = False,
+) -> Union[Paper, dict]:
+    """
+    Convert a parsed TEI soup into a ``Paper``; with ``as_dict`` the result
+    is ``Paper.as_json()``, built without the intermediate objects
+    """
+    if stats is None:
+        stats = NULL_STATS
+    metadata, bibkey_map, refkey_map, is_bracket_style = extract_front_matter(
+        soup, stats
     )
 
-    return Paper(
+    parts = {part: [] for part in PARTS}
+    for part, para in iter_paper_paragraphs(
+        soup, bibkey_map, refkey_map, is_bracket_style, stats
+    ):
+        parts[part].append(para)
+    abstract_entries = parts["abstract"]
+    body_entries = parts["body_text"]
+    back_matter = parts["back_matter"]
+
+    stats.start("paper")
+    paper = (paper_json if as_dict else Paper)(
         paper_id=paper_id,
         pdf_hash=pdf_hash,
         metadata=metadata,
@@ -610,3 +1036,9 @@ def convert_xml_to_json(soup: BeautifulSoup, paper_id: str, pdf_hash: str) -> Pa
         bib_entries=bibkey_map,
         ref_entries=refkey_map,
     )
+    if stats.enabled:
+        stats.record_output(
+            abstract_entries, body_entries, back_matter, bibkey_map, refkey_map
+        )
+    stats.stop()
+    return paper
@@ -0,0 +1,274 @@
+"""
+Per-document manifest of a batch run, for resuming it.
+
+``Manifest`` records for every input a hash of its bytes (and the size and
+modification time of files, so unchanged ones need not be read to tell),
+whether it was converted, failed or dead-lettered (its worker was killed
+over a limit), where its record went (shard, byte offset, length) and how
+long it took, in a SQLite file next to the shards. Rows are committed
+only after the shard lines they point to were flushed. ``repair`` truncates
+every shard to the end of its last committed record, so when a run that
+crashed or was killed is resumed, lines written after its last checkpoint
+are dropped and converted again instead of showing up twice. The old record
+of an input converted again is marked stale along with its new row and
+blanked out of its shard, with spaces, once that row is committed.
+"""
+import hashlib
+import itertools
+import os
+import sqlite3
+import time
+from operator import itemgetter
+from typing import Iterable, Iterator, Optional, Union
+
+from grobid2json.archive import Member
+
+MANIFEST_SUFFIX = "-manifest.sqlite"
+DONE = "done"
+FAILED = "failed"
+DEAD_LETTER = "dead_letter"
+HASH_BLOCK_SIZE = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    input TEXT PRIMARY KEY,
+    input_hash TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    paper_id TEXT,
+    status TEXT NOT NULL,
+    shard TEXT,
+    offset INTEGER,
+    length INTEGER,
+    duration REAL,
+    error TEXT,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stale (
+    shard TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (shard, offset)
+) WITHOUT ROWID;
+"""
+
+
+def file_stat(path: str) -> tuple[int, int]:
+    """
+    ``(size, mtime_ns)`` of a file, to tell whether it changed without
+    reading it
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def input_hash(item: Union[str, bytes, Member]) -> str:
+    """
+    SHA-256 of the bytes of a file, as stored, of an archive member or of
+    bytes already read from either
+    """
+    digest = hashlib.sha256()
+    if isinstance(item, bytes):
+        digest.update(item)
+    elif isinstance(item, Member):
+        digest.update(item.data)
+    else:
+        with open(item, "rb") as fp:
+            for block in iter(lambda: fp.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    The status of every input of a batch run; unless ``resume`` is set, the
+    rows of a previous run are cleared
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._root = os.path.dirname(os.path.abspath(path))
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("BEGIN")
+        self._stale = False
+        if not resume:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM stale")
+
+    def _relative(self, shard_path: str) -> str:
+        return os.path.relpath(os.path.abspath(shard_path), self._root)
+
+    def add(
+        self,
+        input_name: str,
+        status: str,
+        input_hash: Optional[str] = None,
+        paper_id: Optional[str] = None,
+        location: Optional[tuple[str, int, int]] = None,
+        duration: Optional[float] = None,
+        error: Optional[str] = None,
+        stat: Optional[tuple[int, int]] = None,
+    ):
+        """
+        Record an input as ``DONE``, written at ``(shard path, offset, length)``,
+        or as ``FAILED`` or ``DEAD_LETTER`` with its error; ``stat`` is the
+        ``(size, mtime_ns)`` of an input file
+        """
+        shard, offset, length = location or (None, None, None)
+        size, mtime_ns = stat or (None, None)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents (input, input_hash, size, mtime_ns, "
+            "paper_id, status, shard, offset, length, duration, error, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                input_name,
+                input_hash,
+                size,
+                mtime_ns,
+                paper_id,
+                status,
+                self._relative(shard) if shard is not None else None,
+                offset,
+                length,
+                duration,
+                error,
+                time.time(),
+            ),
+        )
+
+    def discard(self, input_name: str) -> bool:
+        """
+        Mark the record of a converted input stale, to be blanked out of its
+        shard once the row replacing it is committed; ``False`` if the input
+        has no record
+        """
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO stale (shard, offset, length) "
+            "SELECT shard, offset, length FROM documents WHERE input = ? "
+            "AND status = ?",
+            (input_name, DONE),
+        )
+        if cursor.rowcount > 0:
+            self._stale = True
+        return cursor.rowcount > 0
+
+    def _blank_stale(self):
+        rows = self._conn.execute(
+            "SELECT shard, offset, length FROM stale ORDER BY shard, offset"
+        ).fetchall()
+        for shard, group in itertools.groupby(rows, key=itemgetter(0)):
+            shard_path = os.path.join(self._root, shard)
+            if not os.path.exists(shard_path):
+                continue
+            size = os.path.getsize(shard_path)
+            with open(shard_path, "r+b") as fp:
+                for _, offset, length in group:
+                    # a record past the end was cut off by repair already
+                    if offset + length <= size:
+                        fp.seek(offset)
+                        fp.write(b" " * length)
+                fp.flush()
+                os.fsync(fp.fileno())
+        self._conn.execute("DELETE FROM stale")
+        self._stale = False
+
+    def checkpoint(self):
+        """
+        Commit the rows added so far, then blank the records they made
+        stale; the shards must have been flushed first
+        """
+        self._conn.execute("COMMIT")
+        self._conn.execute("BEGIN")
+        if self._stale:
+            self._blank_stale()
+            self._conn.execute("COMMIT")
+            self._conn.execute("BEGIN")
+
+    def fingerprints(
+        self, *statuses: str
+    ) -> dict[str, tuple[Optional[str], Optional[int], Optional[int]]]:
+        """
+        ``(input hash, size, mtime_ns)`` of every input recorded with one of
+        ``statuses``
+        """
+        placeholders = ", ".join("?" * len(statuses))
+        return {
+            name: (digest, size, mtime_ns)
+            for name, digest, size, mtime_ns in self._conn.execute(
+                "SELECT input, input_hash, size, mtime_ns FROM documents "
+                f"WHERE status IN ({placeholders})",
+                statuses,
+            )
+        }
+
+    def records(self) -> Iterator[tuple[str, str, int, int]]:
+        """
+        ``(paper_id, shard path, offset, length)`` of every converted input,
+        in shard order
+        """
+        for paper_id, shard, offset, length in self._conn.execute(
+            "SELECT paper_id, shard, offset, length FROM documents "
+            "WHERE status = ? ORDER BY shard, offset",
+            (DONE,),
+        ):
+            yield paper_id, os.path.join(self._root, shard), offset, length
+
+    def counts(self) -> dict[str, int]:
+        return dict(
+            self._conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status")
+        )
+
+    def repair(self, shard_paths: Iterable[str]) -> list[str]:
+        """
+        Cut every shard back to the end of its last committed record, blank
+        the stale records a crash left in place and forget records that are
+        not in their shard (cut short by a crash); returns the shards that
+        still hold records, the others are removed
+        """
+        kept = []
+        for shard_path in shard_paths:
+            shard = self._relative(shard_path)
+            size = os.path.getsize(shard_path)
+            self._conn.execute(
+                "DELETE FROM documents WHERE shard = ? AND offset + length + 1 > ?",
+                (shard, size),
+            )
+            end = self._conn.execute(
+                "SELECT MAX(offset + length + 1) FROM documents WHERE shard = ?",
+                (shard,),
+            ).fetchone()[0]
+            if not end:
+                os.remove(shard_path)
+                continue
+            if size > end:
+                os.truncate(shard_path, end)
+            kept.append(shard_path)
+        kept_shards = {self._relative(shard_path) for shard_path in kept}
+        for (shard,) in self._conn.execute(
+            "SELECT DISTINCT shard FROM documents WHERE status = ?", (DONE,)
+        ).fetchall():
+            if shard not in kept_shards:
+                self._conn.execute("DELETE FROM documents WHERE shard = ?", (shard,))
+        self._blank_stale()
+        self.checkpoint()
+        return kept
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.execute("COMMIT")
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def manifest_path(output_dir: str, prefix: str = "part") -> str:
+    """
+    Where ``run_batch`` writes the manifest of the shards named ``prefix``
+    """
+    return os.path.join(output_dir, f"{prefix}{MANIFEST_SUFFIX}")
@@ -0,0 +1,45 @@
+"""
+Input path expansion shared by the batch converter and the S2ORC reader.
+"""
+import glob
+import os
+from typing import Iterable, Iterator
+
+TEI_SUFFIXES = (".xml", ".xml.gz")
+
+
+def iter_input_paths(
+    inputs: Iterable[str], suffixes: tuple[str, ...] = TEI_SUFFIXES
+) -> Iterator[str]:
+    """
+    Expand directories, glob patterns and ``@list`` files into file paths,
+    taking the files in directories that end with one of ``suffixes``
+    """
+    for item in inputs:
+        if item.startswith("@"):
+            with open(item[1:], encoding="utf-8") as fp:
+                for line in fp:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        yield line
+        elif os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.endswith(suffixes):
+                        yield os.path.join(root, filename)
+        elif any(char in item for char in "*?["):
+            yield from sorted(glob.iglob(item, recursive=True))
+        else:
+            yield item
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,183 @@
+"""
+Streaming reader for S2ORC JSONL shards, plain or gzip-compressed.
+
+``read_s2orc`` yields one record per line: a ``Paper`` built with
+``load_s2orc``, the decoded record itself, or only the requested ``fields``.
+When msgspec is installed, a line is first split into its top-level members
+without decoding them. Only the members that are asked for get decoded, and
+the ``pdf_parse``/``grobid_parse`` sub-objects of a record stay raw until
+they are read. Papers are always decoded in full, since ``load_s2orc`` reads
+everything anyway. Without msgspec every line is decoded in full with the
+serializer's ``loads``. Lines can be decoded on a pool of worker processes.
+"""
+import gzip
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+from grobid2json.paths import chunked, iter_input_paths
+from grobid2json.s2orc import load_s2orc
+from grobid2json.serialize import loads
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+S2ORC_SUFFIXES = (".jsonl", ".jsonl.gz", ".json.gz")
+PARSE_KEYS = ("pdf_parse", "grobid_parse")
+DEFAULT_CHUNK_SIZE = 256
+
+if msgspec is not None:
+    _decode_members = msgspec.json.Decoder(dict[str, msgspec.Raw]).decode
+    _decode = msgspec.json.Decoder().decode
+
+
+class LazyObject(Mapping):
+    """
+    A JSON object kept as raw bytes and decoded on first access
+    """
+
+    __slots__ = ("_raw", "_value")
+
+    def __init__(self, raw: "msgspec.Raw"):
+        self._raw = raw
+        self._value = None
+
+    @property
+    def value(self) -> dict:
+        if self._value is None:
+            self._value = _decode(self._raw)
+            self._raw = None
+        return self._value
+
+    def __getitem__(self, key: str):
+        return self.value[key]
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+
+def open_shard(path: str) -> BinaryIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_lines(paths: Iterable[str]) -> Iterator[bytes]:
+    """
+    Non-blank lines of every shard in turn
+    """
+    for path in paths:
+        with open_shard(path) as fp:
+            for line in fp:
+                if not line.isspace():
+                    yield line
+
+
+def _decode_record(line: bytes) -> dict:
+    if msgspec is None:
+        return loads(line)
+    record = {}
+    for key, raw in _decode_members(line).items():
+        if key in PARSE_KEYS and memoryview(raw)[:1] == b"{":
+            record[key] = LazyObject(raw)
+        else:
+            record[key] = _decode(raw)
+    return record
+
+
+def _members(members: dict, path: str) -> Optional[dict]:
+    """
+    Undecoded members of the object at dotted ``path``, cached in ``members``
+    """
+    if path not in members:
+        parent_path, _, name = path.rpartition(".")
+        parent = _members(members, parent_path)
+        raw = parent.get(name) if parent is not None else None
+        try:
+            members[path] = _decode_members(raw) if raw is not None else None
+        except msgspec.ValidationError:
+            # not an object
+            members[path] = None
+    return members[path]
+
+
+def _project(line: bytes, fields: list[str]) -> dict:
+    """
+    The value of every dotted path in ``fields``, ``None`` where missing
+    """
+    projected = {}
+    if msgspec is None:
+        record = loads(line)
+        for field in fields:
+            value = record
+            for name in field.split("."):
+                value = value.get(name) if isinstance(value, dict) else None
+            projected[field] = value
+        return projected
+
+    members = {"": _decode_members(line)}
+    for field in fields:
+        path, _, name = field.rpartition(".")
+        parent = _members(members, path)
+        raw = parent.get(name) if parent is not None else None
+        projected[field] = _decode(raw) if raw is not None else None
+    return projected
+
+
+def decode_line(line: bytes, fields: Optional[list[str]] = None, papers: bool = True):
+    if fields is not None:
+        return _project(line, fields)
+    if papers:
+        # load_s2orc reads every part, so nothing is gained by decoding lazily
+        return load_s2orc(loads(line))
+    return _decode_record(line)
+
+
+def decode_lines(
+    lines: list[bytes], fields: Optional[list[str]] = None, papers: bool = True
+) -> list:
+    """
+    Worker task: decode a chunk of lines into papers, records or projections
+    """
+    return [decode_line(line, fields, papers) for line in lines]
+
+
+def read_s2orc(
+    paths: Union[str, Iterable[str]],
+    fields: Optional[list[str]] = None,
+    papers: bool = True,
+    workers: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator:
+    """
+    Read S2ORC JSONL shards, ``.gz`` ones decompressed on the fly.
+
+    ``paths`` takes files, directories, glob patterns and ``@list`` files.
+    With ``fields``, a list of dotted paths such as ``"metadata.title"`` or
+    ``"pdf_parse.body_text"``, each line yields a dict of just those values.
+    Otherwise it yields a ``Paper``, or with ``papers=False`` the decoded
+    record. ``workers`` > 1 decodes chunks of ``chunk_size`` lines on that
+    many processes, keeping the input order.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    lines = iter_lines(iter_input_paths(paths, S2ORC_SUFFIXES))
+    if workers <= 1:
+        for line in lines:
+            yield decode_line(line, fields, papers)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(lines, chunk_size):
+            pending.append(executor.submit(decode_lines, chunk, fields, papers))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -11,37 +11,36 @@ def replace_refspans(
     start_inds = [rep[0] for rep in spans_to_replace]
     assert len(set(start_inds)) == len(start_inds)
     spans_to_replace.sort(key=lambda x: x[0])
-    for i, entry in enumerate(spans_to_replace):
-        start, end, span, new_string = entry
-        if end <= 0:
+    # Single pass over the sorted spans: a span is dropped when it overlaps
+    # one already replaced, or when the text before it has shrunk to nothing.
+    # Output pieces are collected in a list and joined once.
+    pieces = []
+    copied_until = 0
+    delta = 0
+    min_delta = 0
+    max_end = None
+    max_end_count = 0
+    for start, end, span, new_string in spans_to_replace:
+        if end + min(min_delta, delta) <= 0:
             continue
-        shift_amount = (
-            len(new_string) - len(span) + len(pre_padding) + len(post_padding)
-        )
-        for ind in range(i + 1, len(spans_to_replace)):
-            next_start, next_end, next_span, next_string = spans_to_replace[ind]
-            if next_end <= 0:
+        if max_end is not None:
+            if start < max_end:
                 continue
-            if next_start < end:
-                next_start = 0
-                next_end = 0
-                next_string = ""
-            elif next_start == end:
-                next_start += shift_amount
-                next_end += shift_amount
-                next_string = btwn_padding + pre_padding + next_string + post_padding
-            elif next_start > end:
-                next_start += shift_amount
-                next_end += shift_amount
-                next_string = pre_padding + next_string + post_padding
-            spans_to_replace[ind] = (next_start, next_end, next_span, next_string)
-
-    spans_to_replace = [entry for entry in spans_to_replace if entry[1] > 0]
-    spans_to_replace.sort(key=lambda x: x[0])
-    for start, end, span, new_string in spans_to_replace:
-        assert full_string[start:end] == span
-        full_string = full_string[:start] + new_string + full_string[end:]
-    return full_string
+            new_string = pre_padding + new_string + post_padding
+            if start == max_end:
+                new_string = btwn_padding * max_end_count + new_string
+        pieces.append(full_string[copied_until:start])
+        pieces.append(new_string)
+        copied_until = end
+        min_delta = min(min_delta, delta)
+        delta += len(new_string) - len(span)
+        if max_end is None or end > max_end:
+            max_end = end
+            max_end_count = 1
+        elif end == max_end:
+            max_end_count += 1
+    pieces.append(full_string[copied_until:])
+    return "".join(pieces)
 
 
 def sub_spans_and_update_indices(
@@ -53,21 +52,12 @@ def sub_spans_and_update_indices(
     start_inds = [rep[0] for rep in spans_to_replace]
     assert len(set(start_inds)) == len(start_inds)
     spans_to_replace.sort(key=lambda x: x[0])
-    new_spans = [
-        [start, end, token, surface, 0]
-        for start, end, token, surface in spans_to_replace
-    ]
-    for i, entry in enumerate(spans_to_replace):
-        start, end, token, surface = entry
-        new_end = start + len(surface)
-        offset = new_end - end
-        new_spans[i][1] += offset
-        for new_span_entry in new_spans[i + 1 :]:
-            new_span_entry[4] += offset
+    new_spans = []
+    offset = 0
+    for start, end, token, surface in spans_to_replace:
+        shift = start + len(surface) - end
+        new_spans.append((start + offset, end + offset + shift, token, surface))
+        offset += shift
     new_text = replace_refspans(spans_to_replace, full_string, btwn_padding="")
-    new_spans = [
-        (start + offset, end + offset, token, surface)
-        for start, end, token, surface, offset in new_spans
-    ]
 
     return new_text, new_spans
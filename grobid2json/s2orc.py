@@ -15,8 +15,24 @@ REFERENCE_OUTPUT_KEYS = {
 
 METADATA_KEYS = {"title", "authors", "year", "venue", "identifiers"}
 
+RELEASE_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
 
 class ReferenceEntry:
+    __slots__ = (
+        "ref_id",
+        "text",
+        "type_str",
+        "latex",
+        "mathml",
+        "content",
+        "html",
+        "uris",
+        "num",
+        "parent",
+        "fig_num",
+    )
+
     def __init__(
         self,
         ref_id: str,
@@ -62,6 +78,23 @@ class ReferenceEntry:
 
 
 class BibliographyEntry:
+    __slots__ = (
+        "bib_id",
+        "ref_id",
+        "title",
+        "authors",
+        "year",
+        "venue",
+        "volume",
+        "issue",
+        "pages",
+        "other_ids",
+        "num",
+        "urls",
+        "raw_text",
+        "links",
+    )
+
     def __init__(
         self,
         bib_id: str,
@@ -113,6 +146,8 @@ class BibliographyEntry:
 
 
 class Affiliation:
+    __slots__ = ("laboratory", "institution", "location")
+
     def __init__(self, laboratory: str, institution: str, location: dict):
         self.laboratory = laboratory
         self.institution = institution
@@ -127,6 +162,8 @@ class Affiliation:
 
 
 class Author:
+    __slots__ = ("first", "middle", "last", "suffix", "affiliation", "email")
+
     def __init__(
         self,
         first: str,
@@ -155,6 +192,8 @@ class Author:
 
 
 class Metadata:
+    __slots__ = ("title", "authors", "year", "venue", "identifiers")
+
     def __init__(
         self,
         title: str,
@@ -180,6 +219,8 @@ class Metadata:
 
 
 class Paragraph:
+    __slots__ = ("text", "cite_spans", "ref_spans", "eq_spans", "section")
+
     def __init__(
         self,
         text: str,
@@ -218,7 +259,179 @@ class Paragraph:
         }
 
 
+def make_bib_entries(bib_entries: dict) -> list[BibliographyEntry]:
+    return [
+        BibliographyEntry(
+            bib_id=key,
+            **{
+                CORRECT_KEYS[k] if k in CORRECT_KEYS else k: v
+                for k, v in bib.items()
+                if k not in SKIP_KEYS
+            },
+        )
+        for key, bib in bib_entries.items()
+    ]
+
+
+def make_ref_entries(ref_entries: dict) -> list[ReferenceEntry]:
+    return [
+        ReferenceEntry(
+            ref_id=key,
+            **{
+                CORRECT_KEYS[k] if k in CORRECT_KEYS else k: v
+                for k, v in ref.items()
+                if k != "ref_id"
+            },
+        )
+        for key, ref in ref_entries.items()
+    ]
+
+
+REFERENCE_KEYS = (
+    "latex",
+    "mathml",
+    "content",
+    "html",
+    "uris",
+    "num",
+    "parent",
+    "fig_num",
+)
+
+BIBLIOGRAPHY_KEYS = (
+    "year",
+    "venue",
+    "volume",
+    "issue",
+    "pages",
+    "other_ids",
+    "num",
+    "urls",
+    "raw_text",
+    "links",
+)
+
+
+def ref_entry_json(ref: dict) -> dict:
+    """
+    ``ReferenceEntry.as_json()`` of an extracted ref entry, without the object
+    """
+    ref = {CORRECT_KEYS.get(k, k): v for k, v in ref.items() if k != "ref_id"}
+    if keep_keys := REFERENCE_OUTPUT_KEYS.get(ref["type_str"], None):
+        return {k: ref.get(k) for k in keep_keys}
+    ref_json = {"text": ref["text"], "type": ref["type_str"]}
+    for k in REFERENCE_KEYS:
+        ref_json[k] = ref.get(k)
+    return ref_json
+
+
+def bib_entry_json(bib: dict) -> dict:
+    """
+    ``BibliographyEntry.as_json()`` of an extracted bib entry, without the
+    object
+    """
+    bib = {CORRECT_KEYS.get(k, k): v for k, v in bib.items() if k not in SKIP_KEYS}
+    bib_json = {
+        "ref_id": bib.get("ref_id"),
+        "title": bib["title"],
+        "authors": bib["authors"],
+    }
+    for k in BIBLIOGRAPHY_KEYS:
+        bib_json[k] = bib.get(k)
+    return bib_json
+
+
+def author_json(author: dict) -> dict:
+    affiliation = author.get("affiliation")
+    return {
+        "first": author["first"],
+        "middle": author["middle"],
+        "last": author["last"],
+        "suffix": author["suffix"],
+        "affiliation": (
+            {
+                "laboratory": affiliation["laboratory"],
+                "institution": affiliation["institution"],
+                "location": affiliation["location"],
+            }
+            if affiliation
+            else {}
+        ),
+        "email": author.get("email"),
+    }
+
+
+def metadata_json(metadata: dict) -> dict:
+    return {
+        "title": metadata["title"],
+        "authors": [author_json(author) for author in metadata["authors"]],
+        "year": metadata.get("year"),
+        "venue": metadata.get("venue"),
+        "identifiers": metadata.get("identifiers", {}),
+    }
+
+
+def paragraph_json(para: dict) -> dict:
+    """
+    ``Paragraph.as_json()`` of an extracted paragraph, without the object
+    """
+    section = para.get("section")
+    if isinstance(section, str):
+        sec_num = (para.get("sec_num") or None) if section else None
+    elif section:
+        sec_num = section[-1][0]
+        section = "::".join([sec[1] for sec in section])
+    else:
+        sec_num = None
+        section = ""
+    return {
+        "text": para["text"],
+        "cite_spans": para["cite_spans"],
+        "ref_spans": para["ref_spans"],
+        "eq_spans": para.get("eq_spans", []),
+        "section": section,
+        "sec_num": sec_num,
+    }
+
+
+def paper_json(
+    paper_id: str,
+    pdf_hash: str,
+    metadata: dict,
+    abstract: list[dict],
+    body_text: list[dict],
+    back_matter: list[dict],
+    bib_entries: dict,
+    ref_entries: dict,
+) -> dict:
+    """
+    ``Paper(...).as_json()`` built straight from the extracted dicts, skipping
+    the model objects
+    """
+    return {
+        "paper_id": paper_id,
+        "pdf_hash": pdf_hash,
+        "metadata": metadata_json(metadata),
+        "abstract": [paragraph_json(para) for para in abstract],
+        "body_text": [paragraph_json(para) for para in body_text],
+        "back_matter": [paragraph_json(para) for para in back_matter],
+        "bib_entries": {key: bib_entry_json(bib) for key, bib in bib_entries.items()},
+        "ref_entries": {key: ref_entry_json(ref) for key, ref in ref_entries.items()},
+    }
+
+
 class Paper:
+    __slots__ = (
+        "paper_id",
+        "pdf_hash",
+        "metadata",
+        "abstract",
+        "body_text",
+        "back_matter",
+        "bib_entries",
+        "ref_entries",
+    )
+
     def __init__(
         self,
         paper_id: str,
@@ -236,28 +449,8 @@ class Paper:
         self.abstract = [Paragraph(**para) for para in abstract]
         self.body_text = [Paragraph(**para) for para in body_text]
         self.back_matter = [Paragraph(**para) for para in back_matter]
-        self.bib_entries = [
-            BibliographyEntry(
-                bib_id=key,
-                **{
-                    CORRECT_KEYS[k] if k in CORRECT_KEYS else k: v
-                    for k, v in bib.items()
-                    if k not in SKIP_KEYS
-                },
-            )
-            for key, bib in bib_entries.items()
-        ]
-        self.ref_entries = [
-            ReferenceEntry(
-                ref_id=key,
-                **{
-                    CORRECT_KEYS[k] if k in CORRECT_KEYS else k: v
-                    for k, v in ref.items()
-                    if k != "ref_id"
-                },
-            )
-            for key, ref in ref_entries.items()
-        ]
+        self.bib_entries = make_bib_entries(bib_entries)
+        self.ref_entries = make_ref_entries(ref_entries)
 
     def as_json(self):
         return {
@@ -282,11 +475,7 @@ class Paper:
     def release_json(self, doc_type: str = "pdf"):
         release_dict = {"paper_id": self.paper_id}
         release_dict.update(
-            {
-                "header": {
-                    "date_generated": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-                }
-            }
+            {"header": {"date_generated": datetime.now().strftime(RELEASE_DATE_FORMAT)}}
         )
         release_dict.update(self.metadata.as_json())
         release_dict.update({"abstract": self.raw_abstract_text})
@@ -310,6 +499,16 @@ class Paper:
         return release_dict
 
 
+def _with_links(bib_entries: dict) -> dict:
+    """
+    Add ``links`` to the entries with a ``link``, leaving the input untouched
+    """
+    return {
+        k: {**v, "links": [v["link"]]} if "link" in v else v
+        for k, v in bib_entries.items()
+    }
+
+
 def load_s2orc(paper_dict: dict) -> Paper:
     paper_id = paper_dict["paper_id"]
     pdf_hash = paper_dict.get("_pdf_hash", paper_dict.get("s2_pdf_hash", None))
@@ -321,10 +520,7 @@ def load_s2orc(paper_dict: dict) -> Paper:
         abstract = paper_dict.get("grobid_parse").get("abstract", [])
         body_text = paper_dict.get("grobid_parse").get("body_text", [])
         back_matter = paper_dict.get("grobid_parse").get("back_matter", [])
-        bib_entries = paper_dict.get("grobid_parse").get("bib_entries", {})
-        for k, v in bib_entries.items():
-            if "link" in v:
-                v["links"] = [v["link"]]
+        bib_entries = _with_links(paper_dict.get("grobid_parse").get("bib_entries", {}))
         ref_entries = paper_dict.get("grobid_parse").get("ref_entries", {})
     elif ("pdf_parse" in paper_dict and paper_dict.get("pdf_parse")) or (
         "body_text" in paper_dict and paper_dict.get("body_text")
@@ -342,10 +538,7 @@ def load_s2orc(paper_dict: dict) -> Paper:
         abstract = paper_dict.get("abstract", [])
         body_text = paper_dict.get("body_text", [])
         back_matter = paper_dict.get("back_matter", [])
-        bib_entries = paper_dict.get("bib_entries", {})
-        for k, v in bib_entries.items():
-            if "link" in v:
-                v["links"] = [v["link"]]
+        bib_entries = _with_links(paper_dict.get("bib_entries", {}))
         ref_entries = paper_dict.get("ref_entries", {})
     else:
         print(paper_id)
@@ -0,0 +1,216 @@
+"""
+JSON serialization of conversion output.
+
+``dumps`` and ``loads`` use orjson or msgspec when one is installed and the
+standard library ``json`` otherwise; every backend writes compact UTF-8.
+The ``write_*`` functions write to binary file handles and encode a paper
+one paragraph, bib entry and ref entry at a time, so the JSON of a whole
+paper never exists as a single string. ``write_paper`` also takes a
+``ParagraphStream``, whose paragraphs are then converted while writing.
+"""
+import json
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator
+
+from grobid2json.main import PARTS
+from grobid2json.s2orc import RELEASE_DATE_FORMAT, Paper
+
+ENTRY_KEYS = ("bib_entries", "ref_entries")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+    dumps = orjson.dumps
+    loads = orjson.loads
+elif msgspec is not None:
+    BACKEND = "msgspec"
+
+    def _enc_hook(obj):
+        # bs4 hands out NavigableString, which msgspec does not take as a str
+        if isinstance(obj, str):
+            return str(obj)
+        raise NotImplementedError(f"Objects of type {type(obj)} are not supported")
+
+    dumps = msgspec.json.Encoder(enc_hook=_enc_hook).encode
+    loads = msgspec.json.Decoder().decode
+else:
+    BACKEND = "json"
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    loads = json.loads
+
+    def dumps(obj) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+
+def dumps_str(obj) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class _Array:
+    """
+    A JSON array whose items are encoded one by one while writing
+    """
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Iterable):
+        self.items = items
+
+
+class _Object:
+    """
+    A JSON object whose ``(key, value)`` pairs are encoded one by one
+    """
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Iterable[tuple[str, object]]):
+        self.items = items
+
+
+def _write(fp: BinaryIO, value):
+    if isinstance(value, _Array):
+        fp.write(b"[")
+        for i, item in enumerate(value.items):
+            if i:
+                fp.write(b",")
+            _write(fp, item)
+        fp.write(b"]")
+    elif isinstance(value, _Object):
+        fp.write(b"{")
+        for i, (key, item) in enumerate(value.items):
+            if i:
+                fp.write(b",")
+            fp.write(dumps(key))
+            fp.write(b":")
+            _write(fp, item)
+        fp.write(b"}")
+    else:
+        fp.write(dumps(value))
+
+
+def _paper_parts(paper: Paper) -> list[tuple[str, object]]:
+    return [
+        ("abstract", _Array(para.as_json() for para in paper.abstract)),
+        ("body_text", _Array(para.as_json() for para in paper.body_text)),
+        ("back_matter", _Array(para.as_json() for para in paper.back_matter)),
+        (
+            "bib_entries",
+            _Object((bib.bib_id, bib.as_json()) for bib in paper.bib_entries),
+        ),
+        (
+            "ref_entries",
+            _Object((ref.ref_id, ref.as_json()) for ref in paper.ref_entries),
+        ),
+    ]
+
+
+def _stream_parts(stream) -> list[tuple[str, object]]:
+    """
+    Split the ``(part, paragraph)`` pairs of a stream into one lazy array per
+    part; the stream yields the parts in ``PARTS`` order
+    """
+    paragraphs = iter(stream)
+    pending = [next(paragraphs, None)]
+
+    def take(part: str) -> Iterator[dict]:
+        while pending[0] is not None and pending[0][0] == part:
+            yield pending[0][1]
+            pending[0] = next(paragraphs, None)
+
+    def entries():
+        if pending[0] is not None:
+            raise ValueError(f"Paragraph of part {pending[0][0]!r} out of order")
+        yield from stream.bib_entries.items()
+
+    return [(part, _Array(take(part))) for part in PARTS] + [
+        ("bib_entries", _Object(entries())),
+        ("ref_entries", _Object(stream.ref_entries.items())),
+    ]
+
+
+def _lazy(key: str, value):
+    if key in PARTS:
+        return _Array(value)
+    if key in ENTRY_KEYS:
+        return _Object(value.items())
+    return value
+
+
+def _as_json_value(paper) -> _Object:
+    if isinstance(paper, dict):
+        return _Object((key, _lazy(key, value)) for key, value in paper.items())
+    if isinstance(paper, Paper):
+        metadata = paper.metadata.as_json()
+        parts = _paper_parts(paper)
+    else:
+        metadata = paper.metadata
+        parts = _stream_parts(paper)
+    return _Object(
+        [
+            ("paper_id", paper.paper_id),
+            ("pdf_hash", paper.pdf_hash),
+            ("metadata", metadata),
+        ]
+        + parts
+    )
+
+
+def write_json(fp: BinaryIO, obj):
+    fp.write(dumps(obj))
+
+
+def write_paper(fp: BinaryIO, paper):
+    """
+    Write ``paper.as_json()`` of a ``Paper``, of its ``as_json`` dict or of a
+    ``ParagraphStream`` to ``fp``
+    """
+    _write(fp, _as_json_value(paper))
+
+
+def write_release(fp: BinaryIO, paper: Paper, doc_type: str = "pdf"):
+    """
+    Write ``paper.release_json(doc_type)`` to ``fp``
+    """
+    parse = _paper_parts(paper)
+    value = _Object(
+        [
+            ("paper_id", paper.paper_id),
+            (
+                "header",
+                {"date_generated": datetime.now().strftime(RELEASE_DATE_FORMAT)},
+            ),
+            *paper.metadata.as_json().items(),
+            ("abstract", paper.raw_abstract_text),
+            (
+                f"{doc_type}_parse",
+                _Object(
+                    [("paper_id", paper.paper_id), ("_pdf_hash", paper.pdf_hash)]
+                    + parse
+                ),
+            ),
+        ]
+    )
+    _write(fp, value)
+
+
+def write_jsonl(fp: BinaryIO, papers: Iterable) -> int:
+    """
+    Write each paper with ``write_paper`` on a line of its own; returns the
+    number of lines
+    """
+    count = 0
+    for paper in papers:
+        write_paper(fp, paper)
+        fp.write(b"\n")
+        count += 1
+    return count
@@ -0,0 +1,473 @@
+"""
+HTTP service converting TEI to S2ORC JSON on a warm process pool.
+
+``POST /convert`` takes TEI bytes as the request body and answers with
+``Paper.as_json()``, or ``release_json()`` for ``?format=release``; the
+``paper_id``, ``pdf_hash``, ``engine`` and ``doc_type`` query parameters are
+passed on to the conversion. The worker processes import and exercise the
+engine once at startup. Requests wait in a bounded queue and go to the pool
+in batches, with at most ``concurrency`` batches converting at a time. Once
+the queue is full, requests are answered with 429. ``GET /health`` and
+``GET /metrics`` report readiness and counters.
+
+    python -m grobid2json.server --port 8080 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from grobid2json.batch import default_workers
+from grobid2json.convert import ENGINES, convert_bytes, convert_bytes_to_json
+from grobid2json.httpio import REASONS, BodyTooLarge, format_head, read_body, read_head
+from grobid2json.serialize import dumps, dumps_str
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_BATCH_DELAY = 0.002
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_BODY = 64 * 1024 * 1024
+FORMATS = ("json", "release")
+SHUTTING_DOWN = "the service is shutting down"
+
+WARM_UP_TEI = (
+    b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    b"<title>Warm-up</title></titleStmt></fileDesc></teiHeader>"
+    b"<text><body><div><p>Warm-up</p></div></body></text></TEI>"
+)
+
+
+class ConversionError(Exception):
+    """
+    The TEI of a request could not be converted
+    """
+
+
+def warm_up(engine: str):
+    """
+    Worker initializer: convert a tiny document, so that the first request
+    does not pay for imports and parser setup
+    """
+    convert_bytes_to_json(WARM_UP_TEI, "warm-up", "", engine)
+
+
+def convert_batch(
+    requests: list[tuple[bytes, str, str, str, Optional[str]]]
+) -> list[tuple[Optional[str], Optional[str]]]:
+    """
+    Worker task: convert ``(xml_data, paper_id, pdf_hash, engine, doc_type)``
+    requests into ``(line, error)``; a ``doc_type`` asks for ``release_json``
+    """
+    results = []
+    for xml_data, paper_id, pdf_hash, engine, doc_type in requests:
+        try:
+            if doc_type is None:
+                line = convert_bytes_to_json(xml_data, paper_id, pdf_hash, engine)
+            else:
+                paper = convert_bytes(xml_data, paper_id, pdf_hash, engine)
+                line = dumps_str(paper.release_json(doc_type))
+            results.append((line, None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class ConversionService:
+    """
+    Queue conversions and run them in batches on a pool of ``workers``
+    processes; ``handle`` serves the HTTP API on a stream pair
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        engine: str = "lxml",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_delay: float = DEFAULT_BATCH_DELAY,
+        concurrency: Optional[int] = None,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_body: int = DEFAULT_MAX_BODY,
+    ):
+        if max_queue < 1:
+            raise ValueError(f"max_queue must be at least 1, got {max_queue}")
+        self.workers = workers or default_workers()
+        self.engine = engine
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.concurrency = concurrency or self.workers
+        self.max_queue = max_queue
+        self.max_body = max_body
+        self.ready = False
+        self.counters = {
+            "requests": 0,
+            "converted": 0,
+            "failed": 0,
+            "rejected": 0,
+            "batches": 0,
+            "batched_documents": 0,
+        }
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._started = time.monotonic()
+        self._executor = None
+        self._queue = None
+        self._slots = None
+        self._dispatcher = None
+        self._batches = set()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            self.workers, initializer=warm_up, initargs=(self.engine,)
+        )
+
+    async def start(self):
+        """
+        Start every worker process and wait until they are warm
+        """
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._executor = self._new_executor()
+        # as many tasks as workers at once, so that the pool starts them all
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, os.getpid)
+                for _ in range(self.workers)
+            )
+        )
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self.ready = True
+
+    async def convert(
+        self,
+        xml_data: bytes,
+        paper_id: str = "",
+        pdf_hash: str = "",
+        engine: Optional[str] = None,
+        doc_type: Optional[str] = None,
+    ) -> str:
+        """
+        The JSON of ``xml_data``; raises ``asyncio.QueueFull`` when too many
+        requests are waiting already
+        """
+        future = asyncio.get_running_loop().create_future()
+        request = (xml_data, paper_id, pdf_hash, engine or self.engine, doc_type)
+        self._queue.put_nowait((request, future))
+        return await future
+
+    async def _dispatch(self):
+        batch = []
+        try:
+            while True:
+                # requests pile up in the queue while every slot is taken, so
+                # the busier the pool, the larger the batches
+                await self._slots.acquire()
+                batch = [await self._queue.get()]
+                if self.batch_delay and self._queue.qsize() < self.batch_size - 1:
+                    await asyncio.sleep(self.batch_delay)
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                task = asyncio.create_task(self._run(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # requests taken off the queue but not sent yet
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError(SHUTTING_DOWN))
+            raise
+
+    def _replace_executor(self, executor: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """
+        Swap a broken pool for a fresh one, unless another batch did already
+        """
+        if executor is self._executor:
+            self._executor = self._new_executor()
+            executor.shutdown(wait=False)
+        return self._executor
+
+    async def _run(self, batch: list[tuple[tuple, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        requests = [request for request, _ in batch]
+        executor = self._executor
+        try:
+            try:
+                pending = loop.run_in_executor(executor, convert_batch, requests)
+            except BrokenProcessPool:
+                # a worker died while the pool was idle and none of this
+                # batch ran; send it to a fresh pool once
+                executor = self._replace_executor(executor)
+                pending = loop.run_in_executor(executor, convert_batch, requests)
+            results = await pending
+        except BrokenProcessPool as e:
+            # a worker died converting this batch; fail it and carry on with
+            # a fresh pool
+            self._replace_executor(executor)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        self.counters["batches"] += 1
+        self.counters["batched_documents"] += len(batch)
+        for (_, future), (line, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(line)
+            else:
+                future.set_exception(ConversionError(error))
+
+    def metrics(self) -> dict:
+        batches = self.counters["batches"]
+        answered = self.counters["converted"] + self.counters["failed"]
+        return {
+            **self.counters,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches_in_flight": len(self._batches),
+            "mean_batch_size": (
+                self.counters["batched_documents"] / batches if batches else 0.0
+            ),
+            "mean_latency_ms": 1000 * self.latency_total / answered
+            if answered
+            else 0.0,
+            "max_latency_ms": 1000 * self.latency_max,
+            "uptime": time.monotonic() - self._started,
+            "workers": self.workers,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "engine": self.engine,
+        }
+
+    async def _convert_request(
+        self, query: dict[str, str], body: bytes
+    ) -> tuple[int, bytes, dict[str, str]]:
+        output_format = query.get("format", "json")
+        engine = query.get("engine", self.engine)
+        if output_format not in FORMATS:
+            return 400, dumps({"error": f"format must be one of {FORMATS}"}), {}
+        if engine not in ENGINES:
+            return 400, dumps({"error": f"engine must be one of {ENGINES}"}), {}
+        doc_type = query.get("doc_type", "pdf") if output_format == "release" else None
+        self.counters["requests"] += 1
+        start = time.perf_counter()
+        try:
+            line = await self.convert(
+                body,
+                query.get("paper_id", ""),
+                query.get("pdf_hash", ""),
+                engine,
+                doc_type,
+            )
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return 429, dumps({"error": "queue full"}), {"Retry-After": "1"}
+        except ConversionError as e:
+            status, payload = 422, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        else:
+            status, payload = 200, None
+        elapsed = time.perf_counter() - start
+        self.latency_total += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+        if status != 200:
+            self.counters["failed"] += 1
+            return status, dumps(payload), {}
+        self.counters["converted"] += 1
+        return 200, line.encode("utf-8"), {}
+
+    async def _route(
+        self, method: str, target: str, body: bytes
+    ) -> tuple[int, bytes, dict[str, str]]:
+        url = urlsplit(target)
+        if url.path == "/convert":
+            if method != "POST":
+                return 405, dumps({"error": "use POST"}), {"Allow": "POST"}
+            return await self._convert_request(dict(parse_qsl(url.query)), body)
+        if url.path in ("/health", "/metrics") and method != "GET":
+            return 405, dumps({"error": "use GET"}), {"Allow": "GET"}
+        if url.path == "/health":
+            if not self.ready:
+                return 503, dumps({"status": "unavailable"}), {}
+            return 200, dumps({"status": "ok", "workers": self.workers}), {}
+        if url.path == "/metrics":
+            return 200, dumps(self.metrics()), {}
+        return 404, dumps({"error": f"no such endpoint: {url.path}"}), {}
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        extra: dict[str, str],
+        keep_alive: bool,
+    ):
+        head = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **extra,
+        }
+        writer.write(format_head(f"HTTP/1.1 {status} {REASONS[status]}", head))
+        writer.write(body)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serve the requests of one keep-alive connection
+        """
+        try:
+            while True:
+                try:
+                    (method, target, version), headers = await read_head(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    return
+                except asyncio.LimitOverrunError:
+                    error = dumps({"error": "header line too long"})
+                    await self._respond(writer, 400, error, {}, False)
+                    return
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+                try:
+                    body = (
+                        await read_body(reader, headers, self.max_body)
+                        if chunked or "content-length" in headers
+                        else b""
+                    )
+                except BodyTooLarge:
+                    status, body, extra = 413, dumps({"error": "body too large"}), {}
+                    # the rest of the body is still unread
+                    keep_alive = False
+                except (ValueError, asyncio.LimitOverrunError):
+                    error = "malformed Content-Length or chunk size"
+                    status, body, extra = 400, dumps({"error": error}), {}
+                    keep_alive = False
+                else:
+                    status, body, extra = await self._route(method, target, body)
+                await self._respond(writer, status, body, extra, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        self.ready = False
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.set_exception(RuntimeError(SHUTTING_DOWN))
+        if self._batches:
+            await asyncio.wait(set(self._batches))
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **options):
+    """
+    Run a ``ConversionService`` until SIGINT or SIGTERM; ``options`` are its
+    arguments
+    """
+    loop = asyncio.get_running_loop()
+    service = ConversionService(**options)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            pass
+    host, port = server.sockets[0].getsockname()[:2]
+    print(
+        f"Serving on http://{host}:{port} with {service.workers} workers",
+        file=sys.stderr,
+    )
+    async with server:
+        await stop.wait()
+    await service.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m grobid2json.server",
+        description="Serve TEI to S2ORC JSON conversion over HTTP",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="0 picks a free port"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="conversion processes (default: number of CPUs)",
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="lxml")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="most documents sent to a worker at once",
+    )
+    parser.add_argument(
+        "--batch-delay",
+        type=float,
+        default=DEFAULT_BATCH_DELAY,
+        help="seconds to wait for more documents before sending a batch",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="batches converting at once (default: workers)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=DEFAULT_MAX_QUEUE,
+        help="documents waiting before requests are answered with 429",
+    )
+    parser.add_argument(
+        "--max-body",
+        type=int,
+        default=DEFAULT_MAX_BODY // (1024 * 1024),
+        help="request size limit in MiB",
+    )
+    args = parser.parse_args(argv)
+    if args.max_queue < 1:
+        parser.error("--max-queue must be at least 1")
+    asyncio.run(
+        serve(
+            args.host,
+            args.port,
+            workers=args.workers,
+            engine=args.engine,
+            batch_size=args.batch_size,
+            batch_delay=args.batch_delay,
+            concurrency=args.concurrency,
+            max_queue=args.max_queue,
+            max_body=args.max_body * 1024 * 1024,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Optional per-stage instrumentation of the conversion pipeline.
+
+Pass a ``ConversionStats`` to ``convert_xml_to_json`` (or ``convert_bytes``)
+to record the wall time of every stage and the size of what it produced.
+Without one the pipeline uses ``NULL_STATS``, whose methods do nothing.
+"""
+import heapq
+import time
+from typing import Callable, Optional
+
+STAGES = (
+    "parse",
+    "front_matter",
+    "metadata",
+    "bibliography",
+    "figures",
+    "bracket_style",
+    "notes",
+    "abstract",
+    "body",
+    "back_matter",
+    "paper",
+)
+
+
+class NullStats:
+    """
+    Stand-in used when no stats are collected
+    """
+
+    enabled = False
+    stage = None
+
+    def start(self, stage: str):
+        pass
+
+    def stop(self):
+        pass
+
+    def record_output(self, *args):
+        pass
+
+
+NULL_STATS = NullStats()
+
+
+class ConversionStats:
+    """
+    Wall time per stage and output counts for one document.
+
+    ``on_stage`` is called with the name of every stage as it starts, and
+    with ``None`` once the conversion is done.
+    """
+
+    enabled = True
+
+    def __init__(
+        self,
+        paper_id: Optional[str] = None,
+        on_stage: Optional[Callable[[Optional[str]], None]] = None,
+    ):
+        self.paper_id = paper_id
+        self.on_stage = on_stage
+        self.timings = {}
+        self.counts = {}
+        self.stage = None
+        self._started = 0.0
+
+    def start(self, stage: str):
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.timings[self.stage] = (
+                self.timings.get(self.stage, 0.0) + now - self._started
+            )
+        self.stage = stage
+        self._started = now
+        if self.on_stage is not None:
+            self.on_stage(stage)
+
+    def stop(self):
+        if self.stage is not None:
+            self.timings[self.stage] = (
+                self.timings.get(self.stage, 0.0) + time.perf_counter() - self._started
+            )
+            self.stage = None
+        if self.on_stage is not None:
+            self.on_stage(None)
+
+    def record_output(
+        self,
+        abstract: list[dict],
+        body_text: list[dict],
+        back_matter: list[dict],
+        bib_entries: dict,
+        ref_entries: dict,
+    ):
+        paragraphs = abstract + body_text + back_matter
+        self.counts.update(
+            {
+                "paragraphs": len(paragraphs),
+                "cite_spans": sum(len(para["cite_spans"]) for para in paragraphs),
+                "ref_spans": sum(len(para["ref_spans"]) for para in paragraphs),
+                "eq_spans": sum(len(para["eq_spans"]) for para in paragraphs),
+                "bib_entries": len(bib_entries),
+                "ref_entries": len(ref_entries),
+            }
+        )
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    def as_json(self) -> dict:
+        return {
+            "paper_id": self.paper_id,
+            "timings": self.timings,
+            "counts": self.counts,
+        }
+
+
+class StatsReport:
+    """
+    Aggregate ``ConversionStats.as_json()`` records over a batch run
+    """
+
+    def __init__(self, slowest: int = 10):
+        self.documents = 0
+        self.timings = {}
+        self.max_timings = {}
+        self.counts = {}
+        self.slowest = slowest
+        self._slowest = []
+
+    def add(self, stats: dict):
+        self.documents += 1
+        total = 0.0
+        for stage, seconds in stats["timings"].items():
+            total += seconds
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+            self.max_timings[stage] = max(self.max_timings.get(stage, 0.0), seconds)
+        for name, value in stats["counts"].items():
+            self.counts[name] = self.counts.get(name, 0) + value
+        entry = (total, self.documents, stats["paper_id"], stats["timings"])
+        if len(self._slowest) < self.slowest:
+            heapq.heappush(self._slowest, entry)
+        elif self.slowest:
+            heapq.heappushpop(self._slowest, entry)
+
+    def as_json(self) -> dict:
+        stages = sorted(self.timings, key=_stage_order)
+        return {
+            "documents": self.documents,
+            "stages": {
+                stage: {
+                    "total": self.timings[stage],
+                    "mean": self.timings[stage] / self.documents,
+                    "max": self.max_timings[stage],
+                }
+                for stage in stages
+            },
+            "counts": self.counts,
+            "slowest": [
+                {"paper_id": paper_id, "total": total, "timings": timings}
+                for total, _, paper_id, timings in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+    def format(self) -> str:
+        grand_total = sum(self.timings.values()) or 1.0
+        lines = [
+            f"{'stage':<14} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'share':>6}"
+        ]
+        for stage in sorted(self.timings, key=_stage_order):
+            seconds = self.timings[stage]
+            lines.append(
+                f"{stage:<14} {seconds:>9.2f} "
+                f"{seconds / self.documents * 1000:>9.2f} "
+                f"{self.max_timings[stage] * 1000:>9.2f} "
+                f"{seconds / grand_total:>6.1%}"
+            )
+        if self.counts:
+            lines.append(
+                ", ".join(f"{name} {value}" for name, value in self.counts.items())
+            )
+        return "\n".join(lines)
+
+
+def _stage_order(stage: str):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
@@ -67,12 +67,11 @@ setup(
     project_urls={"Documentation": "https://sitoi.github.io/grobid2json/"},
     packages=find_packages(exclude=("config",)),
     install_requires=REQUIRED,
+    extras_require={"orjson": ["orjson"], "msgspec": ["msgspec"]},
     include_package_data=True,
     license="MIT",
     zip_safe=False,
-    entry_points={
-        "console_scripts": ["grobid2json = grobid2json.main:convert_xml_to_json"]
-    },
+    entry_points={"console_scripts": ["grobid2json = grobid2json.batch:main"]},
     classifiers=[
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3.9",
@@ -0,0 +1,98 @@
+import gzip
+import io
+import tarfile
+import threading
+import time
+import zipfile
+
+import pytest
+
+from grobid2json.archive import Member, iter_inputs, read_ahead
+from grobid2json.batch import run_batch
+from grobid2json.reader import read_s2orc
+
+TEI = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    "<title>Paper {n}</title></titleStmt></fileDesc></teiHeader><text><body>"
+    "<div><head>Intro</head><p>Body of paper {n}.</p></div></body></text></TEI>"
+)
+
+
+def tei(n) -> bytes:
+    return TEI.format(n=n).encode("utf-8")
+
+
+# member name -> bytes as stored; only the first two are TEI members
+MEMBERS = {
+    "docs/a.tei.xml": tei("a"),
+    "docs/b.tei.xml.gz": gzip.compress(tei("b")),
+    "docs/._a.tei.xml": b"\x00\x05\x16\x07",
+    "docs/readme.txt": b"not TEI",
+}
+
+
+def make_tar(path, mode="w:gz"):
+    with tarfile.open(path, mode) as archive:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def make_zip(path):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("docs/", b"")
+        for name, data in MEMBERS.items():
+            archive.writestr(name, data)
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tgz", ".zip"])
+def test_archive_members(tmp_path, suffix):
+    path = str(tmp_path / f"batch{suffix}")
+    if suffix == ".zip":
+        make_zip(path)
+    else:
+        make_tar(path, "w" if suffix == ".tar" else "w:gz")
+    assert list(iter_inputs([path])) == [
+        Member(f"{path}/docs/a.tei.xml", tei("a")),
+        Member(f"{path}/docs/b.tei.xml.gz", tei("b")),
+    ]
+
+
+def test_batch_mixes_files_and_archives(tmp_path):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    make_tar(str(input_dir / "batch.tgz"))
+    (input_dir / "c.tei.xml.gz").write_bytes(gzip.compress(tei("c")))
+    result = run_batch(
+        [str(input_dir)], str(tmp_path / "out"), workers=1, progress=False
+    )
+    assert result["converted"] == 3 and result["failed"] == 0
+    titles = {
+        paper.paper_id: paper.metadata.title for paper in read_s2orc(result["shards"])
+    }
+    assert titles == {"a": "Paper a", "b": "Paper b", "c": "Paper c"}
+
+
+def test_read_ahead_stays_bounded_and_reraises():
+    produced = []
+    release = threading.Event()
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+        release.wait(5)
+        raise ValueError("bad archive")
+
+    reader = read_ahead(items(), 2)
+    assert next(reader) == 0
+    time.sleep(0.1)
+    # the producer is at most the queue size ahead, plus the item it holds
+    assert len(produced) <= 4
+    release.set()
+    consumed = []
+    with pytest.raises(ValueError, match="bad archive"):
+        for item in reader:
+            consumed.append(item)
+    assert consumed == list(range(1, 10))
@@ -0,0 +1,71 @@
+from grobid2json import cache as cache_module
+from grobid2json.cache import ConversionCache, cache_key
+from grobid2json.convert import convert_bytes_to_json
+
+TEI = (
+    b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    b"<title>T</title></titleStmt></fileDesc></teiHeader><text><body><div>"
+    b"<head>Intro</head><p>Body.</p></div></body></text></TEI>"
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_hit_and_miss(tmp_path):
+    with ConversionCache(str(tmp_path / "cache.sqlite")) as cache:
+        line = convert_bytes_to_json(TEI, "p", engine="lxml", cache=cache)
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert convert_bytes_to_json(TEI, "p", engine="lxml", cache=cache) == line
+        assert (cache.hits, cache.misses) == (1, 1)
+        # another engine or paper_id is another entry
+        convert_bytes_to_json(TEI, "p", engine="bs4", cache=cache)
+        convert_bytes_to_json(TEI, "q", engine="lxml", cache=cache)
+        assert (cache.hits, cache.misses) == (1, 3)
+        assert len(cache) == 3
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    with ConversionCache(str(tmp_path / "cache.sqlite"), max_bytes=250) as cache:
+        for name in "abc":
+            cache.put(name, name * 100)
+            clock.now += 1
+        # a was evicted to fit c
+        assert cache.get("a") is None
+        assert cache.total_bytes == 200
+
+        clock.now += cache_module.TOUCH_INTERVAL + 1
+        assert cache.get("b") == "b" * 100
+        cache.put("a", "a" * 100)
+        # b was read since c was written, so c goes
+        assert cache.get("c") is None
+        assert (cache.get("a"), cache.get("b")) == ("a" * 100, "b" * 100)
+        assert len(cache) == 2
+
+
+def test_recent_hit_does_not_write(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    with ConversionCache(str(tmp_path / "cache.sqlite")) as cache:
+        cache.put("a", "value")
+        changes = cache._conn.total_changes
+        clock.now += cache_module.TOUCH_INTERVAL / 2
+        assert cache.get("a") == "value"
+        assert cache._conn.total_changes == changes
+        clock.now += cache_module.TOUCH_INTERVAL
+        assert cache.get("a") == "value"
+        assert cache._conn.total_changes == changes + 1
+
+
+def test_key_covers_engine_and_version(monkeypatch):
+    key = cache_key(TEI, paper_id="p", pdf_hash="", engine="bs4")
+    assert key != cache_key(TEI, paper_id="p", pdf_hash="", engine="lxml")
+    monkeypatch.setattr(cache_module, "__version__", "0.0.0")
+    assert key != cache_key(TEI, paper_id="p", pdf_hash="", engine="bs4")
@@ -0,0 +1,197 @@
+import asyncio
+import re
+import socket
+
+import pytest
+
+from grobid2json.client import GrobidClient, GrobidError, convert_pdfs
+from grobid2json.convert import convert_bytes_to_json
+
+TEI = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    "<title>Paper {n}</title></titleStmt></fileDesc></teiHeader><text><body>"
+    "<div><head>Intro</head><p>Body of paper {n}.</p></div></body></text></TEI>"
+)
+
+
+def canned_tei(paper_id: str) -> bytes:
+    return TEI.format(n=paper_id).encode("utf-8")
+
+
+class StubGrobid:
+    """
+    A GROBID stand-in answering ``processFulltextDocument`` with canned TEI;
+    every ``busy_every``-th request gets a 503 with ``Retry-After: retry_after``
+    """
+
+    def __init__(
+        self,
+        busy_every=0,
+        chunked=False,
+        close=False,
+        status=None,
+        port=0,
+        delay=0.0,
+        retry_after="0",
+    ):
+        self.busy_every = busy_every
+        self.chunked = chunked
+        self.close = close
+        self.status = status
+        self.port = port
+        self.delay = delay
+        self.retry_after = retry_after
+        self.requests = 0
+        self.connections = 0
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", self.port)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers["content-length"]))
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(self.respond(body))
+                await writer.drain()
+                if self.close:
+                    break
+        finally:
+            writer.close()
+
+    def respond(self, body: bytes) -> bytes:
+        if self.status is not None:
+            return b"HTTP/1.1 %d Error\r\nContent-Length: 4\r\n\r\nbusy" % self.status
+        if self.busy_every and self.requests % self.busy_every == 0:
+            return (
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Retry-After: %s\r\nContent-Length: 0\r\n\r\n"
+                % self.retry_after.encode()
+            )
+        assert b'name="input"' in body and b"%PDF" in body
+        paper_id = re.search(rb'filename="([^"]+)\.pdf"', body).group(1).decode()
+        tei = canned_tei(paper_id)
+        if not self.chunked:
+            return b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(tei) + tei
+        chunks = b"".join(
+            b"%x\r\n" % len(tei[i : i + 100]) + tei[i : i + 100] + b"\r\n"
+            for i in range(0, len(tei), 100)
+        )
+        return (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + chunks
+            + b"0\r\n\r\n"
+        )
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_convert_pdfs_against_stub(chunked):
+    async def run():
+        async with StubGrobid(busy_every=3, chunked=chunked) as stub:
+            async with GrobidClient(stub.url, concurrency=4) as client:
+                pdfs = [(f"p{i:03d}", b"%PDF-1.4 stub") for i in range(30)]
+                results = [result async for result in convert_pdfs(client, pdfs)]
+        return stub, results
+
+    stub, results = asyncio.run(run())
+    assert sorted(paper_id for paper_id, _, _ in results) == [
+        f"p{i:03d}" for i in range(30)
+    ]
+    for paper_id, line, error in results:
+        assert error is None
+        assert line == convert_bytes_to_json(canned_tei(paper_id), paper_id, "", "lxml")
+    # every third request was answered 503 and retried
+    assert stub.requests > 30
+    # requests share keep-alive connections
+    assert stub.connections <= 4
+
+
+def test_gives_up_after_retries():
+    async def run():
+        async with StubGrobid(status=503) as stub:
+            async with GrobidClient(stub.url, 2, max_retries=2, backoff=0.01) as c:
+                with pytest.raises(GrobidError) as error:
+                    await c.process_fulltext(b"%PDF")
+                results = [r async for r in convert_pdfs(c, [("a", b"%PDF")])]
+        return stub, error.value, results
+
+    stub, error, results = asyncio.run(run())
+    assert error.status == 503
+    assert results[0][1] is None and "GrobidError" in results[0][2]
+    assert stub.requests == 6
+
+
+def test_reconnects_when_server_closes_connection():
+    async def run():
+        async with StubGrobid(close=True) as stub:
+            async with GrobidClient(stub.url, 1, max_retries=0) as client:
+                tei = []
+                for i in range(3):
+                    tei.append(await client.process_fulltext(b"%PDF", f"p{i}.pdf"))
+                    await asyncio.sleep(0.05)
+        return stub, tei
+
+    stub, tei = asyncio.run(run())
+    assert tei == [canned_tei(f"p{i}") for i in range(3)]
+    assert stub.connections == 3
+
+
+def test_client_built_outside_the_loop():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # on Python 3.9 a semaphore made here would be bound to another loop
+    client = GrobidClient(f"http://127.0.0.1:{port}", 2, max_retries=0)
+
+    async def run():
+        async with StubGrobid(port=port):
+            async with client:
+                return await client.process_fulltext(b"%PDF", "p0.pdf")
+
+    assert asyncio.run(run()) == canned_tei("p0")
+
+
+def test_timeout_does_not_count_the_wait_for_a_slot():
+    async def run():
+        async with StubGrobid(delay=0.2) as stub:
+            # the second request waits 0.2s for the slot, then takes 0.2s
+            async with GrobidClient(stub.url, 1, timeout=0.3, max_retries=0) as c:
+                return await asyncio.gather(
+                    c.process_fulltext(b"%PDF", "p0.pdf"),
+                    c.process_fulltext(b"%PDF", "p1.pdf"),
+                )
+
+    assert asyncio.run(run()) == [canned_tei("p0"), canned_tei("p1")]
+
+
+def test_retry_after_is_capped_by_max_backoff():
+    async def run():
+        async with StubGrobid(busy_every=1, retry_after="86400") as stub:
+            async with GrobidClient(
+                stub.url, 1, max_retries=1, max_backoff=0.05
+            ) as client:
+                with pytest.raises(GrobidError):
+                    await asyncio.wait_for(
+                        client.process_fulltext(b"%PDF", "p0.pdf"), 5
+                    )
+        return stub
+
+    assert asyncio.run(run()).requests == 2
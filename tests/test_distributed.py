@@ -0,0 +1,119 @@
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from grobid2json.distributed import Lease, merge
+
+TEI = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    "<title>Paper {n}</title></titleStmt></fileDesc></teiHeader><text><body>"
+    "<div><head>Intro</head><p>Body of paper {n}.</p></div></body></text></TEI>"
+)
+DOCS = 200
+NODES = 4
+LEASE_TTL = 2.0
+
+
+def start_node(input_dir: str, output_dir: str, node_id: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "grobid2json.batch",
+            input_dir,
+            "-o",
+            output_dir,
+            "--distributed",
+            "--node-id",
+            node_id,
+            "--partition-size",
+            "10",
+            "--lease-ttl",
+            str(LEASE_TTL),
+            "--workers",
+            "1",
+            "--engine",
+            "lxml",
+            "--quiet",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        # the node and its pool workers are killed together
+        start_new_session=True,
+    )
+
+
+def leased_by(output_dir: str, node_id: str) -> bool:
+    for path in glob.glob(os.path.join(output_dir, "queue", "leases", "*.lease")):
+        try:
+            with open(path, encoding="utf-8") as fp:
+                if json.load(fp)["owner"] == node_id:
+                    return True
+        except (OSError, ValueError):
+            continue
+    return False
+
+
+def test_killed_node_is_taken_over(tmp_path):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    for i in range(DOCS):
+        (input_dir / f"d{i:04d}.tei.xml").write_text(TEI.format(n=i))
+    output_dir = str(tmp_path / "out")
+
+    victim = start_node(str(input_dir), output_dir, "n0")
+    deadline = time.monotonic() + 60
+    while not leased_by(output_dir, "n0"):
+        assert time.monotonic() < deadline, "n0 never leased a partition"
+        time.sleep(0.01)
+    nodes = [start_node(str(input_dir), output_dir, f"n{i}") for i in range(1, NODES)]
+    # n0 dies holding its lease, in the middle of its first partition
+    os.killpg(victim.pid, signal.SIGKILL)
+    victim.wait()
+    for node in nodes:
+        assert node.wait(timeout=120) == 0
+
+    done = glob.glob(os.path.join(output_dir, "queue", "done", "*.json"))
+    assert len(done) == DOCS // 10
+    for path in done:
+        with open(path, encoding="utf-8") as fp:
+            assert json.load(fp)["node"] != "n0"
+
+    result = merge(output_dir)
+    assert result["converted"] == DOCS and result["failed"] == 0
+    # the partition n0 held was converted again by another node, and only
+    # one copy of every partition made it into the merged output
+    paper_ids = []
+    for shard in result["shards"]:
+        with open(shard, encoding="utf-8") as fp:
+            paper_ids += [json.loads(line)["paper_id"] for line in fp]
+    assert sorted(paper_ids) == [f"d{i:04d}" for i in range(DOCS)]
+    assert not glob.glob(os.path.join(output_dir, "queue", "leases", "*"))
+
+
+def test_renew_survives_lease_briefly_missing(tmp_path):
+    path = str(tmp_path / "00000.lease")
+    lease = Lease.acquire(path, "n0", LEASE_TTL)
+    # what another node's Lease.acquire does to check an expired-looking lease
+    os.rename(path, f"{path}.expired")
+    threading.Timer(0.1, os.rename, (f"{path}.expired", path)).start()
+    assert lease.renew()
+    assert not lease.lost
+
+
+def test_renew_fails_once_lease_is_gone_or_taken(tmp_path):
+    path = str(tmp_path / "00000.lease")
+    lease = Lease.acquire(path, "n0", LEASE_TTL)
+    os.remove(path)
+    assert not lease.renew()
+    assert lease.lost
+
+    lease = Lease.acquire(path, "n0", LEASE_TTL)
+    os.remove(path)
+    assert Lease.acquire(path, "n1", LEASE_TTL) is not None
+    assert not lease.renew()
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from grobid2json.convert import ENGINES, convert_bytes_to_json
+
+TEI = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    "<title>T</title></titleStmt></fileDesc></teiHeader><text><body><div>"
+    '<head>Intro</head><p>See <ref type="figure" target="#fig_0">Fig 1</ref>.</p>'
+    "</div>{figures}</body></text></TEI>"
+)
+
+CASES = {
+    # bs4 drops the inner figure along with the outer one
+    "nested_figure": (
+        '<figure xml:id="fig_0"><head>Outer</head><label>1</label>'
+        "<figDesc>outer</figDesc>"
+        '<figure xml:id="fig_1"><head>Inner</head><label>2</label>'
+        "<figDesc>inner</figDesc></figure></figure>",
+        {"FIGREF0": ("1", "outer")},
+    ),
+    "figure_without_label": (
+        '<figure xml:id="fig_0"><head>Outer</head><figDesc>no label</figDesc>'
+        "</figure>",
+        {"FIGREF0": (None, "no label")},
+    ),
+}
+
+
+@pytest.mark.parametrize("case", sorted(CASES))
+@pytest.mark.parametrize("engine", ENGINES)
+def test_figures_match_bs4(case, engine):
+    figures, expected = CASES[case]
+    xml_data = TEI.format(figures=figures).encode("utf-8")
+    paper = json.loads(convert_bytes_to_json(xml_data, "test", engine=engine))
+    reference = json.loads(convert_bytes_to_json(xml_data, "test", engine="bs4"))
+    assert paper == reference
+    assert {
+        ref_id: (entry["fig_num"], entry["text"])
+        for ref_id, entry in paper["ref_entries"].items()
+    } == expected
@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from grobid2json.guard import DeadLetter, GuardedPool, rss
+
+HOG_BYTES = 256 << 20
+
+
+def convert(items, suffix="", on_stage=None):
+    results = []
+    for item in items:
+        on_stage("parse")
+        if item == "hang":
+            time.sleep(60)
+        elif item == "hog":
+            on_stage("body")
+            data = b"x" * HOG_BYTES
+            time.sleep(60)
+            del data
+        elif item == "crash":
+            os._exit(1)
+        results.append(item.upper() + suffix)
+    return results
+
+
+def test_timeout_dead_letters_the_item_and_goes_on():
+    with GuardedPool(1, timeout=0.5) as pool:
+        results = pool.submit(convert, ["a", "hang", "b"], "!").result(timeout=30)
+        later = pool.submit(convert, ["c"]).result(timeout=30)
+    assert results[0] == "A!" and results[2] == "B!"
+    dead = results[1]
+    assert isinstance(dead, DeadLetter)
+    assert (dead.input, dead.reason, dead.stage) == ("hang", "timeout", "parse")
+    assert dead.elapsed >= 0.5
+    assert later == ["C"]
+    assert pool.dead_letters == [dead]
+
+
+def test_crashed_worker_is_replaced():
+    with GuardedPool(2) as pool:
+        futures = [
+            pool.submit(convert, ["a", "crash", "b"]),
+            pool.submit(convert, ["c", "d"]),
+        ]
+        first, second = [future.result(timeout=30) for future in futures]
+    assert first[0] == "A" and first[2] == "B"
+    assert first[1].reason == "crashed"
+    assert second == ["C", "D"]
+
+
+@pytest.mark.skipif(rss(os.getpid()) is None, reason="needs /proc")
+def test_memory_limit_dead_letters_the_item():
+    max_rss = HOG_BYTES // 2
+    with GuardedPool(1, max_rss=max_rss) as pool:
+        results = pool.submit(convert, ["a", "hog", "b"]).result(timeout=30)
+    assert results[0] == "A" and results[2] == "B"
+    dead = results[1]
+    assert (dead.input, dead.reason, dead.stage) == ("hog", "memory", "body")
+    assert dead.rss > max_rss
+    assert "memory" in dead.error and "in stage body" in dead.error
+
+
+def test_workers_are_not_forked_from_the_monitor_thread():
+    with GuardedPool(1) as pool:
+        assert pool._context.get_start_method() != "fork"
+    spawn = multiprocessing.get_context("spawn")
+    with GuardedPool(1, timeout=0.5, mp_context=spawn) as pool:
+        results = pool.submit(convert, ["a", "hang", "b"]).result(timeout=30)
+    assert results[0] == "A" and results[1].reason == "timeout"
+    assert results[2] == "B"
@@ -0,0 +1,44 @@
+import json
+import os
+import shutil
+
+from grobid2json.batch import ShardWriter
+from grobid2json.index import ShardIndex, ShardIndexWriter, index_path
+
+
+def record(paper_id: str, title: str) -> str:
+    return json.dumps(
+        {"paper_id": paper_id, "metadata": {"title": title}}, ensure_ascii=False
+    )
+
+
+def write_shards(output_dir: str) -> str:
+    os.makedirs(output_dir)
+    path = index_path(output_dir)
+    with ShardWriter(output_dir, shard_size=2, index=ShardIndexWriter(path)) as w:
+        w.write(record("a", "First"), "a")
+        w.write(record("b", "Ünïcode"), "b")
+        w.write(record("c", "Third"), "c")
+        # a paper_id written twice points at its last record
+        w.write(record("a", "First, again"), "a")
+    return path
+
+
+def test_index_finds_every_record(tmp_path):
+    path = write_shards(str(tmp_path / "out"))
+    with ShardIndex(path) as index:
+        assert len(index) == 3
+        assert "c" in index and "z" not in index
+        assert index.get_record("b")["metadata"]["title"] == "Ünïcode"
+        assert index.get_record("a")["metadata"]["title"] == "First, again"
+        shard, offset, length = index.locate("c")
+        assert shard.endswith("part-00001.jsonl") and offset == 0
+        assert index.get_line("c") == record("c", "Third").encode("utf-8")
+        assert index.get_record("z") is None and index.get_paper("z") is None
+
+
+def test_index_moves_with_its_shards(tmp_path):
+    write_shards(str(tmp_path / "out"))
+    shutil.move(str(tmp_path / "out"), str(tmp_path / "moved"))
+    with ShardIndex(index_path(str(tmp_path / "moved"))) as index:
+        assert index.get_record("c")["metadata"]["title"] == "Third"
@@ -0,0 +1,119 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from grobid2json.batch import run_batch
+from grobid2json.index import ShardIndex
+from grobid2json.manifest import DONE, Manifest
+from grobid2json.reader import read_s2orc
+
+TEI = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    "<title>Paper {n}</title></titleStmt></fileDesc></teiHeader><text><body>"
+    "<div><head>Intro</head><p>Body of paper {n}.</p></div></body></text></TEI>"
+)
+DOCS = 60
+OPTIONS = dict(workers=2, shard_size=8, task_size=2, engine="lxml", progress=False)
+
+# runs a batch that is SIGKILLed, pool workers and all, once it has written
+# ``crash_after`` records, checkpointing after every completed task
+CRASHING_RUN = textwrap.dedent(
+    """
+    import os, signal, sys
+    from grobid2json import batch
+
+    input_dir, output_dir, crash_after = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    batch.CHECKPOINT_INTERVAL = 0.0
+    write = batch.ShardWriter.write
+    written = []
+
+    def crashing_write(self, line, paper_id=None):
+        written.append(paper_id)
+        if len(written) > crash_after:
+            os.killpg(0, signal.SIGKILL)
+        return write(self, line, paper_id)
+
+    batch.ShardWriter.write = crashing_write
+    batch.run_batch([input_dir], output_dir, **{options})
+    """
+).format(options=OPTIONS)
+
+
+def write_inputs(input_dir, docs=DOCS):
+    input_dir.mkdir()
+    for i in range(docs):
+        (input_dir / f"d{i:04d}.tei.xml").write_text(TEI.format(n=i))
+
+
+def paper_ids(shards):
+    return sorted(paper.paper_id for paper in read_s2orc(shards))
+
+
+def test_resume_after_kill_writes_every_input_once(tmp_path):
+    input_dir = tmp_path / "in"
+    write_inputs(input_dir)
+    output_dir = str(tmp_path / "out")
+    crashed = subprocess.run(
+        [sys.executable, "-c", CRASHING_RUN, str(input_dir), output_dir, "30"],
+        start_new_session=True,
+    )
+    assert crashed.returncode != 0
+    with Manifest(os.path.join(output_dir, "part-manifest.sqlite"), True) as m:
+        committed = m.counts().get(DONE, 0)
+    assert 0 < committed < DOCS
+
+    result = run_batch([str(input_dir)], output_dir, resume=True, **OPTIONS)
+    assert result["skipped"] == committed
+    assert result["converted"] == DOCS - committed
+    assert paper_ids(result["shards"]) == [f"d{i:04d}" for i in range(DOCS)]
+    with ShardIndex(result["index"]) as index:
+        for i in range(DOCS):
+            assert index.get_paper(f"d{i:04d}").metadata.title == f"Paper {i}"
+
+
+def test_resume_cuts_lines_after_last_checkpoint(tmp_path):
+    input_dir = tmp_path / "in"
+    write_inputs(input_dir, 10)
+    output_dir = str(tmp_path / "out")
+    first = run_batch([str(input_dir)], output_dir, **OPTIONS)
+    last_shard = first["shards"][-1]
+    size = os.path.getsize(last_shard)
+    # a line torn by a crash, written after the last checkpoint
+    with open(last_shard, "ab") as fp:
+        fp.write(b'{"paper_id": "d0003", "pdf_ha')
+
+    result = run_batch([str(input_dir)], output_dir, resume=True, **OPTIONS)
+    assert result["skipped"] == 10 and result["converted"] == 0
+    assert os.path.getsize(last_shard) == size
+    assert paper_ids(result["shards"]) == [f"d{i:04d}" for i in range(10)]
+
+
+def test_resume_replaces_changed_inputs_and_retries_failed(tmp_path):
+    input_dir = tmp_path / "in"
+    write_inputs(input_dir, 10)
+    (input_dir / "d0004.tei.xml").write_text("<TEI")
+    output_dir = str(tmp_path / "out")
+    first = run_batch([str(input_dir)], output_dir, **OPTIONS)
+    assert first["failed"] == 1
+
+    (input_dir / "d0002.tei.xml").write_text(TEI.format(n="two, revised"))
+    (input_dir / "d0004.tei.xml").write_text(TEI.format(n=4))
+    # same bytes, only touched: hashed again but not converted
+    os.utime(input_dir / "d0006.tei.xml")
+    result = run_batch([str(input_dir)], output_dir, resume=True, **OPTIONS)
+    assert result["skipped"] == 8
+    assert result["replaced"] == 1
+    assert result["converted"] == 2 and result["failed"] == 0
+
+    papers = {paper.paper_id: paper for paper in read_s2orc(result["shards"])}
+    assert sorted(papers) == [f"d{i:04d}" for i in range(10)]
+    assert papers["d0002"].metadata.title == "Paper two, revised"
+    with ShardIndex(result["index"]) as index:
+        assert index.get_paper("d0002").metadata.title == "Paper two, revised"
+        assert index.get_paper("d0004").metadata.title == "Paper 4"
+
+    # nothing changed since, so a second resume converts nothing
+    again = run_batch([str(input_dir)], output_dir, resume=True, **OPTIONS)
+    assert again["skipped"] == 10 and again["converted"] == 0
+    assert paper_ids(again["shards"]) == [f"d{i:04d}" for i in range(10)]
@@ -0,0 +1,51 @@
+import importlib
+import io
+import json
+import sys
+
+import pytest
+
+from grobid2json import serialize
+from grobid2json.convert import convert_bytes
+
+TEI = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    "<title>Ünïcode title</title></titleStmt></fileDesc></teiHeader><text><body>"
+    '<div><head>Intro</head><p>See <ref type="figure" target="#fig_0">Fig 1</ref>.'
+    '</p></div><figure xml:id="fig_0"><head>Figure</head><label>1</label>'
+    "<figDesc>A labelled figure</figDesc></figure></body></text></TEI>"
+).encode("utf-8")
+
+# the optional modules each backend needs hidden to be picked
+BACKENDS = {
+    "orjson": [],
+    "msgspec": ["orjson"],
+    "json": ["orjson", "msgspec"],
+}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request, monkeypatch):
+    name = request.param
+    if name != "json":
+        pytest.importorskip(name)
+    for hidden in BACKENDS[name]:
+        monkeypatch.setitem(sys.modules, hidden, None)
+    module = importlib.reload(serialize)
+    assert module.BACKEND == name
+    yield module
+    monkeypatch.undo()
+    importlib.reload(serialize)
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml"])
+def test_backend_matches_stdlib_json(backend, engine):
+    paper = convert_bytes(TEI, "test", engine=engine)
+    expected = json.loads(json.dumps(paper.as_json()))
+
+    assert json.loads(backend.dumps_str(paper.as_json())) == expected
+    assert backend.loads(backend.dumps(paper.as_json())) == expected
+    fp = io.BytesIO()
+    backend.write_paper(fp, paper)
+    assert json.loads(fp.getvalue().decode("utf-8")) == expected
+    assert expected["ref_entries"]["FIGREF0"]["fig_num"] == "1"
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from grobid2json import server
+from grobid2json.convert import convert_bytes_to_json
+from grobid2json.httpio import read_body, read_head
+from grobid2json.server import ConversionService
+
+TEI = (
+    b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt>'
+    b"<title>T</title></titleStmt></fileDesc></teiHeader><text><body><div>"
+    b"<head>Intro</head><p>Body.</p></div></body></text></TEI>"
+)
+CRASH = b"crash the worker"
+SLOW = b"take your time"
+convert_batch = server.convert_batch
+
+
+def stub_convert_batch(requests):
+    for xml_data, *_ in requests:
+        if xml_data == CRASH:
+            os._exit(1)
+        if xml_data == SLOW:
+            time.sleep(0.5)
+    return convert_batch(requests)
+
+
+class Service:
+    """
+    A ``ConversionService`` on one worker, served on a free local port
+    """
+
+    def __init__(self, **options):
+        self.service = ConversionService(workers=1, **options)
+        self.server = None
+
+    async def __aenter__(self):
+        await self.service.start()
+        self.server = await asyncio.start_server(self.service.handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.service.close()
+
+    async def request(self, method, target, body=b"", headers=None):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        head = {"Content-Length": str(len(body)), **(headers or {})}
+        writer.write(
+            f"{method} {target} HTTP/1.1\r\n".encode("latin-1")
+            + b"".join(f"{k}: {v}\r\n".encode("latin-1") for k, v in head.items())
+            + b"\r\n"
+            + body
+        )
+        await writer.drain()
+        (_, status, _), response_headers = await read_head(reader)
+        payload = json.loads(await read_body(reader, response_headers))
+        writer.close()
+        return int(status), payload
+
+
+def test_convert_and_errors():
+    async def run():
+        async with Service(max_body=len(TEI)) as s:
+            return [
+                await s.request("GET", "/health"),
+                await s.request("POST", "/convert?paper_id=p", TEI),
+                await s.request("POST", "/convert?format=release&paper_id=p", TEI),
+                await s.request("POST", "/convert", TEI + b" "),
+                await s.request("POST", "/convert", TEI, {"Content-Length": "ten"}),
+                await s.request("POST", "/convert", b"<TEI"),
+                await s.request("POST", "/convert?engine=regex", TEI),
+                await s.request("GET", "/convert"),
+                await s.request("GET", "/nowhere"),
+            ]
+
+    health, ok, release, large, malformed, bad_tei, engine, get, missing = asyncio.run(
+        run()
+    )
+    assert health == (200, {"status": "ok", "workers": 1})
+    assert ok == (200, json.loads(convert_bytes_to_json(TEI, "p", engine="lxml")))
+    assert release[0] == 200 and release[1]["pdf_parse"]["paper_id"] == "p"
+    assert large[0] == 413
+    assert malformed[0] == 400
+    assert bad_tei[0] == 422
+    assert engine[0] == 400
+    assert get[0] == 405 and missing[0] == 404
+
+
+def test_full_queue_answers_429(monkeypatch):
+    monkeypatch.setattr(server, "convert_batch", stub_convert_batch)
+
+    async def run():
+        async with Service(max_queue=1, concurrency=1, batch_size=1) as s:
+            metrics = s.service.metrics
+            # the slow batch holds the only slot, so the next request waits
+            slow = asyncio.create_task(s.request("POST", "/convert", SLOW))
+            while metrics()["batches_in_flight"] < 1:
+                await asyncio.sleep(0.01)
+            queued = asyncio.create_task(s.request("POST", "/convert", TEI))
+            while metrics()["queued"] < 1:
+                await asyncio.sleep(0.01)
+            rejected = await s.request("POST", "/convert", TEI)
+            return rejected, await queued, await slow, metrics()
+
+    rejected, queued, slow, metrics = asyncio.run(run())
+    assert rejected == (429, {"error": "queue full"})
+    assert queued[0] == 200 and slow[0] == 422
+    assert metrics["rejected"] == 1 and metrics["converted"] == 1
+
+
+def test_recovers_from_a_dead_worker(monkeypatch):
+    monkeypatch.setattr(server, "convert_batch", stub_convert_batch)
+
+    async def run():
+        async with Service(batch_size=1) as s:
+            crashed = await s.request("POST", "/convert", CRASH)
+            first = await s.request("POST", "/convert", TEI)
+            # a worker that dies while the pool is idle breaks it before the
+            # next batch is sent, which then goes to a fresh pool
+            for pid in list(s.service._executor._processes):
+                os.kill(pid, signal.SIGKILL)
+            while not s.service._executor._broken:
+                await asyncio.sleep(0.01)
+            second = await s.request("POST", "/convert", TEI)
+            return crashed, first, second
+
+    crashed, first, second = asyncio.run(run())
+    assert crashed[0] == 500 and "BrokenProcessPool" in crashed[1]["error"]
+    assert first[0] == 200 and second[0] == 200
+
+
+@pytest.mark.parametrize("size", ["zz", "-1"])
+def test_malformed_chunk_size_answers_400(size):
+    async def run():
+        async with Service() as s:
+            return await s.request(
+                "POST",
+                "/convert",
+                f"{size}\r\n".encode(),
+                {"Transfer-Encoding": "chunked", "Content-Length": "0"},
+            )
+
+    status, _ = asyncio.run(run())
+    assert status == 400
+
+
+def test_close_fails_requests_held_by_the_dispatcher():
+    async def run():
+        async with Service(batch_delay=10) as s:
+            metrics = s.service.metrics
+            pending = asyncio.create_task(s.request("POST", "/convert", TEI))
+            # taken off the queue, the request waits out the batch delay
+            while metrics()["requests"] < 1 or metrics()["queued"]:
+                await asyncio.sleep(0.01)
+            await s.service.close()
+            return await asyncio.wait_for(pending, 5)
+
+    status, payload = asyncio.run(run())
+    assert status == 500 and "shutting down" in payload["error"]
+
+
+def test_max_queue_must_be_positive():
+    with pytest.raises(ValueError):
+        ConversionService(workers=1, max_queue=0)
+    with pytest.raises(SystemExit):
+        server.main(["--max-queue", "0"])
+
+
+@pytest.mark.parametrize("where", ["header", "chunk size"])
+def test_overlong_line_answers_400(where):
+    line = "a" * (1 << 17)
+
+    async def run():
+        async with Service() as s:
+            if where == "header":
+                return await s.request("POST", "/convert", TEI, {"X-Long": line})
+            return await s.request(
+                "POST",
+                "/convert",
+                f"{line}\r\n".encode(),
+                {"Transfer-Encoding": "chunked", "Content-Length": "0"},
+            )
+
+    status, _ = asyncio.run(run())
+    assert status == 400